@@ -1,15 +1,23 @@
+import asyncio
+from contextlib import aclosing
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordBearer
 from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
 import database
 import models
 import auth
-from typing import List, Optional, Any
+from typing import List, Dict, Optional, Tuple, AsyncIterator
 from services.stock_resolver import resolve_stock
-from services.stock_service import get_stock_price, fallback_search_ticker
+from services.stock_service import get_stock_price_async, fallback_search_ticker
+from services.llm_client import get_llm_client
+from services.streaming import sse_event, SSE_HEADERS
+from services.single_flight import SingleFlight
 from rag_vectorless.search import search_index
-from rag_vectorless.schemas import SearchQuery
+from rag_vectorless.schemas import SearchQuery, SearchResult, ContextStats, SlimSearchResult
+from rag_vectorless.snippets import slim_results
+from rag_vectorless.context import pack_context, CONTEXT_TOKEN_BUDGET
 
 router = APIRouter(
     prefix="/chat",
@@ -19,11 +27,16 @@ router = APIRouter(
 class ChatMessageRequest(BaseModel):
     message: str = Field(..., description="The user's question or message")
     top_k_sources: int = Field(5, description="Number of transcript excerpts to retrieve per stock")
+    context_token_budget: int = Field(CONTEXT_TOKEN_BUDGET, description="Max estimated tokens of transcript context in the prompt")
 
 class ChatMessageResponse(BaseModel):
     reply: str
     detected_stocks: List[str]
-    sources: List[Any]
+    sources: List[SlimSearchResult]
+    context_stats: Optional[ContextStats] = None
+
+# Identical searches from concurrent chats (same question, same ticker) share one index lookup
+search_flights = SingleFlight()
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/login", auto_error=False)
 
@@ -35,34 +48,42 @@ async def get_optional_user(token: Optional[str] = Depends(oauth2_scheme), db: S
     except HTTPException:
         return None
 
-def call_llm(prompt: str) -> str:
-    """Helper to mock/call Groq LLM API.
-    Since main.py has `client` initialized, we reuse it or do a late import."""
+SYSTEM_PROMPT = "You are a highly capable AI Financial Assistant. Your primary goal is to answer the user's queries accurately. If context (like transcripts or portfolio metrics) is provided, use it to give a specific, tailored answer. However, if the user asks a general financial question, an external market query, or a question completely outside the provided context, you MUST use your broad financial knowledge to answer it helpfully and comprehensively. Keep all of your answers SHORT, CRISP, AND EASY TO READ using bullet points where applicable."
+
+LLM_ERROR_REPLY = "Sorry, I encountered an error generating the response."
+
+def chat_messages(prompt: str) -> List[Dict[str, str]]:
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+async def call_llm(prompt: str) -> str:
+    """Calls the Groq LLM API through the shared async client (see services/llm_client.py)."""
     try:
-        from main import client
-        response = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[
-                {"role": "system", "content": "You are a highly capable AI Financial Assistant. Your primary goal is to answer the user's queries accurately. If context (like transcripts or portfolio metrics) is provided, use it to give a specific, tailored answer. However, if the user asks a general financial question, an external market query, or a question completely outside the provided context, you MUST use your broad financial knowledge to answer it helpfully and comprehensively. Keep all of your answers SHORT, CRISP, AND EASY TO READ using bullet points where applicable."},
-                {"role": "user", "content": prompt}
-            ],
+        return await get_llm_client().complete(
+            messages=chat_messages(prompt),
             temperature=0.3,
-            max_tokens=1000
+            max_tokens=1000,
+            endpoint="chat",
+            priority="chat"
         )
-        return response.choices[0].message.content
     except Exception as e:
         print(f"[ERROR] LLM call failed in router: {e}")
-        return "Sorry, I encountered an error generating the response."
+        return LLM_ERROR_REPLY
 
-@router.post("/message", response_model=ChatMessageResponse)
-def handle_chat_message(
-    request: ChatMessageRequest,
-    current_user: Optional[models.User] = Depends(get_optional_user),
-    db: Session = Depends(database.get_db)
-):
-    user_text = request.message
-    
-    # FETCH PORTFOLIO for context
+def stream_llm(prompt: str) -> AsyncIterator[str]:
+    """Same call as call_llm, yielding the reply in pieces as Groq generates it."""
+    return get_llm_client().stream(
+        messages=chat_messages(prompt),
+        temperature=0.3,
+        max_tokens=1000,
+        endpoint="chat",
+        priority="chat"
+    )
+
+def load_user_context(current_user: Optional[models.User], db: Session) -> Tuple[str, str]:
+    """Portfolio and profile lines for the prompt. Queries the DB, so async callers run it in a thread."""
     portfolio_context = "The user currently has no saved portfolio holdings."
     profile_context = ""
     
@@ -83,6 +104,18 @@ def handle_chat_message(
                     profile_context = "\nUser Demographics & Financial Profile:\n" + "\n".join(profile_lines)
             except:
                 pass
+    return portfolio_context, profile_context
+
+async def build_chat_prompt(
+    request: ChatMessageRequest,
+    current_user: Optional[models.User],
+    db: Session
+) -> Tuple[str, List[str], List[SearchResult], Optional[ContextStats]]:
+    """Everything before the LLM call: prompt, detected tickers, retrieved sources, context stats."""
+    user_text = request.message
+    
+    # FETCH PORTFOLIO for context (SQLAlchemy blocks, so off the event loop)
+    portfolio_context, profile_context = await asyncio.to_thread(load_user_context, current_user, db)
     
     # PART 1 & 2: Resolve stocks from text
     resolved_tickers = resolve_stock(user_text)
@@ -99,27 +132,26 @@ def handle_chat_message(
             
     if len(resolved_tickers) > 0:
         # We found one or more stocks. Attempt RAG & Price fetch.
-        for ticker in resolved_tickers:
-            # 1. Fetch Price
-            price = get_stock_price(ticker)
+        # Both block (yfinance, index search), so they run in worker threads, every ticker at once
+        rag_reqs = [
+            # From loader.py: "NVDA", "AAPL", "MSFT" (We updated this to Canonical Uppercase)
+            SearchQuery(query=user_text, top_k=request.top_k_sources, filters={"company": ticker.upper()})
+            for ticker in resolved_tickers
+        ]
+        prices, rag_results = await asyncio.gather(
+            asyncio.gather(*(get_stock_price_async(ticker) for ticker in resolved_tickers)),
+            asyncio.gather(*(
+                search_flights.do(rag_req.model_dump_json(), lambda rag_req=rag_req: asyncio.to_thread(search_index, rag_req))
+                for rag_req in rag_reqs
+            ))
+        )
+        for ticker, price, results in zip(resolved_tickers, prices, rag_results):
             if price:
                 prices_info.append(f"{ticker} Current Price: ${price}")
-                
-            # 2. Fetch RAG Context
-            # Depending on how the transcripts are matched, we specify the lower or upper ticker.
-            # Usually index metadata company is either lowercase or whatever the loader decides.
-            # From loader.py: "NVDA", "AAPL", "MSFT" (We updated this to Canonical Uppercase)
-            company_filter = ticker.upper() 
-            rag_req = SearchQuery(
-                query=user_text,
-                top_k=request.top_k_sources,
-                filters={"company": company_filter}
-            )
-            rag_results = search_index(rag_req)
-            all_sources.extend(rag_results)
+            all_sources.extend(results)
             
-        # Format the RAG context string
-        context_str = "\n\n".join([f"[{result.metadata.company.upper()}] {result.text}" for result in all_sources])
+        # Merge overlapping excerpts, drop repeats and fit the rest into the token budget
+        context_str, context_stats = pack_context(all_sources, request.context_token_budget)
         price_str = "\n".join(prices_info)
         
         prompt = f"""User asks: "{user_text}"
@@ -135,13 +167,7 @@ Context from latest earnings transcripts:
 
 Please answer the user's question directly and concisely. Combine the provided context with your broad general knowledge when necessary to give a complete and helpful answer. Keep your final answer short, crisp, and easy to read.
 """
-        reply = call_llm(prompt)
-        
-        return ChatMessageResponse(
-            reply=reply,
-            detected_stocks=resolved_tickers,
-            sources=[res.dict() for res in all_sources]
-        )
+        return prompt, resolved_tickers, all_sources, context_stats
         
     else:
         # PART 4: Generic queries (No stocks resolved)
@@ -151,9 +177,56 @@ Please answer the user's question directly and concisely. Combine the provided c
 
 Please answer this question fully using your general financial knowledge, as no specific internal documents or stock tickers were triggered for this query. Be helpful, comprehensive, and clear. Keep your answer short, crisp, and easy to read.
 """
-        reply = call_llm(prompt)
-        return ChatMessageResponse(
-            reply=reply,
-            detected_stocks=[],
-            sources=[]
-        )
+        return prompt, [], [], None
+
+@router.post("/message", response_model=ChatMessageResponse)
+async def handle_chat_message(
+    request: ChatMessageRequest,
+    current_user: Optional[models.User] = Depends(get_optional_user),
+    db: Session = Depends(database.get_db)
+):
+    prompt, detected_stocks, sources, context_stats = await build_chat_prompt(request, current_user, db)
+    reply = await call_llm(prompt)
+    return ChatMessageResponse(
+        reply=reply,
+        detected_stocks=detected_stocks,
+        # Snippets only; full text is fetched on demand via /rag/chunk/{chunk_id}
+        sources=slim_results(sources, request.message),
+        context_stats=context_stats
+    )
+
+@router.post("/message/stream")
+async def handle_chat_message_stream(
+    request: ChatMessageRequest,
+    current_user: Optional[models.User] = Depends(get_optional_user),
+    db: Session = Depends(database.get_db)
+):
+    """
+    Streaming variant of /chat/message, as server-sent events:
+      sources - {"detected_stocks", "sources", "context_stats"}, sent before the LLM is called
+      token   - {"text"}: the next piece of the reply
+      done    - {"reply"}: the whole reply
+      error   - {"detail"}; nothing follows it
+    """
+    prompt, detected_stocks, sources, context_stats = await build_chat_prompt(request, current_user, db)
+
+    async def events():
+        yield sse_event("sources", {
+            "detected_stocks": detected_stocks,
+            "sources": [source.model_dump() for source in slim_results(sources, request.message)],
+            "context_stats": context_stats.model_dump() if context_stats else None,
+        })
+        reply = []
+        try:
+            # aclosing: the upstream stream is closed as soon as this response ends, however it ends
+            async with aclosing(stream_llm(prompt)) as deltas:
+                async for delta in deltas:
+                    reply.append(delta)
+                    yield sse_event("token", {"text": delta})
+        except Exception as e:
+            print(f"[ERROR] LLM stream failed in router: {e}")
+            yield sse_event("error", {"detail": LLM_ERROR_REPLY})
+            return
+        yield sse_event("done", {"reply": "".join(reply)})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
@@ -6,17 +6,18 @@ Financial Explanation Assistant - FREE VERSION using Groq
 from fastapi import FastAPI, HTTPException, UploadFile, File, status
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field, validator
-from typing import List, Optional, Literal, Dict
+from typing import List, Optional, Literal, Dict, Union, AsyncIterator
 from datetime import datetime, date, timedelta
-from groq import Groq
 from dotenv import load_dotenv  # Add this import
 import os
+import asyncio
+from contextlib import aclosing
 import csv
 import io
 import json
 import pandas as pd
-import yfinance as yf
 
 # Auth & DB imports
 from fastapi import Depends
@@ -26,6 +27,9 @@ import database
 import models
 import auth
 from services.suitability import calculate_suitability, anonymize_profile_for_llm
+from services.stock_service import get_stock_price_async
+from services.llm_client import LLMClient, LLMTimeoutError, LLMQuotaError, get_llm_client, is_rate_limited
+from services.streaming import IncrementalJSONParser, sse_event, SSE_HEADERS
 
 # Initialize DB tables
 models.Base.metadata.create_all(bind=database.engine)
@@ -56,7 +60,8 @@ app.mount("/frontend", StaticFiles(directory="frontend", html=True), name="front
 
 # Configure Groq (FREE!)
 # Get your free API key from: https://console.groq.com/keys
-client = Groq(api_key=os.environ.get("GROQ_API_KEY"))
+# Async client: LLM round trips no longer block the event loop (see services/llm_client.py)
+llm_client = get_llm_client()
 
 # ============================================================================
 # PYDANTIC MODELS
@@ -141,6 +146,25 @@ class ExplanationResponse(BaseModel):
     # Keep the original calculated metrics to return alongside the AI response
     portfolio_metrics: dict = Field(default_factory=dict)
 
+def is_valid_explanation(content: str) -> bool:
+    """Only explanations that parse into an ExplanationResponse go into the LLM cache"""
+    try:
+        data, _ = json.JSONDecoder().raw_decode(content, content.index("{"))
+        ExplanationResponse(**data)
+        return True
+    except Exception:
+        return False
+
+def llm_error(e: Exception) -> HTTPException:
+    """HTTP error for a failed LLM call, so clients can tell timeouts and rate limits from bugs"""
+    if isinstance(e, LLMTimeoutError):
+        return HTTPException(status_code=504, detail=f"Groq API timeout: {str(e)}")
+    if isinstance(e, LLMQuotaError):
+        return HTTPException(status_code=413, detail=f"Request too large for the LLM budget: {str(e)}")
+    if is_rate_limited(e):
+        return HTTPException(status_code=429, detail="Groq rate limit reached, please retry shortly")
+    return HTTPException(status_code=500, detail=f"Groq API error: {str(e)}")
+
 # ============================================================================
 # SERVICE LAYER - Using Groq (World's Fastest AI)
 # ============================================================================
@@ -156,8 +180,8 @@ class PortfolioAnalyzer:
     4. No rate limit issues - Much higher limits than Gemini
     """
     
-    def __init__(self, client):
-        self.client = client
+    def __init__(self, llm: LLMClient):
+        self.llm = llm
     
     def calculate_portfolio_metrics(self, holdings: List[PortfolioHolding]) -> dict:
         """Calculate portfolio statistics"""
@@ -214,7 +238,7 @@ class PortfolioAnalyzer:
             "Other": round(other_value / total, 2) if total > 0 else 0
         }
     
-    def generate_explanation(
+    def build_explanation_messages(
         self,
         holdings: List[PortfolioHolding],
         metrics: dict,
@@ -223,13 +247,8 @@ class PortfolioAnalyzer:
         transcript_context: Optional[str] = None,
         suitability_metrics: Optional[dict] = None,
         user_profile: Optional[dict] = None
-    ) -> str:
-        """
-        Call Groq API (FREE and FAST!) to generate explanation
-        
-        Groq uses OpenAI-compatible API - very simple!
-        Enforces strict JSON output.
-        """
+    ) -> List[Dict[str, str]]:
+        """Chat messages asking for the strict JSON explanation"""
         
         # We can calculate some basic tax string conceptually to pass as input
         tax_summary = "Tax implications depend on holding period. Assets held >1 yr are subject to long term capital gains."
@@ -347,31 +366,61 @@ Return ONLY this JSON structure exactly:
   "action_plan": []
 }}
 """
+        return [
+            {"role": "system", "content": "You are a professional AI Financial Advisor. Output only raw JSON."},
+            {"role": "user", "content": prompt}
+        ]
 
+    async def generate_explanation(self, holdings: List[PortfolioHolding], metrics: dict, user_name: str,
+                                   user_level: str, **context) -> str:
+        """
+        Call Groq API (FREE and FAST!) to generate explanation
+        
+        Groq uses OpenAI-compatible API - very simple!
+        Enforces strict JSON output.
+        """
         try:
             print(f"[DEBUG] Calling Groq API...")
             
             # Call Groq - Uses OpenAI-compatible API format
-            response = self.client.chat.completions.create(
-                model="llama-3.3-70b-versatile",  # Updated to current model
-                messages=[
-                    {"role": "system", "content": "You are a professional AI Financial Advisor. Output only raw JSON."},
-                    {"role": "user", "content": prompt}
-                ],
+            content = await self.llm.complete(
+                messages=self.build_explanation_messages(holdings, metrics, user_name, user_level, **context),
                 temperature=0.2, # Lower temp for more stable JSON
                 max_tokens=2000,
-                response_format={"type": "json_object"}
+                response_format={"type": "json_object"},
+                endpoint="explain",
+                cacheable=is_valid_explanation,
+                priority="explain"
             )
             
             print(f"[DEBUG] Groq response received")
             
-            return response.choices[0].message.content
+            return content
         
         except Exception as e:
-            print(f"[ERROR] Groq API failed: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            raise HTTPException(status_code=500, detail=f"Groq API error: {str(e)}")
+            error = llm_error(e)
+            print(f"[ERROR] Groq API failed ({error.status_code}): {str(e)}")
+            if error.status_code == 500:
+                import traceback
+                traceback.print_exc()
+            raise error
+
+    def stream_explanation(self, holdings: List[PortfolioHolding], metrics: dict, user_name: str,
+                           user_level: str, **context) -> AsyncIterator[str]:
+        """
+        Same explanation, as raw text deltas while Groq generates it.
+        No JSON mode here (it is not guaranteed together with streaming);
+        the prompt already asks for raw JSON and the parser skips anything
+        before the opening brace.
+        """
+        return self.llm.stream(
+            messages=self.build_explanation_messages(holdings, metrics, user_name, user_level, **context),
+            temperature=0.2,
+            max_tokens=2000,
+            endpoint="explain",
+            cacheable=is_valid_explanation,
+            priority="explain"
+        )
     
     def _format_portfolio_for_prompt(self, holdings: List[PortfolioHolding], metrics: dict) -> str:
         """Format portfolio data for prompt"""
@@ -398,7 +447,7 @@ Return ONLY this JSON structure exactly:
         
         return "\n".join(lines)
     
-    def generate_rebalancing_ideas(
+    async def generate_rebalancing_ideas(
         self,
         holdings: List[PortfolioHolding],
         metrics: dict,
@@ -424,19 +473,21 @@ Reduce tech exposure by 10% | Over-concentration in single sector | Improves div
 Now provide your suggestions:"""
 
         try:
-            response = self.client.chat.completions.create(
-                model="llama-3.3-70b-versatile",  # Updated to current model
+            content = await self.llm.complete(
                 messages=[
                     {"role": "system", "content": "You are a financial advisor providing rebalancing suggestions."},
                     {"role": "user", "content": prompt}
                 ],
                 temperature=0.7,
-                max_tokens=800
+                max_tokens=800,
+                endpoint="rebalance",
+                cacheable=lambda content: "|" in content,
+                priority="background"
             )
             
             # Parse response
             ideas = []
-            lines = response.choices[0].message.content.strip().split('\n')
+            lines = content.strip().split('\n')
             
             for line in lines:
                 if '|' in line:
@@ -465,34 +516,90 @@ Now provide your suggestions:"""
 # API ROUTES
 # ============================================================================
 
-analyzer = PortfolioAnalyzer(client)
+analyzer = PortfolioAnalyzer(llm_client)
 
 from chatbot.router import router as chatbot_router
 app.include_router(chatbot_router)
 
-from rag_vectorless import SearchQuery, SearchResponse, search_index, build_index_if_needed, generate_manifest_template
+from rag_vectorless import (
+    SearchQuery, SearchResponse, SlimSearchResponse, ChunkRecord, search_index, get_backend, get_chunk, slim_results,
+    generate_manifest_template,
+    BatchSearchRequest, BatchSearchResponse, search_batch, query_cache, RebuildJob, rebuild_manager, TranscriptWatcher
+)
+
+# Set RAG_WATCH_TRANSCRIPTS=1 to re-index automatically when ./transcripts changes
+transcript_watcher = TranscriptWatcher("./transcripts") if os.environ.get("RAG_WATCH_TRANSCRIPTS") == "1" else None
 
 @app.on_event("startup")
 def on_startup():
-    build_index_if_needed()
+    # Serve the cached index immediately; pending transcript changes are applied in the background
+    # RAG_BACKEND=fts5 serves from SQLite instead of the in-memory BM25 engine
+    pending = get_backend().prepare("./transcripts")
+    if pending:
+        rebuild_manager.submit("./transcripts")
+    if transcript_watcher:
+        transcript_watcher.start()
+
+@app.on_event("shutdown")
+def on_shutdown():
+    if transcript_watcher:
+        transcript_watcher.stop()
 
 @app.get("/health")
 def health_check():
     return {"status": "healthy"}
 
-@app.post("/rag/search", response_model=SearchResponse)
-def rag_search(query: SearchQuery):
-    results = search_index(query)
+@app.post("/rag/search", response_model=Union[SearchResponse, SlimSearchResponse])
+def rag_search(query: SearchQuery, slim: bool = False):
+    # ?slim=true returns snippets instead of full chunk text; see /rag/chunk/{chunk_id}
+    try:
+        results = search_index(query)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if slim:
+        return SlimSearchResponse(query=query.query, results=slim_results(results, query.query))
     return SearchResponse(query=query.query, results=results)
 
-@app.post("/rag/rebuild")
-def rag_rebuild():
-    # Force rebuild by passing a flag or just deleting the file state?
-    # Actually, build_index_if_needed respects the needs_rebuild() function.
-    # To force, we can call global_index.build directly.
-    from rag_vectorless import global_index
-    global_index.build("./transcripts")
-    return {"status": "success", "message": "Index rebuilt"}
+@app.get("/rag/chunk/{chunk_id}", response_model=ChunkRecord)
+def rag_chunk(chunk_id: str):
+    chunk = get_chunk(chunk_id)
+    if not chunk:
+        raise HTTPException(status_code=404, detail="Chunk not found")
+    return chunk
+
+@app.post("/rag/search/batch", response_model=BatchSearchResponse)
+def rag_search_batch(batch: BatchSearchRequest):
+    # Scores all queries together; meant for offline jobs running many queries at once
+    try:
+        results = search_batch(batch.queries)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return BatchSearchResponse(responses=[
+        SearchResponse(query=query.query, results=query_results)
+        for query, query_results in zip(batch.queries, results)
+    ])
+
+@app.get("/rag/cache/stats")
+def rag_cache_stats():
+    return query_cache.stats()
+
+@app.get("/llm/stats")
+def llm_stats():
+    return llm_client.stats()
+
+@app.post("/rag/rebuild", response_model=RebuildJob, status_code=status.HTTP_202_ACCEPTED)
+def rag_rebuild(full: bool = False):
+    # Runs in the background; searches keep using the current index until the
+    # new one is swapped in. By default only added / changed / deleted
+    # transcripts are re-indexed; pass ?full=true to rebuild from scratch.
+    return rebuild_manager.submit("./transcripts", full=full)
+
+@app.get("/rag/rebuild/{job_id}", response_model=RebuildJob)
+def rag_rebuild_status(job_id: str):
+    job = rebuild_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Rebuild job not found")
+    return job
 
 @app.get("/rag/manifest-template")
 def rag_manifest_template():
@@ -635,6 +742,106 @@ async def preview_portfolio(
         life_stage_classification=suitability["life_stage_classification"]
     )
 
+def resolve_ticker(name_or_ticker: str) -> str:
+    """Resolve a company name to its ticker if it's not a standard symbol"""
+    name_str = name_or_ticker.strip().upper()
+    # If it looks like a standard ticker (1-5 uppercase letters), return it
+    if name_str.isalpha() and len(name_str) <= 5:
+        return name_str
+    # Otherwise, try to use yfinance to search for the most likely ticker
+    try:
+        # yfinance currently doesn't have a direct "search" endpoint available reliably in all versions, 
+        # but we can try fetching a ticker to see if it implicitly matched, or rely on a hardcoded map for common requests during the demo
+        common_map = {
+            "APPLE": "AAPL", "MICROSOFT": "MSFT", "NVIDIA": "NVDA", 
+            "TESLA": "TSLA", "AMAZON": "AMZN", "META": "META",
+            "FACEBOOK": "META", "GOOGLE": "GOOGL", "ALPHABET": "GOOGL",
+            "NETFLIX": "NFLX", "AMD": "AMD", "INTEL": "INTC"
+        }
+        for key in common_map:
+            if key in name_or_ticker.upper():
+                return common_map[key]
+        return name_str # Fallback to giving what they typed
+    except Exception:
+        return name_str
+
+async def prepare_explanation(request: ExplanationRequest, current_user: models.User) -> dict:
+    """Resolves tickers, fills in live prices and computes metrics; returns the generate_explanation arguments"""
+    # Fetch real-time prices for holdings if missing
+    for holding in request.portfolio:
+        # Update the holding so the rest of the app uses the valid ticker
+        holding.ticker = resolve_ticker(holding.ticker)
+        
+    # yfinance is blocking; the lookups run in worker threads, all at once
+    missing = [h for h in request.portfolio if h.current_price is None]
+    prices = await asyncio.gather(*(get_stock_price_async(h.ticker) for h in missing))
+    for holding, price in zip(missing, prices):
+        if price is None:
+            print(f"[WARNING] Could not fetch price for {holding.ticker}, using purchase price")
+        holding.current_price = price or holding.purchase_price
+    metrics = analyzer.calculate_portfolio_metrics(request.portfolio)
+    
+    # Priority: DB Profile > Request Profile
+    user_prof = {}
+    if current_user.user_profile:
+        try:
+            user_prof = json.loads(current_user.user_profile)
+        except:
+            pass
+            
+    if not user_prof and request.user_profile:
+        user_prof = request.user_profile.model_dump(exclude_unset=True, exclude_none=True)
+        
+    suitability = calculate_suitability(user_prof, metrics)
+    safe_profile = anonymize_profile_for_llm(user_prof)
+    
+    # Merge suitability logic into metrics so frontend gets it instantly in explanation as well
+    metrics.update(suitability)
+    
+    return {
+        "holdings": request.portfolio,
+        "metrics": metrics,
+        "user_name": current_user.full_name, # Injected from DB
+        "user_level": request.user_level,
+        "transcript_context": request.transcript_context,
+        "suitability_metrics": suitability,
+        "user_profile": safe_profile,
+    }
+
+def finalize_explanation(structured_data: dict, metrics: dict) -> ExplanationResponse:
+    """Validated response from the parsed LLM JSON, with deterministic confidence and metrics merged in"""
+    # Override the LLM's confidence_score with deterministic analytics
+    try:
+        # 1. Base confidence (50%)
+        calc_confidence = 0.50
+        
+        # 2. Portfolio Size factor (+ up to 25%)
+        # More holdings = we have more data to diversify risk analysis
+        num_holdings = metrics.get('holdings_count', 1)
+        size_factor = min(0.25, (num_holdings / 10.0) * 0.25)
+        calc_confidence += size_factor
+        
+        # 3. Sector Diversification factor (+ up to 25%)
+        # Less concentration in the top position = more confident overall analysis
+        top_pos_percent = metrics.get('largest_position_percent', 100)
+        if top_pos_percent < 100:
+            # If they are 100% in one stock, 0 bonus. 
+            # If they are 20% in one stock, max bonus.
+            diversification_bonus = min(0.25, ((100 - top_pos_percent) / 80.0) * 0.25)
+            calc_confidence += diversification_bonus
+            
+        # Cap safely at 99%
+        calc_confidence = round(min(0.99, calc_confidence), 2)
+        
+        structured_data['confidence_score'] = calc_confidence
+    except Exception as override_err:
+        print(f"[WARNING] Failed to override confidence score: {override_err}")
+    
+    # Merge metrics back into the final response
+    structured_data['portfolio_metrics'] = metrics
+    
+    return ExplanationResponse(**structured_data)
+
 @app.post("/api/explain", response_model=ExplanationResponse)
 async def explain_portfolio(
     request: ExplanationRequest,
@@ -645,117 +852,17 @@ async def explain_portfolio(
     try:
         print(f"[DEBUG] Received request with {len(request.portfolio)} holdings for user {current_user.full_name}")
         
-        # Helper to resolve company name to ticker if it's not a standard symbol
-        def resolve_ticker(name_or_ticker: str) -> str:
-            name_str = name_or_ticker.strip().upper()
-            # If it looks like a standard ticker (1-5 uppercase letters), return it
-            if name_str.isalpha() and len(name_str) <= 5:
-                return name_str
-            # Otherwise, try to use yfinance to search for the most likely ticker
-            try:
-                # yfinance currently doesn't have a direct "search" endpoint available reliably in all versions, 
-                # but we can try fetching a ticker to see if it implicitly matched, or rely on a hardcoded map for common requests during the demo
-                common_map = {
-                    "APPLE": "AAPL", "MICROSOFT": "MSFT", "NVIDIA": "NVDA", 
-                    "TESLA": "TSLA", "AMAZON": "AMZN", "META": "META",
-                    "FACEBOOK": "META", "GOOGLE": "GOOGL", "ALPHABET": "GOOGL",
-                    "NETFLIX": "NFLX", "AMD": "AMD", "INTEL": "INTC"
-                }
-                for key in common_map:
-                    if key in name_or_ticker.upper():
-                        return common_map[key]
-                return name_str # Fallback to giving what they typed
-            except Exception:
-                return name_str
-                
-        # Fetch real-time prices for holdings if missing
-        updated_holdings = []
-        for holding in request.portfolio:
-            resolved_symbol = resolve_ticker(holding.ticker)
-            # Update the holding so the rest of the app uses the valid ticker
-            holding.ticker = resolved_symbol
-            
-            if holding.current_price is None:
-                try:
-                    stock = yf.Ticker(resolved_symbol)
-                    hist = stock.history(period="1d")
-                    if not hist.empty:
-                        holding.current_price = round(float(hist['Close'].iloc[-1]), 2)
-                    else:
-                        holding.current_price = holding.purchase_price
-                except Exception as e:
-                    print(f"[WARNING] Could not fetch price for {holding.ticker}: {e}")
-                    holding.current_price = holding.purchase_price
-            updated_holdings.append(holding)
-            
-        request.portfolio = updated_holdings
-        metrics = analyzer.calculate_portfolio_metrics(request.portfolio)
-        
-        # Priority: DB Profile > Request Profile
-        user_prof = {}
-        if current_user.user_profile:
-            import json
-            try:
-                user_prof = json.loads(current_user.user_profile)
-            except:
-                pass
-                
-        if not user_prof and request.user_profile:
-            user_prof = request.user_profile.model_dump(exclude_unset=True, exclude_none=True)
-            
-        suitability = calculate_suitability(user_prof, metrics)
-        safe_profile = anonymize_profile_for_llm(user_prof)
-        
-        # Merge suitability logic into metrics so frontend gets it instantly in explanation as well
-        metrics.update(suitability)
-        
-        explanation_json = analyzer.generate_explanation(
-            holdings=request.portfolio,
-            metrics=metrics,
-            user_name=current_user.full_name, # Injected from DB
-            user_level=request.user_level,
-            transcript_context=request.transcript_context,
-            suitability_metrics=suitability,
-            user_profile=safe_profile
-        )
+        inputs = await prepare_explanation(request, current_user)
+        explanation_json = await analyzer.generate_explanation(**inputs)
         print(f"[DEBUG] Explanation generated")
         
         # Parse JSON output from Groq
-        import json
         structured_data = json.loads(explanation_json)
         
-        # Override the LLM's confidence_score with deterministic analytics
-        try:
-            # 1. Base confidence (50%)
-            calc_confidence = 0.50
-            
-            # 2. Portfolio Size factor (+ up to 25%)
-            # More holdings = we have more data to diversify risk analysis
-            num_holdings = metrics.get('holdings_count', 1)
-            size_factor = min(0.25, (num_holdings / 10.0) * 0.25)
-            calc_confidence += size_factor
-            
-            # 3. Sector Diversification factor (+ up to 25%)
-            # Less concentration in the top position = more confident overall analysis
-            top_pos_percent = metrics.get('largest_position_percent', 100)
-            if top_pos_percent < 100:
-                # If they are 100% in one stock, 0 bonus. 
-                # If they are 20% in one stock, max bonus.
-                diversification_bonus = min(0.25, ((100 - top_pos_percent) / 80.0) * 0.25)
-                calc_confidence += diversification_bonus
-                
-            # Cap safely at 99%
-            calc_confidence = round(min(0.99, calc_confidence), 2)
-            
-            structured_data['confidence_score'] = calc_confidence
-        except Exception as override_err:
-            print(f"[WARNING] Failed to override confidence score: {override_err}")
-        
-        # Merge metrics back into the final response
-        structured_data['portfolio_metrics'] = metrics
-        
-        return ExplanationResponse(**structured_data)
+        return finalize_explanation(structured_data, inputs["metrics"])
     
+    except HTTPException:
+        raise
     except json.JSONDecodeError:
         print(f"[ERROR] LLM Failed to return valid JSON")
         raise HTTPException(status_code=500, detail="Failed to parse AI response into structured format.")
@@ -768,6 +875,53 @@ async def explain_portfolio(
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Internal error: {str(e)}")
 
+@app.post("/api/explain/stream")
+async def explain_portfolio_stream(
+    request: ExplanationRequest,
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    """
+    Streaming variant of /api/explain, as server-sent events:
+      metrics - portfolio metrics and suitability, sent before the LLM is called
+      field   - {"key", "value"} for each top-level field once it is complete
+      item    - {"key", "index", "value"} for each finished entry of a list field
+                (per_stock_analysis, key_takeaways, action_plan)
+      done    - the full validated ExplanationResponse
+      error   - {"status_code", "detail"}; nothing follows it
+    """
+    try:
+        print(f"[DEBUG] Received streaming request with {len(request.portfolio)} holdings for user {current_user.full_name}")
+        inputs = await prepare_explanation(request, current_user)
+    except Exception as e:
+        print(f"[ERROR] Unexpected error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def events():
+        metrics = inputs["metrics"]
+        yield sse_event("metrics", metrics)
+        parser = IncrementalJSONParser()
+        try:
+            # aclosing: the upstream stream is closed as soon as this response ends, however it ends
+            async with aclosing(analyzer.stream_explanation(**inputs)) as deltas:
+                async for delta in deltas:
+                    for event in parser.feed(delta):
+                        # The LLM's confidence_score is replaced in finalize_explanation; only "done" carries it
+                        if event[1] == "confidence_score":
+                            continue
+                        if event[0] == "field":
+                            yield sse_event("field", {"key": event[1], "value": event[2]})
+                        elif event[0] == "item":
+                            yield sse_event("item", {"key": event[1], "index": event[2], "value": event[3]})
+            if not parser.done:
+                raise ValueError("AI response ended before the JSON object was complete")
+            yield sse_event("done", finalize_explanation(parser.result, metrics).model_dump())
+        except Exception as e:
+            error = llm_error(e)
+            print(f"[ERROR] Explanation stream failed ({error.status_code}): {str(e)}")
+            yield sse_event("error", {"status_code": error.status_code, "detail": error.detail})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
 # Mount the static frontend directory
 from fastapi.staticfiles import StaticFiles
 app.mount("/", StaticFiles(directory="frontend", html=True), name="frontend")
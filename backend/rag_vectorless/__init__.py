@@ -1,7 +1,16 @@
-from .schemas import SearchQuery, SearchResponse, ChunkRecord, ChunkMetadata, SearchResult
+from .schemas import (
+    SearchQuery, SearchResponse, ChunkRecord, ChunkMetadata, SearchResult, BatchSearchRequest, BatchSearchResponse,
+    ContextStats, SlimSearchResult, SlimSearchResponse
+)
 from .loader import generate_manifest_template
 from .indexer import build_index_if_needed, global_index
-from .search import search_index
+from .search import search_index, get_backend, get_chunk
+from .snippets import slim_results
+from .batch import search_batch
+from .cache import query_cache
+from .context import pack_context
+from .jobs import RebuildJob, rebuild_manager
+from .watcher import TranscriptWatcher
 
 __all__ = [
     "SearchQuery",
@@ -9,8 +18,22 @@ __all__ = [
     "ChunkRecord",
     "ChunkMetadata",
     "SearchResult",
+    "BatchSearchRequest",
+    "BatchSearchResponse",
+    "ContextStats",
+    "SlimSearchResult",
+    "SlimSearchResponse",
     "generate_manifest_template",
     "build_index_if_needed",
     "global_index",
-    "search_index"
+    "search_index",
+    "get_backend",
+    "get_chunk",
+    "slim_results",
+    "search_batch",
+    "query_cache",
+    "pack_context",
+    "RebuildJob",
+    "rebuild_manager",
+    "TranscriptWatcher"
 ]
@@ -0,0 +1,190 @@
+"""
+Text analysis shared by indexing and querying.
+
+An Analyzer turns text into index terms:
+  numbers   - "$4.50" -> "4.5", "1,234" -> "1234", "39%" -> "39 percent",
+              so figures stay one term instead of splitting at the point
+  stopwords - the short STOPWORDS list is dropped
+  stemming  - a light suffix stripper ("margins" / "margin", "guided" /
+              "guidance" stay apart, "increased" / "increases" / "increase"
+              meet, while words that only look inflected - "news", "speed",
+              "bias" - are left alone); results are memoized per word
+Every input word yields at most one term, and a number with a % sign two,
+so term positions still follow word order for phrase and proximity
+matching.
+
+Queries additionally go through synonym expansion: FINANCE_SYNONYMS is
+analyzed once into a table keyed by term sequences, and a query mentioning
+any member of a group ("EPS") also searches for the others ("earnings per
+share"). Query analysis is memoized per distinct query string.
+
+RAG_ANALYZER picks the analyzer: finance (default) or simple (the original
+lowercase / split / stopword tokenizer). The analyzer spec is recorded in
+the index, so switching it triggers a full re-index.
+"""
+import os
+import re
+from functools import lru_cache
+from typing import List, Dict, Any, Tuple, Sequence
+
+STOPWORDS = {"the", "a", "an", "and", "or", "but", "in", "on", "at", "to", "for", "with", "by", "as", "is", "are", "was", "were", "it", "this", "that"}
+
+# Each group lists interchangeable ways of saying one thing
+FINANCE_SYNONYMS = [
+    ["eps", "earnings per share"],
+    ["capex", "capital expenditures"],
+    ["opex", "operating expenses"],
+    ["fcf", "free cash flow"],
+    ["rpo", "remaining performance obligation"],
+    ["ebitda", "earnings before interest taxes depreciation and amortization"],
+    ["cogs", "cost of revenue", "cost of goods sold"],
+    ["yoy", "year over year", "year on year"],
+    ["qoq", "quarter over quarter", "sequential"],
+    ["fx", "foreign exchange", "currency"],
+    ["tam", "total addressable market"],
+    ["arr", "annual recurring revenue"],
+    ["ai", "artificial intelligence"],
+    ["buyback", "share repurchase"],
+    ["guidance", "outlook"],
+    ["percent", "pct"],
+]
+
+ANALYZER = os.environ.get("RAG_ANALYZER", "finance")
+QUERY_MEMO_SIZE = 4096
+
+_SIMPLE_TOKEN = re.compile(r'[a-z0-9]+')
+# Words, or numbers with decimal / thousands separators and an optional percent sign
+_TOKEN = re.compile(r'[a-z0-9]+(?:[.,][0-9]+)*%?')
+_THOUSANDS = re.compile(r'^[0-9]{1,3}(?:,[0-9]{3})+(?:\.[0-9]+)?$')
+_VOWEL = re.compile(r'[aeiouy]')
+
+# Words the suffix rules would mangle, or merge with another word ("news" / "new")
+STEM_EXCEPTIONS = {
+    "news", "bias", "alias", "atlas", "canvas", "lens", "overseas", "whereas",
+    "series", "species", "hundred",
+}
+# Bumped whenever stem() changes, so indexes built with the old terms are rebuilt
+STEMMER_VERSION = 2
+
+@lru_cache(maxsize=1 << 16)
+def stem(word: str) -> str:
+    """Light English suffix stripping; only ever shortens alphabetic words longer than 3 letters."""
+    if len(word) <= 3 or not word.isalpha() or word in STEM_EXCEPTIONS:
+        return word
+    # Plurals
+    if word.endswith("sses"):
+        word = word[:-2]
+    elif word.endswith("ies") and len(word) > 4:
+        word = word[:-3] + "y"
+    elif word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        word = word[:-1]
+    if word in STEM_EXCEPTIONS:
+        return word
+    # Verb endings, when a syllable is left
+    for suffix in ("ing", "ed"):
+        if word.endswith(suffix):
+            base = word[:-len(suffix)]
+            if suffix == "ed" and base.endswith("e"):
+                # An -e verb only adds "d" (agreed -> agree); "speed", "need", "feed" are no past tense
+                if _VOWEL.search(base[:-1]):
+                    word = word[:-1]
+            elif len(base) >= 3 and _VOWEL.search(base):
+                word = base
+                # planned -> plan, but keep "ll" / "ss" / "zz" (billed -> bill)
+                if len(word) > 3 and word[-1] == word[-2] and word[-1] not in "lsz" and word[-1] not in "aeiou":
+                    word = word[:-1]
+            break
+    # Silent e, so "increase" meets "increased"
+    if len(word) > 4 and word.endswith("e"):
+        word = word[:-1]
+    return word
+
+def normalize_number(token: str) -> List[str]:
+    """Terms for a numeric token: separators resolved, trailing zeros and % sign split off."""
+    percent = token.endswith("%")
+    if percent:
+        token = token[:-1]
+    if _THOUSANDS.match(token):
+        token = token.replace(",", "")
+    parts = []
+    for part in token.split(","):
+        if "." in part:
+            part = part.rstrip("0").rstrip(".") or "0"
+        parts.append(part)
+    return parts + (["percent"] if percent else [])
+
+class Analyzer:
+    """Text -> terms for the index, and query text -> terms (with expansions) for searching."""
+
+    def __init__(self, name: str, stemming: bool = True, numbers: bool = True,
+                 synonyms: Sequence[Sequence[str]] = ()):
+        self.name = name
+        self.stemming = stemming
+        self.numbers = numbers
+        self.synonyms = [list(group) for group in synonyms]
+        self.expansions = self._compile(self.synonyms)
+        self.longest = max((len(key) for key in self.expansions), default=0)
+        self.query = lru_cache(maxsize=QUERY_MEMO_SIZE)(self._query)
+
+    def spec(self) -> Dict[str, Any]:
+        """Everything that changes index terms; synonyms only touch queries."""
+        return {"name": self.name, "stemming": self.stemming, "numbers": self.numbers,
+                "stemmer": STEMMER_VERSION if self.stemming else None}
+
+    def terms(self, text: str) -> List[str]:
+        text = text.lower()
+        if not self.numbers:
+            words = _SIMPLE_TOKEN.findall(text)
+        else:
+            words = []
+            for token in _TOKEN.findall(text):
+                if token[0].isdigit() and not token.isalnum():
+                    words.extend(normalize_number(token))
+                elif token.isalnum():
+                    words.append(token)
+                else:
+                    # Letters glued to a separator ("q3.5", "rev,2025"): plain word split
+                    words.extend(_SIMPLE_TOKEN.findall(token))
+        if self.stemming:
+            return [stem(w) for w in words if w not in STOPWORDS]
+        return [w for w in words if w not in STOPWORDS]
+
+    def _compile(self, groups: List[List[str]]) -> Dict[Tuple[str, ...], Tuple[Tuple[str, ...], ...]]:
+        """Synonym groups -> {term sequence: the other members' term sequences}, analyzed like the index."""
+        table: Dict[Tuple[str, ...], Tuple[Tuple[str, ...], ...]] = {}
+        for group in groups:
+            forms = list(dict.fromkeys(tuple(self.terms(phrase)) for phrase in group))
+            forms = [form for form in forms if form]
+            for form in forms:
+                others = tuple(other for other in forms if other != form)
+                table[form] = tuple(dict.fromkeys(table.get(form, ()) + others))
+        return table
+
+    def _query(self, query_text: str) -> Tuple[str, ...]:
+        tokens = self.terms(query_text)
+        extra: List[str] = []
+        # Longest match first at every position, so "earnings per share" beats a bare "share" entry
+        i = 0
+        while i < len(tokens):
+            for n in range(min(self.longest, len(tokens) - i), 0, -1):
+                expansions = self.expansions.get(tuple(tokens[i:i + n]))
+                if expansions:
+                    for form in expansions:
+                        extra.extend(t for t in form if t not in tokens and t not in extra)
+                    i += n
+                    break
+            else:
+                i += 1
+        return tuple(tokens + extra)
+
+ANALYZERS = {
+    "finance": Analyzer("finance", synonyms=FINANCE_SYNONYMS),
+    "simple": Analyzer("simple", stemming=False, numbers=False),
+}
+
+def get_analyzer(name: str = ANALYZER) -> Analyzer:
+    if name not in ANALYZERS:
+        print(f"[WARNING] Unknown RAG_ANALYZER '{name}', using finance.")
+    return ANALYZERS.get(name, ANALYZERS["finance"])
+
+analyzer = get_analyzer()
@@ -0,0 +1,54 @@
+"""
+Retrieval backends behind search_index.
+
+A backend owns its on-disk index (building, incremental updates, loading)
+and answers SearchQuery objects. RAG_BACKEND picks one at startup:
+  bm25  - the in-process sharded BM25Okapi engine (default)
+  fts5  - SQLite FTS5 with its built-in bm25() ranking, answered from disk
+"""
+import os
+from abc import ABC, abstractmethod
+from typing import List, Dict, Any, Optional
+from .schemas import SearchQuery, SearchResult, ChunkRecord
+from .indexer import UpdatePlan, ProgressCallback, _no_progress
+
+BACKEND = os.environ.get("RAG_BACKEND", "bm25")
+
+class SearchBackend(ABC):
+    """Interface every retrieval backend implements; a backend missing a method cannot be instantiated."""
+
+    name = ""
+
+    @property
+    @abstractmethod
+    def num_docs(self) -> int:
+        ...
+
+    @property
+    @abstractmethod
+    def generation(self) -> int:
+        """Changes whenever searches may start returning different results."""
+
+    @abstractmethod
+    def prepare(self, transcripts_dir: str) -> Optional[UpdatePlan]:
+        """
+        Makes sure an index is being served, like indexer.build_index_if_needed:
+        returns the pending changes to apply in the background, or None.
+        """
+
+    @abstractmethod
+    def build(self, transcripts_dir: str, progress: ProgressCallback = _no_progress) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    def update(self, transcripts_dir: str, plan: Optional[UpdatePlan] = None,
+               progress: ProgressCallback = _no_progress) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    def search(self, query: SearchQuery) -> List[SearchResult]:
+        ...
+
+    @abstractmethod
+    def get_chunk(self, chunk_id: str) -> Optional[ChunkRecord]:
+        ...
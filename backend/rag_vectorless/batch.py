@@ -0,0 +1,119 @@
+"""
+Batched search: a block of queries is scored with one sparse matrix product
+instead of running search_index once per query.
+
+    scores = Q @ W
+      Q  queries x terms   Q[q, t] = idf[t] * qf(q, t)
+      W  terms x chunks    W[t, d] = tf * (k1 + 1) / (tf + doc_norm[d])
+
+W is exactly the postings arrays viewed as a CSR matrix, built once per shard
+and generation. idf and doc_norm are the snapshot's corpus-wide statistics
+(see shards.CorpusStats), as in search_index. Queries are grouped by the shards they route to, each shard
+scores its group in parallel with the others, and per-query results are merged
+into a global top-k. Filters, phrases, boosts and top-k run per query row on
+NumPy arrays.
+"""
+import weakref
+from typing import List, Dict, Optional, Tuple
+import numpy as np
+import scipy.sparse as sp
+from .schemas import SearchQuery, SearchResult
+from .indexer import get_index, tokenize, analyze_query
+from .inverted import InvertedIndex
+from .search import apply_boosts, top_results, merge_results, get_backend
+from .shards import CorpusStats, IndexShard, scatter
+from .phrase import PositionReader, parse_phrases, phrase_candidates, apply_proximity
+
+# Queries scored per matrix product; bounds the size of the dense-ish score block
+BLOCK_SIZE = 256
+
+_weight_matrices: "weakref.WeakKeyDictionary[InvertedIndex, Tuple[Optional[float], sp.csr_matrix]]" = weakref.WeakKeyDictionary()
+
+def weight_matrix(inverted: InvertedIndex, avgdl: Optional[float] = None) -> sp.csr_matrix:
+    """Term x chunk BM25 weight matrix (against `avgdl` if given), cached for the lifetime of `inverted`."""
+    cached = _weight_matrices.get(inverted)
+    matrix = cached[1] if cached is not None and cached[0] == avgdl else None
+    if matrix is None:
+        tfs = inverted.tfs.astype(np.float64)
+        data = tfs * (inverted.k1 + 1) / (tfs + inverted.doc_norms(inverted.doc_ids, avgdl))
+        matrix = sp.csr_matrix(
+            (data, inverted.doc_ids, inverted.indptr),
+            shape=(len(inverted.indptr) - 1, inverted.num_docs)
+        )
+        _weight_matrices[inverted] = (avgdl, matrix)
+    return matrix
+
+def query_matrix(inverted: InvertedIndex, queries: List[SearchQuery], stats: Optional[CorpusStats] = None) -> sp.csr_matrix:
+    rows, cols, values = [], [], []
+    for row, query in enumerate(queries):
+        tokens = analyze_query(query.query)
+        idf = stats.query_idf(inverted, tokens) if stats else inverted.idf
+        for term_id, qf in inverted.encode_query(tokens):
+            rows.append(row)
+            cols.append(term_id)
+            values.append(idf[term_id] * qf)
+    return sp.csr_matrix((values, (rows, cols)), shape=(len(queries), len(inverted.indptr) - 1))
+
+def search_batch(queries: List[SearchQuery]) -> List[List[SearchResult]]:
+    """Results for every query, in order; same ranking as search_index."""
+    backend = get_backend()
+    if backend.name != "bm25":
+        # Other backends have no batched path; they answer one query at a time
+        return [backend.search(query) for query in queries]
+
+    # One generation for the whole batch, like search_index does per query
+    index = get_index().snapshot
+    if index is None or not index.num_docs:
+        return [[] for _ in queries]
+
+    # Route every query up front so a bad filter fails the batch before any scoring
+    by_shard: Dict[str, List[int]] = {}
+    for i, query in enumerate(queries):
+        for shard in index.router.route(query.filters):
+            by_shard.setdefault(shard.key, []).append(i)
+
+    def run(shard: IndexShard) -> List[List[SearchResult]]:
+        return _search_shard(shard, [queries[i] for i in by_shard[shard.key]], index.stats)
+
+    shards = [index.shards[key] for key in sorted(by_shard)]
+    per_query: List[List[List[SearchResult]]] = [[] for _ in queries]
+    for shard, shard_results in zip(shards, scatter(run, shards)):
+        for i, results in zip(by_shard[shard.key], shard_results):
+            per_query[i].append(results)
+    return [merge_results(per_shard, query.top_k) for query, per_shard in zip(queries, per_query)]
+
+def _search_shard(shard: IndexShard, queries: List[SearchQuery],
+                  stats: Optional[CorpusStats] = None) -> List[List[SearchResult]]:
+    candidates = [shard.metadata_index.candidates(q.filters or {}) for q in queries]
+    reader = PositionReader(shard.inverted)
+    for i, query in enumerate(queries):
+        phrases = [tokenize(p) for p in parse_phrases(query.query)]
+        if phrases:
+            candidates[i] = phrase_candidates(reader, phrases, candidates[i])
+
+    weights = weight_matrix(shard.inverted, stats.avgdl if stats else None)
+    results: List[List[SearchResult]] = []
+    for start in range(0, len(queries), BLOCK_SIZE):
+        block = queries[start:start + BLOCK_SIZE]
+        scores = (query_matrix(shard.inverted, block, stats) @ weights).tocsr()
+
+        for row, query in enumerate(block):
+            lo, hi = scores.indptr[row], scores.indptr[row + 1]
+            doc_ids = scores.indices[lo:hi].astype(np.int64)
+            values = scores.data[lo:hi]
+
+            keep = values > 0
+            allowed = candidates[start + row]
+            if allowed is not None:
+                pos = np.searchsorted(allowed, doc_ids)
+                inside = pos < len(allowed)
+                inside[inside] = allowed[pos[inside]] == doc_ids[inside]
+                keep &= inside
+            doc_ids, values = doc_ids[keep], values[keep]
+
+            values = apply_boosts(shard, query.query, doc_ids, values)
+            if query.proximity_boost > 0:
+                term_ids = [t for t, _ in shard.inverted.encode_query(analyze_query(query.query))]
+                values = apply_proximity(reader, term_ids, doc_ids, values, query.proximity_boost, query.top_k)
+            results.append(top_results(shard, doc_ids, values, query.top_k))
+    return results
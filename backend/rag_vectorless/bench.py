@@ -0,0 +1,245 @@
+"""
+Retrieval quality and latency benchmark over the bundled transcripts.
+
+    python -m rag_vectorless.bench --sweep 200:40,400:80,600:120 --out bench.json
+
+Each chunking config (chunk size : overlap, in words) gets a fresh index
+built into a temporary directory, which is then measured for:
+  quality  - recall@k, MRR and nDCG@k against the golden query set
+  build    - wall time of a full build and the size of the files it wrote
+  load     - time for a new backend object to start serving the built index
+             (what server startup does with a warm cache)
+  latency  - p50 / p99 per query over `repeat` rounds, query cache disabled
+
+Golden relevance is given as passages rather than chunk ids, so one golden
+set serves every chunk size: a passage is the words of the phrase `contains`
+in `file`, and a hit is relevant when its word range (start_word_idx /
+end_word_idx) overlaps one. Each passage earns its gain once, at the first
+hit that covers it.
+"""
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+from .schemas import SearchQuery, SearchResult
+from .backends import SearchBackend
+from .indexer import BM25Index
+from .search import BM25Backend
+from .fts import FTS5Backend
+from .cache import query_cache
+
+GOLDEN_FILE = "./benchmarks/golden_queries.json"
+DEFAULT_SWEEP = "200:40,400:80,600:120"
+
+_PUNCTUATION = ".,;:!?\"'()[]\u201c\u201d\u2018\u2019\ufeff"
+
+def _normalize(word: str) -> str:
+    return word.strip(_PUNCTUATION).lower()
+
+class Passage:
+    """Word range [start, end) of one transcript that answers a golden query."""
+
+    def __init__(self, file_name: str, start: int, end: int, grade: int):
+        self.file_name = file_name
+        self.start = start
+        self.end = end
+        self.grade = grade
+
+    def covered_by(self, result: SearchResult) -> bool:
+        meta = result.metadata
+        return meta.file_name == self.file_name and meta.start_word_idx < self.end and self.start < meta.end_word_idx
+
+def locate(words: List[str], phrase: str) -> Optional[Tuple[int, int]]:
+    """Word range of the first occurrence of `phrase` in `words` (normalized), or None."""
+    target = [_normalize(w) for w in phrase.split()]
+    n = len(target)
+    for i in range(len(words) - n + 1):
+        if words[i] == target[0] and words[i:i + n] == target:
+            return i, i + n
+    return None
+
+def load_golden(path: str, transcripts_dir: str) -> List[Dict[str, Any]]:
+    """Golden queries with their passages resolved to word ranges."""
+    with open(path, "r", encoding="utf-8") as f:
+        queries = json.load(f)["queries"]
+
+    words: Dict[str, List[str]] = {}
+    golden = []
+    for q in queries:
+        passages = []
+        for rel in q["relevant"]:
+            if rel["file"] not in words:
+                # Same word split as the chunker, so indexes line up with start_word_idx
+                with open(os.path.join(transcripts_dir, rel["file"]), "r", encoding="utf-8") as f:
+                    words[rel["file"]] = [_normalize(w) for w in f.read().split()]
+            span = locate(words[rel["file"]], rel["contains"])
+            if span is None:
+                print(f"[WARNING] Golden passage not found in {rel['file']}: {rel['contains']!r}")
+                continue
+            passages.append(Passage(rel["file"], span[0], span[1], rel.get("grade", 1)))
+        if passages:
+            golden.append({"query": q["query"], "filters": q.get("filters"), "passages": passages})
+    return golden
+
+def judge(results: List[SearchResult], passages: List[Passage]) -> List[int]:
+    """
+    Gain of each ranked hit: the best grade among the passages it is the
+    first to cover, 0 if it covers nothing new.
+    """
+    seen = set()
+    gains = []
+    for result in results:
+        new = [i for i, p in enumerate(passages) if i not in seen and p.covered_by(result)]
+        seen.update(new)
+        gains.append(max((passages[i].grade for i in new), default=0))
+    return gains
+
+def query_metrics(results: List[SearchResult], passages: List[Passage], k: int) -> Dict[str, float]:
+    results = results[:k]
+    gains = judge(results, passages)
+    covered = sum(any(p.covered_by(r) for r in results) for p in passages)
+    first = next((rank for rank, gain in enumerate(gains) if gain), None)
+    discounts = 1.0 / np.log2(np.arange(2, k + 2))
+    dcg = float(np.dot([2 ** g - 1 for g in gains], discounts[:len(gains)]))
+    ideal = sorted((p.grade for p in passages), reverse=True)[:k]
+    idcg = float(np.dot([2 ** g - 1 for g in ideal], discounts[:len(ideal)]))
+    return {
+        "recall": covered / len(passages),
+        "mrr": 1.0 / (first + 1) if first is not None else 0.0,
+        "ndcg": dcg / idcg if idcg else 0.0,
+    }
+
+def evaluate(backend: SearchBackend, golden: List[Dict[str, Any]], k: int) -> Dict[str, Any]:
+    """Mean recall@k, MRR and nDCG@k over the golden set, plus the per-query numbers."""
+    per_query = []
+    for q in golden:
+        results = backend.search(SearchQuery(query=q["query"], filters=q["filters"], top_k=k))
+        per_query.append({"query": q["query"], **query_metrics(results, q["passages"], k)})
+    means = {
+        name: round(float(np.mean([m[name] for m in per_query])), 4) if per_query else 0.0
+        for name in ("recall", "mrr", "ndcg")
+    }
+    return {**means, "queries": per_query}
+
+def time_queries(backend: SearchBackend, golden: List[Dict[str, Any]], k: int, repeat: int) -> Dict[str, float]:
+    """Per-query latency percentiles in milliseconds, with the result cache switched off."""
+    queries = [SearchQuery(query=q["query"], filters=q["filters"], top_k=k) for q in golden]
+    max_entries = query_cache.max_entries
+    query_cache.max_entries = 0
+    query_cache.clear()
+    try:
+        # One untimed round warms page cache and lazy structures
+        for query in queries:
+            backend.search(query)
+        samples = []
+        for _ in range(repeat):
+            for query in queries:
+                started = time.perf_counter()
+                backend.search(query)
+                samples.append((time.perf_counter() - started) * 1000)
+    finally:
+        query_cache.max_entries = max_entries
+    return {
+        "p50_ms": round(float(np.percentile(samples, 50)), 3) if samples else 0.0,
+        "p99_ms": round(float(np.percentile(samples, 99)), 3) if samples else 0.0,
+        "samples": len(samples),
+    }
+
+def make_backend(name: str, directory: str, chunk_size: int, overlap: int) -> SearchBackend:
+    if name == "fts5":
+        return FTS5Backend(os.path.join(directory, "fts5.db"), chunk_size, overlap)
+    return BM25Backend(BM25Index(directory, chunk_size=chunk_size, overlap=overlap))
+
+def _dir_size(directory: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(root, f))
+        for root, _, files in os.walk(directory) for f in files
+    )
+
+def run_config(transcripts_dir: str, golden: List[Dict[str, Any]], chunk_size: int, overlap: int,
+               backend_name: str = "bm25", k: int = 5, repeat: int = 5, loads: int = 5) -> Dict[str, Any]:
+    """Builds one chunking config from scratch and measures it."""
+    directory = tempfile.mkdtemp(prefix="rag_bench_")
+    try:
+        backend = make_backend(backend_name, directory, chunk_size, overlap)
+        started = time.perf_counter()
+        build = backend.build(transcripts_dir)
+        build_seconds = time.perf_counter() - started
+
+        load_times = []
+        for _ in range(loads):
+            fresh = make_backend(backend_name, directory, chunk_size, overlap)
+            started = time.perf_counter()
+            fresh.prepare(transcripts_dir)
+            load_times.append(time.perf_counter() - started)
+
+        quality = evaluate(backend, golden, k)
+        return {
+            "backend": backend_name,
+            "chunk_size": chunk_size,
+            "overlap": overlap,
+            "chunks": backend.num_docs,
+            "dedup": build.get("dedup"),
+            "build_seconds": round(build_seconds, 4),
+            "index_bytes": _dir_size(directory),
+            "load_seconds": round(float(np.median(load_times)), 4),
+            "latency": time_queries(backend, golden, k, repeat),
+            "k": k,
+            "recall": quality["recall"],
+            "mrr": quality["mrr"],
+            "ndcg": quality["ndcg"],
+            "queries": quality["queries"],
+        }
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+def parse_sweep(spec: str) -> List[Tuple[int, int]]:
+    """"200:40,400:80" -> [(200, 40), (400, 80)]"""
+    configs = []
+    for part in spec.split(","):
+        size, _, overlap = part.strip().partition(":")
+        configs.append((int(size), int(overlap or 0)))
+    for size, overlap in configs:
+        if size <= 0 or not 0 <= overlap < size:
+            raise ValueError(f"Invalid chunking config {size}:{overlap}")
+    return configs
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description="Retrieval quality and latency benchmark")
+    parser.add_argument("--transcripts", default="./transcripts")
+    parser.add_argument("--golden", default=GOLDEN_FILE)
+    parser.add_argument("--backend", default="bm25", choices=("bm25", "fts5"))
+    parser.add_argument("--sweep", default=DEFAULT_SWEEP, help="chunk_size:overlap pairs, comma separated")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=5, help="timed rounds over the golden queries")
+    parser.add_argument("--out", help="write the full report here as JSON")
+    args = parser.parse_args(argv)
+
+    golden = load_golden(args.golden, args.transcripts)
+    runs = [
+        run_config(args.transcripts, golden, size, overlap, args.backend, args.k, args.repeat)
+        for size, overlap in parse_sweep(args.sweep)
+    ]
+    report = {"golden_queries": len(golden), "runs": runs}
+
+    print(f"\n{len(golden)} golden queries, backend={args.backend}, k={args.k}")
+    print(f"{'chunking':>10} {'chunks':>7} {'recall':>7} {'mrr':>6} {'ndcg':>6} "
+          f"{'build s':>8} {'size KB':>8} {'load ms':>8} {'p50 ms':>7} {'p99 ms':>7}")
+    for run in runs:
+        print(f"{run['chunk_size']:>6}:{run['overlap']:<3} {run['chunks']:>7} {run['recall']:>7.3f} "
+              f"{run['mrr']:>6.3f} {run['ndcg']:>6.3f} {run['build_seconds']:>8.2f} "
+              f"{run['index_bytes'] / 1024:>8.0f} {run['load_seconds'] * 1000:>8.1f} "
+              f"{run['latency']['p50_ms']:>7.2f} {run['latency']['p99_ms']:>7.2f}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.out}")
+    return report
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Result cache for search_index.
+
+Entries are keyed on what actually determines a ranking: the normalized
+query tokens, the boost rules the raw query triggers (e.g. a trailing "?"),
+the filters, top_k and ranking options such as quoted phrases. Every entry
+belongs to one index generation; the first lookup against a newer generation
+drops the whole cache, so a rebuild can never serve stale hits.
+"""
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
+from .schemas import SearchQuery, SearchResult
+from .ranking import boost_rules
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_TTL = 300.0
+
+CacheKey = Tuple[Any, ...]
+
+def search_key(query: SearchQuery, tokens: List[str], phrases: List[List[str]]) -> CacheKey:
+    """Cache key of one search, given its analyzed terms and tokenized quoted phrases; shared by every backend."""
+    options = (tuple(tuple(p) for p in phrases), query.proximity_boost)
+    return QueryCache.key(tokens, boost_rules.triggered(query.query), query.filters or {}, query.top_k, options)
+
+class QueryCache:
+    """Thread-safe LRU with a per-entry TTL. max_entries=0 disables caching."""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl: float = DEFAULT_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[CacheKey, Tuple[float, List[SearchResult]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key(tokens: List[str], boosts: Tuple[int, ...], filters: Optional[Dict[str, Any]], top_k: int,
+            options: Tuple[Any, ...] = ()) -> CacheKey:
+        return (tuple(tokens), boosts, json.dumps(filters or {}, sort_keys=True, default=str), top_k, options)
+
+    def get(self, generation: int, key: CacheKey) -> Optional[List[SearchResult]]:
+        with self._lock:
+            self._sync(generation)
+            entry = self._entries.get(key) if generation == self.generation else None
+            if entry is not None and entry[0] < time.monotonic():
+                del self._entries[key]
+                self.evictions += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return list(entry[1])
+
+    def put(self, generation: int, key: CacheKey, results: List[SearchResult]):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._sync(generation)
+            # A search that was pinned to an older snapshot finished after the swap
+            if generation != self.generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, list(results))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _sync(self, generation: int):
+        if generation > self.generation:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self.generation = generation
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "generation": self.generation,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+query_cache = QueryCache(
+    max_entries=int(os.environ.get("RAG_QUERY_CACHE_SIZE", DEFAULT_MAX_ENTRIES)),
+    ttl=float(os.environ.get("RAG_QUERY_CACHE_TTL", DEFAULT_TTL)),
+)
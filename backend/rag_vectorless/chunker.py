@@ -1,5 +1,6 @@
 import re
-from typing import List, Dict, Any
+from bisect import bisect_left
+from typing import List, Dict, Any, Iterable, Iterator
 from .schemas import ChunkRecord, ChunkMetadata
 import hashlib
 
@@ -12,95 +13,123 @@ SECTION_MARKERS = [
     "Operator"
 ]
 
+_WORD = re.compile(r'\S+')
+
+# Default window: chunk length and overlap with the previous chunk, in words
+CHUNK_SIZE = 400
+CHUNK_OVERLAP = 80
+
+def match_section_marker(line: str) -> str:
+    """Section marker a line opens, or "" if it is ordinary text."""
+    line_clean = line.strip()
+    for marker in SECTION_MARKERS:
+        # Case insensitive exact or close match
+        if line_clean.lower() == marker.lower() or (len(line_clean) < 50 and marker.lower() in line_clean.lower()):
+            return marker
+    return ""
+
+class SectionTracker:
+    """
+    Section boundaries discovered while streaming through a document.
+    A word on a boundary belongs to the earlier section, matching the old
+    inclusive [start_word, end_word] ranges.
+    """
+
+    def __init__(self):
+        self.starts: List[int] = [0]
+        self.names: List[str] = ["General"]
+
+    def mark(self, name: str, word_idx: int):
+        if word_idx > self.starts[-1]:
+            self.starts.append(word_idx)
+            self.names.append(name)
+        else:
+            # Empty section: the new header simply renames it
+            self.names[-1] = name
+
+    def section_at(self, word_idx: int) -> str:
+        return self.names[max(bisect_left(self.starts, word_idx) - 1, 0)]
+
 def find_sections(text: str) -> List[Dict[str, Any]]:
     """Simple heuristic to find sections based on common headers."""
-    sections = []
-    current_section = "General"
-    current_start = 0
-    
-    lines = text.split('\n')
-    
+    tracker = SectionTracker()
+    word_count = 0
+    for line in text.split('\n'):
+        marker = match_section_marker(line)
+        if marker:
+            tracker.mark(marker, word_count)
+        word_count += len(_WORD.findall(line))
+
+    ends = tracker.starts[1:] + [word_count]
+    return [
+        {"name": name, "start_word": start, "end_word": end}
+        for name, start, end in zip(tracker.names, tracker.starts, ends)
+    ]
+
+def iter_chunks(lines: Iterable[str], file_name: str, file_path: str, meta: Dict[str, Any],
+                chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> Iterator[ChunkRecord]:
+    """
+    Single pass over a document's lines: detects sections, splits words and
+    yields overlapping chunks as soon as each window is complete. Only the
+    current window of words is held, so memory stays flat for large filings.
+    """
+    step = chunk_size - overlap
+    sections = SectionTracker()
+    window: List[str] = []
+    window_start = 0        # global index of window[0]
     word_count = 0
-    for line in lines:
-        line_clean = line.strip()
-        for marker in SECTION_MARKERS:
-            # Case insensitive exact or close match
-            if line_clean.lower() == marker.lower() or (len(line_clean) < 50 and marker.lower() in line_clean.lower()):
-                if word_count > current_start:
-                    sections.append({
-                        "name": current_section,
-                        "start_word": current_start,
-                        "end_word": word_count
-                    })
-                current_section = marker
-                current_start = word_count
-                break
-        
-        words_in_line = len(re.findall(r'\S+', line))
-        word_count += words_in_line
-        
-    sections.append({
-        "name": current_section,
-        "start_word": current_start,
-        "end_word": word_count
-    })
-    
-    return sections
-
-def get_section_for_word(word_idx: int, sections: List[Dict[str, Any]]) -> str:
-    for sec in sections:
-        if sec["start_word"] <= word_idx <= sec["end_word"]:
-            return sec["name"]
-        if sec == sections[-1] and word_idx >= sec["end_word"]:
-            return sec["name"]
-    return "Unknown"
-
-def chunk_text(doc: Dict[str, Any], chunk_size: int = 400, overlap: int = 80) -> List[ChunkRecord]:
-    text = doc["text"]
-    meta = doc["metadata"]
-    filename = doc["file_name"]
-    filepath = doc["file_path"]
-    
-    sections = find_sections(text)
-    
-    words = re.findall(r'\S+', text)
-    
-    chunks = []
     start_idx = 0
-    
-    while start_idx < len(words):
-        end_idx = min(start_idx + chunk_size, len(words))
-        
-        chunk_words = words[start_idx:end_idx]
-        chunk_text_str = " ".join(chunk_words)
-        
-        mid_idx = start_idx + (len(chunk_words) // 2)
-        section = get_section_for_word(mid_idx, sections)
-        
+    last_end = 0
+
+    def make_chunk(start: int, end: int) -> ChunkRecord:
+        chunk_words = window[start - window_start:end - window_start]
+        mid_idx = start + (len(chunk_words) // 2)
+        section = sections.section_at(mid_idx)
+
         if "q&a" in section.lower() or "question-and-answer" in section.lower():
             section = "q&a"
-            
-        chunk_id = hashlib.md5(f"{filename}_{start_idx}_{end_idx}".encode()).hexdigest()[:12]
-        
+
+        chunk_id = hashlib.md5(f"{file_name}_{start}_{end}".encode()).hexdigest()[:12]
+
         chunk_meta = ChunkMetadata(
             chunk_id=chunk_id,
-            file_name=filename,
-            file_path=filepath,
+            file_name=file_name,
+            file_path=file_path,
             company=meta.get("company", "unknown"),
             fy=meta.get("fy", "unknown"),
             quarter=meta.get("quarter", "unknown"),
             date=meta.get("date", "unknown"),
             title=meta.get("title"),
             section=section,
-            start_word_idx=start_idx,
-            end_word_idx=end_idx
+            start_word_idx=start,
+            end_word_idx=end
         )
-        
-        chunks.append(ChunkRecord(text=chunk_text_str, metadata=chunk_meta))
-        
-        if end_idx == len(words):
-            break
-            
-        start_idx += (chunk_size - overlap)
-        
-    return chunks
+        return ChunkRecord(text=" ".join(chunk_words), metadata=chunk_meta)
+
+    for line in lines:
+        marker = match_section_marker(line)
+        if marker:
+            sections.mark(marker, word_count)
+        line_words = _WORD.findall(line)
+        window.extend(line_words)
+        word_count += len(line_words)
+
+        while word_count >= start_idx + chunk_size:
+            last_end = start_idx + chunk_size
+            yield make_chunk(start_idx, last_end)
+            start_idx += step
+            # Drop words no later chunk can reach
+            del window[:start_idx - window_start]
+            window_start = start_idx
+
+    # Trailing partial chunk, unless the last full window already ended the text
+    if start_idx < word_count and last_end != word_count:
+        yield make_chunk(start_idx, word_count)
+
+def chunk_file(source: Dict[str, Any], chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> Iterator[ChunkRecord]:
+    """Streams chunks straight from a transcript file (see loader.list_transcripts)."""
+    with open(source["file_path"], "r", encoding="utf-8") as f:
+        yield from iter_chunks(f, source["file_name"], source["file_path"], source["metadata"], chunk_size, overlap)
+
+def chunk_text(doc: Dict[str, Any], chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> List[ChunkRecord]:
+    return list(iter_chunks(doc["text"].split('\n'), doc["file_name"], doc["file_path"], doc["metadata"], chunk_size, overlap))
@@ -0,0 +1,134 @@
+"""
+Packs search hits into the transcript context of an LLM prompt.
+
+Chunks overlap by 80 words, so the top hits of one query often repeat the
+same passage. Packing:
+  1. merges hits from the same file whose word ranges overlap or touch
+     (start_word_idx / end_word_idx) into one passage, keeping the best score
+  2. drops passages that are near-duplicates of a better one (e.g. the same
+     remarks filed twice), by word-shingle overlap
+  3. fills the token budget best passage first; a passage that does not fit
+     is cut to the remaining budget if enough of it is left
+
+Prompt size is the main driver of LLM latency, so the stats report how many
+tokens packing saved against joining the raw hits.
+"""
+import os
+from typing import List, Dict, Tuple, Optional
+from .schemas import SearchResult, ContextStats
+
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("RAG_CONTEXT_TOKENS", 3000))
+
+# Passages sharing this fraction of their word shingles count as duplicates
+DUPLICATE_THRESHOLD = 0.8
+SHINGLE_SIZE = 5
+# Cutting a passage down further than this leaves nothing useful
+MIN_PASSAGE_TOKENS = 60
+
+def estimate_tokens(text: str) -> int:
+    """Rough LLM token count; about 4 characters per token for English text."""
+    return (len(text) + 3) // 4
+
+class Passage:
+    """A run of consecutive words of one transcript, built from one or more hits."""
+
+    def __init__(self, result: SearchResult):
+        self.company = result.metadata.company
+        self.file_name = result.metadata.file_name
+        self.start = result.metadata.start_word_idx
+        self.end = result.metadata.end_word_idx
+        # Chunk text is the chunk's words joined by single spaces
+        self.words = result.text.split(" ")
+        self.score = result.score
+        self.chunk_ids = [result.metadata.chunk_id]
+
+    def absorb(self, result: SearchResult):
+        """Extends the passage with a hit that overlaps or touches it."""
+        meta = result.metadata
+        if meta.end_word_idx > self.end:
+            self.words.extend(result.text.split(" ")[self.end - meta.start_word_idx:])
+            self.end = meta.end_word_idx
+        self.score = max(self.score, result.score)
+        self.chunk_ids.append(meta.chunk_id)
+
+    def shingles(self) -> set:
+        words = [w.lower() for w in self.words]
+        return {tuple(words[i:i + SHINGLE_SIZE]) for i in range(max(1, len(words) - SHINGLE_SIZE + 1))}
+
+    def render(self, words: Optional[List[str]] = None) -> str:
+        return f"[{self.company.upper()}] {' '.join(self.words if words is None else words)}"
+
+def merge_hits(results: List[SearchResult]) -> List[Passage]:
+    """Hits merged into passages per file, best passage first."""
+    by_file: Dict[str, List[SearchResult]] = {}
+    for result in results:
+        by_file.setdefault(result.metadata.file_name, []).append(result)
+
+    passages = []
+    for hits in by_file.values():
+        hits.sort(key=lambda r: (r.metadata.start_word_idx, r.metadata.end_word_idx))
+        current = None
+        for hit in hits:
+            if current is not None and hit.metadata.start_word_idx <= current.end:
+                current.absorb(hit)
+            else:
+                current = Passage(hit)
+                passages.append(current)
+    passages.sort(key=lambda p: -p.score)
+    return passages
+
+def drop_near_duplicates(passages: List[Passage], threshold: float = DUPLICATE_THRESHOLD) -> List[Passage]:
+    """Keeps the first (best) of every group of near-identical passages."""
+    kept: List[Tuple[Passage, set]] = []
+    for passage in passages:
+        shingles = passage.shingles()
+        # Overlap relative to the smaller passage, so a passage repeated inside a longer one also goes
+        if any(len(shingles & other) >= threshold * min(len(shingles), len(other)) for _, other in kept):
+            continue
+        kept.append((passage, shingles))
+    return [passage for passage, _ in kept]
+
+def pack_context(results: List[SearchResult], token_budget: int = CONTEXT_TOKEN_BUDGET) -> Tuple[str, ContextStats]:
+    """Context string for `results` within `token_budget`, plus what packing saved."""
+    raw_tokens = estimate_tokens("\n\n".join(f"[{r.metadata.company.upper()}] {r.text}" for r in results))
+    merged = merge_hits(results)
+    passages = drop_near_duplicates(merged)
+
+    parts: List[str] = []
+    used = 0
+    truncated = dropped = 0
+    for passage in passages:
+        # Separator between passages counts against the budget too
+        remaining = token_budget - used - (1 if parts else 0)
+        text = passage.render()
+        tokens = estimate_tokens(text)
+        if tokens > remaining:
+            if remaining < MIN_PASSAGE_TOKENS:
+                dropped += 1
+                continue
+            # Keep the words that fit; estimate_tokens is linear in characters
+            words = passage.words[:max(1, len(passage.words) * remaining // tokens)]
+            text = passage.render(words)
+            while len(words) > 1 and estimate_tokens(text) > remaining:
+                words = words[:-max(1, len(words) // 20)]
+                text = passage.render(words)
+            tokens = estimate_tokens(text)
+            truncated += 1
+        parts.append(text)
+        used += tokens + (1 if len(parts) > 1 else 0)
+
+    context = "\n\n".join(parts)
+    packed_tokens = estimate_tokens(context)
+    stats = ContextStats(
+        hits=len(results),
+        passages=len(parts),
+        hits_merged=len(results) - len(merged),
+        duplicates_removed=len(merged) - len(passages),
+        passages_truncated=truncated,
+        passages_dropped=dropped,
+        token_budget=token_budget,
+        raw_tokens=raw_tokens,
+        packed_tokens=packed_tokens,
+        tokens_saved=max(0, raw_tokens - packed_tokens),
+    )
+    return context, stats
@@ -0,0 +1,305 @@
+"""
+Near-duplicate and boilerplate chunk removal, run on the tokenized corpus
+before the inverted indexes are built.
+
+Every chunk is reduced to hashed k-word shingles (over the tokenized text,
+so case, punctuation and stopwords do not matter). Then:
+  boilerplate - a shingle that occurs in at least BOILERPLATE_MIN_FILES
+                different files is boilerplate (safe-harbor statements,
+                operator scripts, legal headers); of the chunks made up
+                mostly of such shingles only the first copy in file name order
+                is kept, so repeated text stays searchable exactly once
+  duplicates  - MinHash signatures with LSH banding find chunks whose
+                shingle sets are near-identical (estimated Jaccard >=
+                DUPLICATE_THRESHOLD); only the first copy in file name order is
+                kept
+
+What the checks need to know about the indexed corpus is a DedupState saved
+with the index, so an incremental update checks the new files against every
+indexed file, not just against each other. It is kept small enough that
+dedup still shrinks the index on disk:
+  - one corpus-wide table of the shingles found in at least two files (a
+    shingle seen once can only become boilerplate if two more files bring
+    it in one update), with each file's entries as indexes into it and a
+    bit per entry saying whether the file's kept chunks index that text
+  - b-bit MinHash signatures of kept chunks: the low SIGNATURE_BITS of each
+    minimum. Two different minima then agree with probability
+    2^-SIGNATURE_BITS, which raises the Jaccard estimate by well under 1%.
+Removing or changing a file that holds the kept copy of something other
+files' chunks were dropped against needs a full rebuild
+(DedupState.anchors). Set RAG_DEDUP=0 to index every chunk.
+"""
+import os
+import io
+import zlib
+from typing import List, Dict, Any, Tuple, Optional, Set
+import numpy as np
+from .vocab import TermMatrix
+
+DEDUP_ENABLED = os.environ.get("RAG_DEDUP", "1") != "0"
+
+SHINGLE_SIZE = 8
+NUM_PERM = 64
+BANDS = 16
+DUPLICATE_THRESHOLD = 0.8
+BOILERPLATE_MIN_FILES = 3
+BOILERPLATE_FRACTION = 0.8
+SIGNATURE_BITS = 8
+# Shingles found in fewer files are not saved with the index
+SAVED_MIN_FILES = 2
+
+_MASK = np.uint64((1 << 32) - 1)
+_SHIFT = np.uint64(32)
+_rng = np.random.default_rng(20240531)
+# Multiply-shift hash family: high 32 bits of (a * x + b) mod 2^64, with a odd
+_A = _rng.integers(0, np.iinfo(np.uint64).max, size=NUM_PERM, dtype=np.uint64, endpoint=True) | np.uint64(1)
+_B = _rng.integers(0, np.iinfo(np.uint64).max, size=NUM_PERM, dtype=np.uint64, endpoint=True)
+
+def token_sequences(matrix: TermMatrix) -> np.ndarray:
+    """Every chunk's term ids in token order, concatenated (chunk d spans doc_len offsets)."""
+    doc_len = matrix.doc_len.astype(np.int64)
+    starts = np.zeros(len(doc_len), dtype=np.int64)
+    np.cumsum(doc_len[:-1], out=starts[1:])
+    # Each entry owns tfs[e] positions; scatter its term id to chunk start + position
+    entry_doc = matrix.doc_of_entries()
+    slots = np.repeat(starts[entry_doc], matrix.tfs) + matrix.positions
+    sequence = np.empty(int(doc_len.sum()), dtype=np.int32)
+    sequence[slots] = np.repeat(matrix.term_ids, matrix.tfs)
+    return sequence
+
+def shingle_hashes(terms: List[str], matrix: TermMatrix, k: int = SHINGLE_SIZE) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    32-bit hash of every k-token window that stays inside one chunk, plus the
+    CSR indptr over chunks. Chunks shorter than k tokens get no shingles.
+    """
+    term_hashes = np.fromiter((zlib.crc32(t.encode("utf-8")) for t in terms), dtype=np.uint64, count=len(terms))
+    tokens = term_hashes[token_sequences(matrix)]
+    doc_len = matrix.doc_len.astype(np.int64)
+    counts = np.maximum(doc_len - k + 1, 0)
+    indptr = np.zeros(len(doc_len) + 1, dtype=np.int64)
+    np.cumsum(counts, out=indptr[1:])
+    if len(tokens) < k:
+        return np.zeros(0, dtype=np.uint64), indptr
+
+    # Polynomial rolling hash; uint64 arithmetic wraps, which is fine for hashing
+    windows = len(tokens) - k + 1
+    acc = np.zeros(windows, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for j in range(k):
+            acc = acc * np.uint64(1000003) + tokens[j:j + windows]
+    folded = (acc >> _SHIFT) ^ (acc & _MASK)
+
+    # Keep windows that start at least k - 1 tokens before their chunk ends
+    starts = np.zeros(len(doc_len), dtype=np.int64)
+    np.cumsum(doc_len[:-1], out=starts[1:])
+    offsets = np.arange(windows) - np.repeat(starts, doc_len)[:windows]
+    inside = offsets < np.repeat(counts, doc_len)[:windows]
+    return folded[inside], indptr
+
+def minhash(shingles: np.ndarray, indptr: np.ndarray) -> np.ndarray:
+    """NUM_PERM-wide MinHash signature per chunk; rows of chunks without shingles are all max."""
+    signatures = np.full((len(indptr) - 1, NUM_PERM), np.iinfo(np.uint64).max, dtype=np.uint64)
+    nonempty = np.flatnonzero(np.diff(indptr) > 0)
+    if len(nonempty) == 0:
+        return signatures
+    with np.errstate(over="ignore"):
+        for p in range(NUM_PERM):
+            hashed = (_A[p] * shingles + _B[p]) >> _SHIFT
+            signatures[nonempty, p] = np.minimum.reduceat(hashed, indptr[nonempty])
+    return signatures
+
+def spec() -> Dict[str, Any]:
+    """Parameters baked into the kept chunks; an index built with others needs a full rebuild."""
+    return {
+        "enabled": DEDUP_ENABLED,
+        "shingle_size": SHINGLE_SIZE,
+        "num_perm": NUM_PERM,
+        "bands": BANDS,
+        "duplicate_threshold": DUPLICATE_THRESHOLD,
+        "boilerplate_min_files": BOILERPLATE_MIN_FILES,
+        "boilerplate_fraction": BOILERPLATE_FRACTION,
+        "signature_bits": SIGNATURE_BITS,
+    }
+
+class FileShingles:
+    """Dedup record of one indexed file."""
+
+    def __init__(self, shingles: np.ndarray, covered: np.ndarray, signatures: np.ndarray):
+        # Distinct shingle hashes of the file (32-bit), counted towards boilerplate
+        self.shingles = shingles.astype(np.uint32)
+        # One bool per shingle: it occurs in a kept chunk, so its text is in the index
+        self.covered = covered.astype(bool)
+        # b-bit MinHash signatures of its kept chunks, for LSH
+        self.signatures = signatures.astype(np.uint8)
+
+class DedupState:
+    """What dedup knows about the indexed corpus; saved with the index."""
+
+    def __init__(self, files: Optional[Dict[str, FileShingles]] = None, anchors: Optional[Set[str]] = None):
+        # In source order: the first file covering a shingle holds its kept copy
+        self.files = files or {}
+        # Files holding the kept copy that chunks of other files were dropped against
+        self.anchors = anchors or set()
+
+    def drop(self, file_names: Set[str]):
+        for name in file_names:
+            self.files.pop(name, None)
+        self.anchors -= file_names
+
+    def to_bytes(self) -> bytes:
+        """
+        Compressed npz: the corpus-wide table of shingles found in at least
+        SAVED_MIN_FILES files, and per file its indexes into the table, their
+        covered bits and its signatures.
+        """
+        names = list(self.files)
+        records = [self.files[name] for name in names]
+        hashes, counts = np.unique(
+            np.concatenate([r.shingles for r in records] or [np.zeros(0, dtype=np.uint32)]), return_counts=True
+        )
+        table = hashes[counts >= SAVED_MIN_FILES]
+        members, covered = [], []
+        for record in records:
+            inside = np.isin(record.shingles, table)
+            members.append(np.searchsorted(table, record.shingles[inside]))
+            covered.append(record.covered[inside])
+        member_type = np.uint16 if len(table) <= 1 << 16 else np.uint32
+
+        arrays = {
+            "names": np.array(names, dtype=str),
+            "anchors": np.array(sorted(self.anchors), dtype=str),
+            "table": table,
+            "members": np.concatenate(members or [np.zeros(0)]).astype(member_type),
+            "members.indptr": _indptr([len(m) for m in members]),
+            "covered": np.packbits(np.concatenate(covered or [np.zeros(0, dtype=bool)])),
+            "signatures": np.concatenate([r.signatures for r in records] or [np.zeros((0, NUM_PERM), dtype=np.uint8)]),
+            "signatures.indptr": _indptr([len(r.signatures) for r in records]),
+        }
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, **arrays)
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "DedupState":
+        with np.load(io.BytesIO(data)) as arrays:
+            table = arrays["table"]
+            members, members_indptr = arrays["members"], arrays["members.indptr"]
+            covered = np.unpackbits(arrays["covered"], count=len(members)).astype(bool)
+            signatures, signatures_indptr = arrays["signatures"], arrays["signatures.indptr"]
+            files = {}
+            for i, name in enumerate(arrays["names"].tolist()):
+                lo, hi = members_indptr[i], members_indptr[i + 1]
+                files[name] = FileShingles(
+                    table[members[lo:hi]], covered[lo:hi], signatures[signatures_indptr[i]:signatures_indptr[i + 1]]
+                )
+            return cls(files, set(arrays["anchors"].tolist()))
+
+    def save(self, path: str):
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path: str) -> Optional["DedupState"]:
+        try:
+            with open(path, "rb") as f:
+                return cls.from_bytes(f.read())
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[WARNING] Could not read dedup state {path}: {e}")
+            return None
+
+def _indptr(counts: List[int]) -> np.ndarray:
+    indptr = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=indptr[1:])
+    return indptr
+
+def find_redundant(files: List[Tuple[str, List[str], TermMatrix]], state: Optional[DedupState] = None
+                   ) -> Tuple[List[np.ndarray], Dict[str, Any]]:
+    """
+    Keep mask per file (one bool per chunk) for `files` given as (file name,
+    file vocabulary, TermMatrix) in source order, and a report of what went.
+    With a `state` the files are checked against the indexed files it holds
+    too (it must not hold `files` themselves), and are recorded into it.
+    """
+    state = state if state is not None else DedupState()
+    indexed = dict(state.files)
+    shingled = [shingle_hashes(terms, matrix) for _, terms, matrix in files]
+    total = sum(len(indptr) - 1 for _, indptr in shingled)
+    empty = np.zeros(0, dtype=np.uint64)
+
+    # Boilerplate: shingles shared by many files, indexed ones included
+    per_file = [np.unique(hashes) for hashes, _ in shingled]
+    everything = np.concatenate([r.shingles.astype(np.uint64) for r in indexed.values()] + per_file + [empty])
+    all_shingles, file_counts = np.unique(everything, return_counts=True)
+    common = all_shingles[file_counts >= BOILERPLATE_MIN_FILES]
+
+    # Boilerplate text already in the index, and the file that holds it
+    covered: Dict[int, str] = {}
+    for name, record in indexed.items():
+        for h in np.intersect1d(record.shingles[record.covered].astype(np.uint64), common).tolist():
+            covered.setdefault(h, name)
+
+    # Near-duplicates: LSH buckets per band over every kept chunk, verified on the full signatures
+    rows = NUM_PERM // BANDS
+    buckets: Dict[Tuple[int, bytes], Tuple[str, int]] = {}
+    signatures_of: Dict[str, np.ndarray] = {}
+    for name, record in indexed.items():
+        signatures_of[name] = record.signatures
+        for c, signature in enumerate(signatures_of[name]):
+            for band in range(BANDS):
+                buckets.setdefault((band, signature[band * rows:(band + 1) * rows].tobytes()), (name, c))
+
+    keeps: List[np.ndarray] = []
+    boilerplate = duplicates = 0
+    for (name, _, _), (hashes, indptr) in zip(files, shingled):
+        lengths = np.diff(indptr)
+        is_common = np.isin(hashes, common)
+        # b-bit MinHash: the low bits of each minimum are all that is compared or saved
+        signatures = (minhash(hashes, indptr) & np.uint64((1 << SIGNATURE_BITS) - 1)).astype(np.uint8)
+        # Buckets point at rows of this full array; the state keeps only the kept rows
+        signatures_of[name] = signatures
+        keep = np.ones(len(lengths), dtype=bool)
+        for c in np.flatnonzero(lengths > 0).tolist():
+            lo, hi = indptr[c], indptr[c + 1]
+            shared = hashes[lo:hi][is_common[lo:hi]].tolist()
+            if len(shared) >= BOILERPLATE_FRACTION * lengths[c]:
+                owners = [covered[h] for h in shared if h in covered]
+                if len(owners) >= BOILERPLATE_FRACTION * lengths[c]:
+                    # Already indexed once; the copy that was kept stays the only one
+                    keep[c] = False
+                    boilerplate += 1
+                    state.anchors.update(owner for owner in owners if owner != name)
+                    continue
+
+            signature = signatures[c]
+            keys = [(band, signature[band * rows:(band + 1) * rows].tobytes()) for band in range(BANDS)]
+            for key in keys:
+                match = buckets.get(key)
+                if match is not None and np.mean(signatures_of[match[0]][match[1]] == signature) >= DUPLICATE_THRESHOLD:
+                    keep[c] = False
+                    duplicates += 1
+                    if match[0] != name:
+                        state.anchors.add(match[0])
+                    break
+            else:
+                for key in keys:
+                    buckets.setdefault(key, (name, c))
+                for h in shared:
+                    covered.setdefault(h, name)
+        keeps.append(keep)
+
+        kept_rows = keep & (lengths > 0)
+        distinct = np.unique(hashes)
+        covered_here = np.isin(distinct, hashes[np.repeat(kept_rows, lengths)])
+        state.files[name] = FileShingles(distinct, covered_here, signatures[kept_rows])
+
+    removed = boilerplate + duplicates
+    report = {
+        "chunks_in": total,
+        "boilerplate_removed": boilerplate,
+        "duplicates_removed": duplicates,
+        "chunks_out": total - removed,
+        "removed_fraction": round(removed / total, 4) if total else 0.0,
+        "tokens_removed": int(sum(matrix.doc_len[~keep].sum() for (_, _, matrix), keep in zip(files, keeps))),
+        "indexed_files_checked": len(indexed),
+    }
+    return keeps, report
@@ -0,0 +1,133 @@
+import re
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+
+# ChunkMetadata fields that get a value -> doc ids index at build time
+FILTER_FIELDS = ("company", "fy", "quarter", "date", "section", "file_name", "file_path", "title")
+
+# Range operators accepted in a filter spec, e.g. {"fy": {">=": 2024}}
+RANGE_OPS = {">", ">=", "<", "<="}
+
+_NUMERIC = re.compile(r'(?:fy|q)?\s*(-?\d+(?:\.\d+)?)', re.IGNORECASE)
+
+def _as_number(value: Any) -> Optional[float]:
+    """Numeric view of a metadata value so "2024", "FY2024" and 2024 compare as years."""
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _NUMERIC.fullmatch(str(value).strip())
+    return float(match.group(1)) if match else None
+
+class FieldIndex:
+    """Sorted doc-id lists per distinct value of one metadata field."""
+
+    def __init__(self, postings: Dict[Any, np.ndarray]):
+        self.postings = postings
+        # Sorted keys for range lookups; numeric and text values are ranged separately
+        numeric = sorted((n, v) for v in postings if (n := _as_number(v)) is not None)
+        self.numeric_keys = [n for n, _ in numeric]
+        self.numeric_values = [v for _, v in numeric]
+        self.text_values = sorted(v for v in postings if isinstance(v, str) and _as_number(v) is None)
+
+    def equals(self, value: Any) -> np.ndarray:
+        ids = self.postings.get(value)
+        if ids is None and not isinstance(value, str):
+            # Numbers sent as JSON still match string metadata ("2024" == 2024)
+            ids = self.postings.get(str(value))
+        return ids if ids is not None else _EMPTY
+
+    def any_of(self, values: List[Any]) -> np.ndarray:
+        return _union([self.equals(v) for v in values])
+
+    def range(self, op: str, bound: Any) -> np.ndarray:
+        number = _as_number(bound)
+        if number is not None:
+            keys, values, probe = self.numeric_keys, self.numeric_values, number
+        else:
+            keys = values = self.text_values
+            probe = str(bound)
+
+        if op == ">":
+            selected = values[bisect_right(keys, probe):]
+        elif op == ">=":
+            selected = values[bisect_left(keys, probe):]
+        elif op == "<":
+            selected = values[:bisect_left(keys, probe)]
+        else:
+            selected = values[:bisect_right(keys, probe)]
+        return _union([self.postings[v] for v in selected])
+
+_EMPTY = np.zeros(0, dtype=np.int32)
+
+def _union(arrays: List[np.ndarray]) -> np.ndarray:
+    if not arrays:
+        return _EMPTY
+    if len(arrays) == 1:
+        return arrays[0]
+    return np.unique(np.concatenate(arrays)).astype(np.int32)
+
+class MetadataIndex:
+    """
+    Per-field indexes over ChunkMetadata, used to resolve search filters into
+    a sorted array of candidate doc ids *before* any BM25 scoring happens.
+
+    Filter values may be:
+      - a scalar for equality:            {"company": "NVDA"}
+      - a list for membership:            {"company": ["NVDA", "AAPL"]}
+      - a dict of operators:              {"fy": {">=": 2024, "<": 2026}}, {"company": {"in": [...]}}
+    """
+
+    def __init__(self):
+        self.fields: Dict[str, FieldIndex] = {}
+        self.num_docs = 0
+
+    @classmethod
+    def from_columns(cls, columns: Dict[str, List[Any]], num_docs: int) -> "MetadataIndex":
+        index = cls()
+        index.num_docs = num_docs
+        for field, values in columns.items():
+            ids = defaultdict(list)
+            for doc_id, value in enumerate(values):
+                ids[value].append(doc_id)
+            index.fields[field] = FieldIndex({v: np.asarray(d, dtype=np.int32) for v, d in ids.items()})
+        return index
+
+    def candidates(self, filters: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """Sorted doc ids matching every filter, or None when nothing is filtered."""
+        if not filters:
+            return None
+
+        result = None
+        # Cheapest (smallest) selections first so the intersection shrinks quickly
+        for ids in sorted((self._resolve(k, v) for k, v in filters.items()), key=len):
+            result = ids if result is None else np.intersect1d(result, ids, assume_unique=True)
+            if len(result) == 0:
+                break
+        return result
+
+    def _resolve(self, field: str, spec: Any) -> np.ndarray:
+        field_index = self.fields.get(field)
+        if field_index is None:
+            # Unknown fields never match, same as the old getattr(...) != v check
+            return _EMPTY
+
+        if isinstance(spec, (list, tuple, set)):
+            return field_index.any_of(list(spec))
+        if not isinstance(spec, dict):
+            return field_index.equals(spec)
+
+        result = None
+        for op, bound in spec.items():
+            if op in ("==", "eq"):
+                ids = field_index.equals(bound)
+            elif op == "in":
+                ids = field_index.any_of(list(bound))
+            elif op in RANGE_OPS:
+                ids = field_index.range(op, bound)
+            else:
+                raise ValueError(f"Unsupported filter operator '{op}' for field '{field}'")
+            result = ids if result is None else np.intersect1d(result, ids, assume_unique=True)
+        return result if result is not None else _EMPTY
@@ -0,0 +1,436 @@
+"""
+SQLite FTS5 retrieval backend (RAG_BACKEND=fts5).
+
+Every chunk is one row of an FTS5 table. Only the `terms` column is indexed:
+it holds the chunk text run through the same tokenizer as the BM25 engine, so
+stopwords and phrase positions line up. Raw text, metadata and boost
+features sit in UNINDEXED columns; a plain `chunk_rows` table maps chunk ids
+to rows for fetching a single chunk, and `dedup_state` holds the dedup
+record of the indexed files (see dedup.DedupState). Ranking uses FTS5's built-in bm25(), and
+filters and boosts are applied in the same statement, so only the top-k rows
+ever reach Python and memory stays flat however large the corpus gets.
+
+Chunks go through the same boilerplate / near-duplicate removal as the BM25
+build (see dedup), and results go through the shared query cache. The
+ranking still differs from the in-process engine: FTS5 has its own BM25
+constants and IDF. proximity_boost is not supported and is rejected with a
+ValueError rather than silently ignored.
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import List, Dict, Any, Optional, Tuple
+from .schemas import SearchQuery, SearchResult, ChunkMetadata, ChunkRecord
+from .backends import SearchBackend
+from .indexer import (
+    CACHE_DIR, UpdatePlan, ProgressCallback, _no_progress, _generations,
+    tokenize, analyze_query, get_file_states, diff_file_states
+)
+from .loader import list_transcripts, load_manifest
+from .chunker import CHUNK_SIZE, CHUNK_OVERLAP
+from .pipeline import process_sources
+from .dedup import DEDUP_ENABLED, DedupState, spec as dedup_spec
+from .cache import query_cache, search_key
+from .filters import FILTER_FIELDS, RANGE_OPS, _as_number
+from .phrase import parse_phrases
+from .ranking import boost_rules
+from .analysis import analyzer
+
+FTS_DB = os.environ.get("RAG_FTS_DB", os.path.join(CACHE_DIR, "fts5.db"))
+FTS_FORMAT_VERSION = 4
+
+METADATA_COLUMNS = (
+    "chunk_id", "file_name", "file_path", "company", "fy", "quarter", "date", "title", "section",
+    "start_word_idx", "end_word_idx"
+)
+
+def _connect(path: str, read_only: bool = False) -> sqlite3.Connection:
+    if read_only:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+    else:
+        conn = sqlite3.connect(path, check_same_thread=False)
+    # Numeric view of metadata for range filters, same rules as filters.FieldIndex
+    conn.create_function("rag_number", 1, _as_number, deterministic=True)
+    return conn
+
+def _create_schema(conn: sqlite3.Connection):
+    unindexed = ", ".join(f"{c} UNINDEXED" for c in ("text",) + METADATA_COLUMNS + ("features",))
+    # Analyzed terms can hold a decimal point ("4.5"), which must not split them again
+    conn.execute(f"CREATE VIRTUAL TABLE chunks USING fts5(terms, {unindexed}, tokenize = \"unicode61 tokenchars '.'\")")
+    conn.execute("CREATE TABLE chunk_rows (chunk_id TEXT PRIMARY KEY, row INTEGER NOT NULL)")
+    conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+    conn.execute("CREATE TABLE dedup_state (id INTEGER PRIMARY KEY CHECK (id = 0), data BLOB NOT NULL)")
+
+def _read_meta(conn: sqlite3.Connection) -> Dict[str, Any]:
+    return {key: json.loads(value) for key, value in conn.execute("SELECT key, value FROM meta")}
+
+def _write_meta(conn: sqlite3.Connection, values: Dict[str, Any]):
+    conn.executemany(
+        "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+        [(key, json.dumps(value)) for key, value in values.items()]
+    )
+
+def _read_dedup_state(conn: sqlite3.Connection) -> Optional[DedupState]:
+    row = conn.execute("SELECT data FROM dedup_state WHERE id = 0").fetchone()
+    try:
+        return DedupState.from_bytes(row[0]) if row else None
+    except (ValueError, KeyError) as e:
+        print(f"[WARNING] Could not read FTS5 dedup state: {e}")
+        return None
+
+def _write_dedup_state(conn: sqlite3.Connection, state: Optional[DedupState]):
+    if state is None:
+        conn.execute("DELETE FROM dedup_state")
+    else:
+        conn.execute("INSERT OR REPLACE INTO dedup_state (id, data) VALUES (0, ?)", (state.to_bytes(),))
+
+def _rows(chunks: List[ChunkRecord], first_row: int) -> List[Tuple[Any, ...]]:
+    features = boost_rules.compute_features([c.text for c in chunks], [c.metadata.section for c in chunks])
+    rows = []
+    for i, chunk in enumerate(chunks):
+        # Padded with spaces so a boost can test " name " with instr()
+        names = " ".join(name for name, mask in features.items() if mask[i])
+        rows.append((
+            first_row + i,
+            " ".join(tokenize(chunk.text)),
+            chunk.text,
+            *(getattr(chunk.metadata, c) for c in METADATA_COLUMNS),
+            f" {names} ",
+        ))
+    return rows
+
+def match_expression(query_text: str) -> Optional[str]:
+    """FTS5 MATCH string for a query: any query term, plus every quoted phrase."""
+    tokens = list(dict.fromkeys(analyze_query(query_text)))
+    if not tokens:
+        return None
+    # Terms are [a-z0-9.]+ only, so quoting them is always safe
+    expression = " OR ".join(f'"{t}"' for t in tokens)
+    phrases = [p for p in (tokenize(p) for p in parse_phrases(query_text)) if p]
+    if phrases:
+        expression = " AND ".join(f'"{" ".join(p)}"' for p in phrases) + f" AND ({expression})"
+    return expression
+
+def filter_clause(filters: Optional[Dict[str, Any]]) -> Tuple[str, List[Any]]:
+    """SQL condition (and its parameters) with the same semantics as MetadataIndex.candidates."""
+    clauses, params = [], []
+    for field, spec in (filters or {}).items():
+        if field not in FILTER_FIELDS:
+            # Unknown fields never match
+            return "0", []
+
+        if isinstance(spec, (list, tuple, set)):
+            spec = {"in": list(spec)}
+        elif not isinstance(spec, dict):
+            spec = {"==": spec}
+        if not spec:
+            return "0", []
+
+        for op, bound in spec.items():
+            if op in ("==", "eq"):
+                clauses.append(f"{field} = ?")
+                params.append(_as_text(bound))
+            elif op == "in":
+                values = [_as_text(v) for v in bound]
+                if not values:
+                    return "0", []
+                clauses.append(f"{field} IN ({', '.join('?' * len(values))})")
+                params.extend(values)
+            elif op in RANGE_OPS:
+                number = _as_number(bound)
+                if number is not None:
+                    clauses.append(f"rag_number({field}) {op} ?")
+                    params.append(number)
+                else:
+                    # Text ranges only look at values that are not numbers
+                    clauses.append(f"(rag_number({field}) IS NULL AND {field} {op} ?)")
+                    params.append(str(bound))
+            else:
+                raise ValueError(f"Unsupported filter operator '{op}' for field '{field}'")
+    return " AND ".join(clauses) or "1", params
+
+def _as_text(value: Any) -> str:
+    # Metadata is stored as strings; numbers sent as JSON still match ("2024" == 2024)
+    return value if isinstance(value, str) else str(value)
+
+def boost_expression(query_text: str) -> Tuple[str, List[Any]]:
+    """Product of the multipliers of every boost rule the query triggers, as SQL."""
+    factors, params = [], []
+    for i in boost_rules.triggered(query_text):
+        _, feature, multiplier = boost_rules.rules[i]
+        factors.append("(CASE WHEN instr(features, ?) > 0 THEN ? ELSE 1.0 END)")
+        params.extend([f" {feature} ", multiplier])
+    return " * ".join(factors) or "1.0", params
+
+class FTS5Backend(SearchBackend):
+    """
+    Index and search in one SQLite file. Incremental updates delete and
+    re-insert the affected files' rows in one transaction; full builds write
+    a new file next to the live one and swap it in with os.replace.
+    """
+
+    name = "fts5"
+
+    def __init__(self, db_path: str = FTS_DB, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP):
+        self.db_path = db_path
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self._generation = 0
+        self._num_docs = 0
+        # Serializes writers; readers never take it
+        self._write_lock = threading.Lock()
+        # One read-only connection per thread, reopened when the generation changes
+        self._local = threading.local()
+
+    @property
+    def num_docs(self) -> int:
+        return self._num_docs
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def _meta(self) -> Optional[Dict[str, Any]]:
+        if not os.path.exists(self.db_path):
+            return None
+        try:
+            conn = _connect(self.db_path, read_only=True)
+            try:
+                return _read_meta(conn)
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"[WARNING] Could not read FTS5 index {self.db_path}: {e}")
+            return None
+
+    def plan(self, transcripts_dir: str) -> UpdatePlan:
+        meta = self._meta()
+        if (meta is None or meta.get("format_version") != FTS_FORMAT_VERSION
+                or meta.get("features") != boost_rules.feature_spec() or meta.get("analyzer") != analyzer.spec()
+                or meta.get("dedup_spec") != dedup_spec()):
+            return UpdatePlan(full=True, states=get_file_states(transcripts_dir))
+        return diff_file_states(transcripts_dir, meta.get("file_states"), meta.get("manifest") or {})
+
+    def prepare(self, transcripts_dir: str) -> Optional[UpdatePlan]:
+        plan = self.plan(transcripts_dir)
+        if not plan.full:
+            self._publish()
+            return plan if plan.has_changes else None
+        self.build(transcripts_dir)
+        return None
+
+    def build(self, transcripts_dir: str, progress: ProgressCallback = _no_progress) -> Dict[str, Any]:
+        with self._write_lock:
+            return self._build(transcripts_dir, progress)
+
+    def _build(self, transcripts_dir: str, progress: ProgressCallback) -> Dict[str, Any]:
+        print("Building FTS5 Index...")
+        progress("scanning", 0.0)
+        started = time.perf_counter()
+        states = get_file_states(transcripts_dir)
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        tmp_path = self.db_path + ".tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+        conn = _connect(tmp_path)
+        try:
+            _create_schema(conn)
+            dedup_state = DedupState() if DEDUP_ENABLED else None
+            results, report = self._process(list_transcripts(transcripts_dir), progress, dedup_state)
+            chunks = self._insert_files(conn, [result[0] for result in results], progress)
+            indexed = time.perf_counter()
+            progress("writing", 0.9)
+            self._save_states(conn, transcripts_dir, states)
+            _write_dedup_state(conn, dedup_state)
+            # Merge the segments written during the build into one b-tree
+            conn.execute("INSERT INTO chunks (chunks) VALUES ('optimize')")
+            conn.commit()
+        finally:
+            conn.close()
+        os.replace(tmp_path, self.db_path)
+        self._publish()
+
+        progress("done", 1.0)
+        print(f"FTS5 index built with {chunks} chunks.")
+        result = {
+            "mode": "full",
+            "chunks": chunks,
+            "wall": {
+                "index": round(indexed - started, 4),
+                "write": round(time.perf_counter() - indexed, 4),
+            },
+        }
+        if "dedup" in report:
+            result["dedup"] = report["dedup"]
+        return result
+
+    def update(self, transcripts_dir: str, plan: Optional[UpdatePlan] = None,
+               progress: ProgressCallback = _no_progress) -> Dict[str, Any]:
+        with self._write_lock:
+            progress("scanning", 0.0)
+            plan = plan or self.plan(transcripts_dir)
+            if plan.full:
+                return self._build(transcripts_dir, progress)
+            if not plan.has_changes:
+                if not self._generation:
+                    self._publish()
+                progress("done", 1.0)
+                return {"mode": "unchanged", "chunks": self.num_docs}
+
+            dedup_state = None
+            if DEDUP_ENABLED:
+                conn = _connect(self.db_path, read_only=True)
+                try:
+                    dedup_state = _read_dedup_state(conn)
+                finally:
+                    conn.close()
+                if dedup_state is None:
+                    return self._build(transcripts_dir, progress)
+                # Same rule as BM25Index.update: dropped copies only come back with a rebuild
+                anchors = dedup_state.anchors & plan.to_drop
+                if anchors:
+                    print(f"Rebuilding FTS5 Index: {', '.join(sorted(anchors))} held text other files were deduplicated against")
+                    return self._build(transcripts_dir, progress)
+                dedup_state.drop(plan.to_drop)
+
+            print(f"Updating FTS5 Index: +{len(plan.added)} ~{len(plan.changed)} -{len(plan.removed)} files")
+            started = time.perf_counter()
+            # Chunked, tokenized and deduplicated before the write transaction opens
+            results, report = self._process(list_transcripts(transcripts_dir, plan.to_index), progress, dedup_state)
+            conn = _connect(self.db_path)
+            try:
+                # One transaction: readers see either the old or the new rows, never a mix
+                with conn:
+                    dropped = sorted(plan.to_drop)
+                    chunks_removed = 0
+                    if dropped:
+                        in_files = f"file_name IN ({', '.join('?' * len(dropped))})"
+                        conn.execute(
+                            f"DELETE FROM chunk_rows WHERE row IN (SELECT rowid FROM chunks WHERE {in_files})", dropped
+                        )
+                        chunks_removed = conn.execute(f"DELETE FROM chunks WHERE {in_files}", dropped).rowcount
+                    chunks_added = self._insert_files(conn, [result[0] for result in results], progress)
+                    self._save_states(conn, transcripts_dir, plan.states)
+                    _write_dedup_state(conn, dedup_state)
+            finally:
+                conn.close()
+            self._publish()
+
+            progress("done", 1.0)
+            print(f"FTS5 index updated: {chunks_removed} chunks removed, {chunks_added} added.")
+            result = {
+                "mode": "incremental",
+                "added": sorted(plan.added),
+                "changed": sorted(plan.changed),
+                "removed": sorted(plan.removed),
+                "chunks_removed": chunks_removed,
+                "chunks_added": chunks_added,
+                "chunks": self.num_docs,
+                "wall": {"update": round(time.perf_counter() - started, 4)},
+            }
+            if "dedup" in report:
+                result["dedup"] = report["dedup"]
+            return result
+
+    def _process(self, sources: List[Dict[str, Any]], progress: ProgressCallback,
+                 dedup_state: Optional[DedupState]) -> Tuple[List[Any], Dict[str, Any]]:
+        """Chunks, tokenizes and deduplicates like the BM25 build, so both backends index the same chunks."""
+        return process_sources(sources, progress=progress, dedupe=dedup_state is not None,
+                               chunk_size=self.chunk_size, overlap=self.overlap, dedup_state=dedup_state)
+
+    def _insert_files(self, conn: sqlite3.Connection, files: List[List[ChunkRecord]],
+                      progress: ProgressCallback) -> int:
+        placeholders = ", ".join("?" * (len(METADATA_COLUMNS) + 4))
+        columns = ", ".join(("rowid", "terms", "text") + METADATA_COLUMNS + ("features",))
+        # Rows are numbered here so chunk_rows can be filled without reading them back
+        last = conn.execute("SELECT rowid FROM chunks ORDER BY rowid DESC LIMIT 1").fetchone()
+        next_row = (last[0] if last else 0) + 1
+        total = 0
+        for i, chunks in enumerate(files):
+            if not chunks:
+                continue
+            conn.executemany(f"INSERT INTO chunks ({columns}) VALUES ({placeholders})", _rows(chunks, next_row))
+            conn.executemany(
+                "INSERT OR REPLACE INTO chunk_rows (chunk_id, row) VALUES (?, ?)",
+                [(c.metadata.chunk_id, next_row + j) for j, c in enumerate(chunks)]
+            )
+            next_row += len(chunks)
+            total += len(chunks)
+            progress("indexing", 0.75 + 0.15 * (i + 1) / len(files))
+        return total
+
+    def _save_states(self, conn: sqlite3.Connection, transcripts_dir: str, states: Dict[str, Dict[str, Any]]):
+        _write_meta(conn, {
+            "format_version": FTS_FORMAT_VERSION,
+            "features": boost_rules.feature_spec(),
+            "analyzer": analyzer.spec(),
+            "dedup_spec": dedup_spec(),
+            "file_states": states,
+            "manifest": load_manifest(transcripts_dir),
+        })
+
+    def _publish(self):
+        conn = _connect(self.db_path, read_only=True)
+        try:
+            self._num_docs = conn.execute("SELECT count(*) FROM chunks").fetchone()[0]
+        finally:
+            conn.close()
+        self._generation = next(_generations)
+
+    def _reader(self) -> sqlite3.Connection:
+        local = self._local
+        if getattr(local, "generation", None) != self._generation:
+            # A full build replaced the file; the old connection still reads the old one
+            if getattr(local, "conn", None) is not None:
+                local.conn.close()
+            local.conn = _connect(self.db_path, read_only=True)
+            local.generation = self._generation
+        return local.conn
+
+    def search(self, query: SearchQuery) -> List[SearchResult]:
+        if query.proximity_boost > 0:
+            raise ValueError("proximity_boost is not supported by the fts5 backend")
+        generation = self._generation
+        if not generation or not self._num_docs or query.top_k <= 0:
+            return []
+        match = match_expression(query.query)
+        if match is None:
+            return []
+        key = search_key(query, analyze_query(query.query), [tokenize(p) for p in parse_phrases(query.query)])
+        cached = query_cache.get(generation, key)
+        if cached is not None:
+            return cached
+
+        where, filter_params = filter_clause(query.filters)
+        boost, boost_params = boost_expression(query.query)
+        # bm25() is lower-is-better; negated it ranks like the BM25 engine. Ties keep insertion order.
+        sql = (
+            f"SELECT -bm25(chunks) * {boost} AS score, text, {', '.join(METADATA_COLUMNS)} "
+            f"FROM chunks WHERE chunks MATCH ? AND {where} ORDER BY score DESC, rowid LIMIT ?"
+        )
+        rows = self._reader().execute(sql, [*boost_params, match, *filter_params, query.top_k]).fetchall()
+        results = [
+            SearchResult(
+                score=float(row[0]),
+                text=row[1],
+                metadata=ChunkMetadata(**dict(zip(METADATA_COLUMNS, row[2:])))
+            )
+            for row in rows
+        ]
+        query_cache.put(generation, key, results)
+        return results
+
+    def get_chunk(self, chunk_id: str) -> Optional[ChunkRecord]:
+        if not self._generation:
+            return None
+        row = self._reader().execute(
+            f"SELECT text, {', '.join(METADATA_COLUMNS)} FROM chunks "
+            "WHERE rowid = (SELECT row FROM chunk_rows WHERE chunk_id = ?)",
+            (chunk_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return ChunkRecord(text=row[0], metadata=ChunkMetadata(**dict(zip(METADATA_COLUMNS, row[1:]))))
@@ -1,110 +1,440 @@
 import os
 import json
-import pickle
-from typing import List, Dict, Any, Tuple
-from rank_bm25 import BM25Okapi
-import re
+import hashlib
+from typing import List, Dict, Any, Tuple, Optional, Set, Callable
+import time
+import threading
+import itertools
+import uuid
+import numpy as np
 from .schemas import ChunkRecord
-from .loader import load_manifest, load_transcripts, MANIFEST_FILE
-from .chunker import chunk_text
+from .loader import load_manifest, list_transcripts, MANIFEST_FILE
+from .pipeline import run_sharded_pipeline
+from .chunker import CHUNK_SIZE, CHUNK_OVERLAP
+from .inverted import InvertedIndex
+from .storage import DocColumns, FORMAT_VERSION, open_index, read_format_version, write_index
+from .shards import SHARD_BY, CorpusStats, IndexShard, ShardRouter, shard_key, shard_file_name
+from .ranking import boost_rules
+from .analysis import STOPWORDS, analyzer
+from .dedup import DEDUP_ENABLED, DedupState, spec as dedup_spec
 
 CACHE_DIR = "./index_cache"
-CHUNKS_FILE = os.path.join(CACHE_DIR, "chunks.jsonl")
-BM25_FILE = os.path.join(CACHE_DIR, "bm25.pkl")
-MANIFEST_SNAPSHOT = os.path.join(CACHE_DIR, "manifest_snapshot.json")
-FILE_STATE = os.path.join(CACHE_DIR, "file_state.json")
-
-# Simple stopword list
-STOPWORDS = {"the", "a", "an", "and", "or", "but", "in", "on", "at", "to", "for", "with", "by", "as", "is", "are", "was", "were", "it", "this", "that"}
+SHARDS_FILE = "shards.json"
+# Written next to shards.json by older builds; the states now live inside it
+LEGACY_STATE_FILES = ("manifest_snapshot.json", "file_state.json")
 
 def tokenize(text: str) -> List[str]:
-    text = text.lower()
-    # Keep alphanumerics
-    words = re.findall(r'[a-z0-9]+', text)
-    return [w for w in words if w not in STOPWORDS]
+    """Index terms of `text`, one per word, in order (see analysis.Analyzer)."""
+    return analyzer.terms(text)
+
+def analyze_query(query_text: str) -> List[str]:
+    """Query terms plus synonym expansions; memoized per query string."""
+    return list(analyzer.query(query_text))
 
-def get_file_states(transcripts_dir: str) -> Dict[str, float]:
+def hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def get_file_states(transcripts_dir: str, previous: Optional[Dict[str, Any]] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Content hash, mtime and size per transcript (plus the manifest).
+    Files whose mtime and size match `previous` reuse the recorded hash instead of being re-read.
+    """
     states = {}
     if not os.path.exists(transcripts_dir):
         return states
+    previous = previous or {}
     for f in os.listdir(transcripts_dir):
         if f.endswith(".txt") or f == MANIFEST_FILE:
             fpath = os.path.join(transcripts_dir, f)
-            states[f] = os.path.getmtime(fpath)
+            stat = os.stat(fpath)
+            old = previous.get(f)
+            if isinstance(old, dict) and old.get("mtime") == stat.st_mtime and old.get("size") == stat.st_size:
+                digest = old["sha256"]
+            else:
+                digest = hash_file(fpath)
+            states[f] = {"sha256": digest, "mtime": stat.st_mtime, "size": stat.st_size}
     return states
 
-def needs_rebuild(transcripts_dir: str) -> bool:
-    if not os.path.exists(CACHE_DIR):
-        return True
-    if not os.path.exists(CHUNKS_FILE) or not os.path.exists(BM25_FILE):
-        return True
-        
-    # Check if files changed
-    if os.path.exists(FILE_STATE):
-        with open(FILE_STATE, "r") as f:
-            old_states = json.load(f)
-        current_states = get_file_states(transcripts_dir)
-        if old_states != current_states:
-            return True
-            
-    return False
+class UpdatePlan:
+    """Which transcripts differ from the ones the cached index was built from."""
+
+    def __init__(self, full: bool, states: Dict[str, Dict[str, Any]], added: Set[str] = None,
+                 changed: Set[str] = None, removed: Set[str] = None):
+        self.full = full
+        self.states = states
+        self.added = added or set()
+        self.changed = changed or set()
+        self.removed = removed or set()
+
+    @property
+    def has_changes(self) -> bool:
+        return self.full or bool(self.added or self.changed or self.removed)
+
+    @property
+    def to_index(self) -> Set[str]:
+        return self.added | self.changed
+
+    @property
+    def to_drop(self) -> Set[str]:
+        return self.changed | self.removed
+
+def _shards_are_current(cache_dir: str, shards: Optional[Any]) -> bool:
+    if not isinstance(shards, dict):
+        return False
+    # Boost features, analyzed terms and dedup decisions are baked into the index,
+    # so changing any of them means re-indexing everything
+    if (shards.get("format_version") != FORMAT_VERSION or shards.get("shard_by") != SHARD_BY
+            or shards.get("features") != boost_rules.feature_spec() or shards.get("analyzer") != analyzer.spec()
+            or shards.get("dedup_spec") != dedup_spec()):
+        return False
+    # Updates dedup new files against the saved state, so it has to be there
+    dedup_file = shards.get("dedup")
+    if DEDUP_ENABLED and not (dedup_file and os.path.exists(os.path.join(cache_dir, dedup_file))):
+        return False
+    return all(
+        read_format_version(os.path.join(cache_dir, file_name)) == FORMAT_VERSION
+        for file_name in shards.get("shards", {}).values()
+    )
+
+def plan_update(transcripts_dir: str, cache_dir: str = CACHE_DIR) -> UpdatePlan:
+    shards = _read_json(os.path.join(cache_dir, SHARDS_FILE))
+    # Missing index, or one written in an older format or sharding (including the legacy pickles)
+    if not _shards_are_current(cache_dir, shards):
+        return UpdatePlan(full=True, states=get_file_states(transcripts_dir))
+    return diff_file_states(transcripts_dir, shards.get("file_states"), shards.get("manifest") or {})
+
+def diff_file_states(transcripts_dir: str, old_states: Optional[Dict[str, Any]],
+                     old_manifest: Dict[str, Any]) -> UpdatePlan:
+    """Plan against the file states and manifest an index was built from."""
+    # Mtime-only state from older builds cannot tell us what the index holds
+    if not isinstance(old_states, dict) or not all(isinstance(v, dict) for v in old_states.values()):
+        return UpdatePlan(full=True, states=get_file_states(transcripts_dir))
+
+    states = get_file_states(transcripts_dir, old_states)
+    old_files = {f for f in old_states if f != MANIFEST_FILE}
+    new_files = {f for f in states if f != MANIFEST_FILE}
+    changed = {f for f in old_files & new_files if old_states[f]["sha256"] != states[f]["sha256"]}
+
+    # Manifest edits only affect the files whose entry changed
+    old_manifest_hash = old_states.get(MANIFEST_FILE, {}).get("sha256")
+    if old_manifest_hash != states.get(MANIFEST_FILE, {}).get("sha256"):
+        manifest = load_manifest(transcripts_dir)
+        changed |= {f for f in old_files & new_files if old_manifest.get(f) != manifest.get(f)}
+
+    return UpdatePlan(
+        full=False,
+        states=states,
+        added=new_files - old_files,
+        changed=changed,
+        removed=old_files - new_files
+    )
+
+def needs_rebuild(transcripts_dir: str, cache_dir: str = CACHE_DIR) -> bool:
+    return plan_update(transcripts_dir, cache_dir).has_changes
+
+def _read_json(path: str) -> Optional[Any]:
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+# Process-wide, so a generation number identifies one snapshot even across
+# BM25Index instances (caches key on it)
+_generations = itertools.count(1)
+
+ProgressCallback = Callable[[str, float], None]
+
+def _no_progress(stage: str, fraction: float):
+    pass
+
+class IndexSnapshot:
+    """One published generation of the index: every shard, the router over them and their joint BM25 statistics."""
+
+    def __init__(self, shards: Dict[str, IndexShard], generation: int):
+        self.shards = shards
+        self.router = ShardRouter(shards)
+        # A lone shard's own statistics already are the corpus-wide ones
+        self.stats = CorpusStats([shards[key] for key in sorted(shards)]) if len(shards) > 1 else None
+        self.generation = generation
+
+    @property
+    def num_docs(self) -> int:
+        return sum(shard.num_docs for shard in self.shards.values())
 
 class BM25Index:
-    def __init__(self):
-        self.bm25: BM25Okapi = None
-        self.chunks: List[ChunkRecord] = []
+    """
+    Owns the on-disk shards and the currently published IndexSnapshot.
+
+    Builds and updates work entirely off to the side (new shard files, new
+    arrays) and finish by swapping `self.snapshot` in a single assignment.
+    Readers take the snapshot reference once per query, so a search that
+    started on the previous generation completes on it while the new one goes
+    live. On disk, shards.json is the equivalent switch: shard files are never
+    rewritten in place, and the list of live ones is replaced atomically.
+    """
+
+    def __init__(self, cache_dir: str = CACHE_DIR, workers: Optional[int] = None,
+                 chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP):
+        self.cache_dir = cache_dir
+        # Build processes; None picks RAG_BUILD_WORKERS or the CPU count
+        self.workers = workers
+        # Chunk window in words, for building; a cached index keeps whatever it was built with
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.snapshot: Optional[IndexSnapshot] = None
+        # Serializes writers; readers never take it
+        self._write_lock = threading.Lock()
+
+    @property
+    def shards(self) -> Dict[str, IndexShard]:
+        return self.snapshot.shards if self.snapshot else {}
+
+    def shard(self, key: str) -> Optional[IndexShard]:
+        return self.shards.get(key)
+
+    @property
+    def num_docs(self) -> int:
+        return self.snapshot.num_docs if self.snapshot else 0
+
+    @property
+    def generation(self) -> int:
+        return self.snapshot.generation if self.snapshot else 0
         
-    def build(self, transcripts_dir: str):
+    def build(self, transcripts_dir: str, progress: ProgressCallback = _no_progress) -> Dict[str, Any]:
+        with self._write_lock:
+            return self._build(transcripts_dir, progress)
+
+    def _build(self, transcripts_dir: str, progress: ProgressCallback) -> Dict[str, Any]:
         print("Building BM25 Index...")
-        docs = load_transcripts(transcripts_dir)
+        progress("scanning", 0.0)
+        # Snapshot file states first so edits made during the build are picked up next time
+        states = get_file_states(transcripts_dir, self._read_states())
+        dedup_state = DedupState() if DEDUP_ENABLED else None
+        groups, report = self._index_files(transcripts_dir, progress=progress, dedup_state=dedup_state)
         
-        self.chunks = []
-        for doc in docs:
-            doc_chunks = chunk_text(doc)
-            self.chunks.extend(doc_chunks)
-            
-        # Tokenize corpus
-        corpus_tokens = [tokenize(chunk.text) for chunk in self.chunks]
-        self.bm25 = BM25Okapi(corpus_tokens)
-        
-        self.save(transcripts_dir)
-        print(f"Index built with {len(self.chunks)} chunks.")
-        
-    def save(self, transcripts_dir: str):
-        os.makedirs(CACHE_DIR, exist_ok=True)
+        progress("writing", 0.9)
+        started = time.perf_counter()
+        shard_files = {
+            key: self._write_shard(key, DocColumns.from_chunks(chunks), inverted)
+            for key, (chunks, inverted) in groups.items()
+        }
+        self.save(transcripts_dir, shard_files, states, dedup_state)
+        # Serve from the mapped files so build and load share one code path
+        self._load()
+        report["wall"]["write"] = round(time.perf_counter() - started, 4)
+        progress("done", 1.0)
+        if "dedup" in report:
+            dedup = report["dedup"]
+            print(f"Removed {dedup['boilerplate_removed']} boilerplate and {dedup['duplicates_removed']} "
+                  f"duplicate chunks ({dedup['removed_fraction']:.1%}).")
+        print(f"Index built with {report['chunks']} chunks in {len(shard_files)} shards.")
+        return {"mode": "full", **report}
+
+    def update(self, transcripts_dir: str, plan: Optional[UpdatePlan] = None,
+               progress: ProgressCallback = _no_progress) -> Dict[str, Any]:
+        """
+        Applies added / changed / deleted transcripts to the cached index.
+        Only those files are re-chunked and re-tokenized, and only the shards
+        they belong to are rewritten; within a shard everything else is carried
+        over from the mapped file column by column.
+        """
+        with self._write_lock:
+            progress("scanning", 0.0)
+            plan = plan or plan_update(transcripts_dir, self.cache_dir)
+            if plan.full:
+                return self._build(transcripts_dir, progress)
+            if not plan.has_changes:
+                if self.snapshot is None:
+                    self._load()
+                progress("done", 1.0)
+                return {"mode": "unchanged", "chunks": self.num_docs}
+
+            dedup_state = None
+            if DEDUP_ENABLED:
+                dedup_state = self._read_dedup_state()
+                if dedup_state is None:
+                    return self._build(transcripts_dir, progress)
+                # Chunks of other files were dropped as copies of these files' text; only a rebuild brings them back
+                anchors = dedup_state.anchors & plan.to_drop
+                if anchors:
+                    print(f"Rebuilding BM25 Index: {', '.join(sorted(anchors))} held text other files were deduplicated against")
+                    return self._build(transcripts_dir, progress)
+                dedup_state.drop(plan.to_drop)
+
+            print(f"Updating BM25 Index: +{len(plan.added)} ~{len(plan.changed)} -{len(plan.removed)} files")
+            current = self.snapshot or self._open()
+
+            groups, pipeline_report = self._index_files(transcripts_dir, plan.to_index, progress, dedup_state)
+            progress("merging", 0.8)
+            started = time.perf_counter()
+            shard_files = {key: shard.file_name for key, shard in current.shards.items()}
+            rewritten = []
+            chunks_removed = chunks_added = 0
+
+            for key, shard in current.shards.items():
+                file_names = shard.store.dictionaries["file_name"]
+                drop_codes = [code for code, name in enumerate(file_names) if name in plan.to_drop]
+                keep = ~np.isin(shard.store.codes["file_name"], drop_codes)
+                if key not in groups and keep.all():
+                    continue
+
+                chunks, new_inverted = groups.pop(key, ([], InvertedIndex.from_corpus([])))
+                chunks_removed += int((~keep).sum())
+                chunks_added += len(chunks)
+                rewritten.append(key)
+                if not keep.any() and not chunks:
+                    del shard_files[key]
+                    continue
+                inverted = shard.inverted.merge(keep, new_inverted)
+                docs = DocColumns.from_store(shard.store, keep).concat(DocColumns.from_chunks(chunks))
+                shard_files[key] = self._write_shard(key, docs, inverted)
+
+            # Companies (or years) the index has not seen before
+            for key, (chunks, inverted) in groups.items():
+                chunks_added += len(chunks)
+                rewritten.append(key)
+                shard_files[key] = self._write_shard(key, DocColumns.from_chunks(chunks), inverted)
+            merged = time.perf_counter()
+
+            progress("writing", 0.9)
+            self.save(transcripts_dir, shard_files, plan.states, dedup_state)
+            self._load()
+            progress("done", 1.0)
+            wall = pipeline_report["wall"]
+            wall["merge_into_index"] = round(merged - started, 4)
+            wall["write"] = round(time.perf_counter() - merged, 4)
+            report = {
+                "mode": "incremental",
+                "added": sorted(plan.added),
+                "changed": sorted(plan.changed),
+                "removed": sorted(plan.removed),
+                "shards_rewritten": sorted(rewritten),
+                "chunks_removed": chunks_removed,
+                "chunks_added": chunks_added,
+                "chunks": self.num_docs,
+                "workers": pipeline_report["workers"],
+                "stages": pipeline_report["stages"],
+                "wall": wall,
+            }
+            if "dedup" in pipeline_report:
+                report["dedup"] = pipeline_report["dedup"]
+            print(f"Index updated: {chunks_removed} chunks removed, {chunks_added} added "
+                  f"across {len(rewritten)} shards.")
+            return report
+
+    def _index_files(self, transcripts_dir: str, only: Optional[Set[str]] = None,
+                     progress: ProgressCallback = _no_progress, dedup_state: Optional[DedupState] = None
+                     ) -> Tuple[Dict[str, Tuple[List[ChunkRecord], InvertedIndex]], Dict[str, Any]]:
+        # Chunk / tokenize fan out per file across processes, then files are grouped into shards
+        sources = list_transcripts(transcripts_dir, only)
+        return run_sharded_pipeline(sources, lambda source: shard_key(source["metadata"]), self.workers, progress,
+                                    dedupe=dedup_state is not None, chunk_size=self.chunk_size, overlap=self.overlap,
+                                    dedup_state=dedup_state)
+
+    def _write_shard(self, key: str, docs: DocColumns, inverted: InvertedIndex) -> str:
+        """Writes a shard under a fresh name and returns it; live shard files are never overwritten."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        file_name = shard_file_name(key, uuid.uuid4().hex[:8])
+        write_index(self._path(file_name), docs, inverted)
+        return file_name
         
-        with open(CHUNKS_FILE, "w", encoding="utf-8") as f:
-            for c in self.chunks:
-                f.write(c.json() + "\n")
-                
-        with open(BM25_FILE, "wb") as f:
-            pickle.dump(self.bm25, f)
-            
-        with open(FILE_STATE, "w") as f:
-            json.dump(get_file_states(transcripts_dir), f)
-            
-        manifest = load_manifest(transcripts_dir)
-        with open(MANIFEST_SNAPSHOT, "w", encoding="utf-8") as f:
-            json.dump(manifest, f)
+    def save(self, transcripts_dir: str, shard_files: Dict[str, str], states: Dict[str, Dict[str, Any]],
+             dedup_state: Optional[DedupState] = None):
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        # Like shard files, the dedup state goes under a fresh name and is switched with the shard list
+        dedup_file = None
+        if dedup_state is not None:
+            dedup_file = f"dedup-{uuid.uuid4().hex[:8]}.npz"
+            dedup_state.save(self._path(dedup_file))
+
+        # Publishing the shard list is a single atomic replace. The file states and
+        # manifest it was built from go in the same file, so a crash can never leave
+        # shards that disagree with the record of which files they hold
+        shards = {
+            "format_version": FORMAT_VERSION,
+            "shard_by": SHARD_BY,
+            "features": boost_rules.feature_spec(),
+            "analyzer": analyzer.spec(),
+            "dedup_spec": dedup_spec(),
+            "dedup": dedup_file,
+            "shards": shard_files,
+            "file_states": states,
+            "manifest": load_manifest(transcripts_dir),
+        }
+        tmp_path = self._path(SHARDS_FILE + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(shards, f)
+        os.replace(tmp_path, self._path(SHARDS_FILE))
+
+        self._remove_stale_files(set(shard_files.values()) | {dedup_file})
+
+    def _remove_stale_files(self, live: Set[str]):
+        # Mappings held by older snapshots keep their pages after the unlink
+        for f in os.listdir(self.cache_dir):
+            if (f.endswith((".bin", ".npz")) and f not in live) or f in LEGACY_STATE_FILES:
+                try:
+                    os.remove(self._path(f))
+                except OSError as e:
+                    # e.g. still mapped on Windows; retried after the next build
+                    print(f"[WARNING] Could not remove old index file {f}: {e}")
             
     def load(self):
+        with self._write_lock:
+            self._load()
+
+    def _load(self):
         print("Loading BM25 Index from cache...")
-        self.chunks = []
-        with open(CHUNKS_FILE, "r", encoding="utf-8") as f:
-            for line in f:
-                self.chunks.append(ChunkRecord.parse_raw(line))
-                
-        with open(BM25_FILE, "rb") as f:
-            self.bm25 = pickle.load(f)
+        snapshot = self._open()
+        # Publish: one reference assignment, atomic for concurrent readers
+        self.snapshot = snapshot
         print("Index loaded.")
 
+    def _open(self) -> IndexSnapshot:
+        shard_files = (_read_json(self._path(SHARDS_FILE)) or {}).get("shards", {})
+        shards = {
+            key: IndexShard(key, file_name, *open_index(self._path(file_name)))
+            for key, file_name in shard_files.items()
+        }
+        return IndexSnapshot(shards, next(_generations))
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.cache_dir, name)
+
+    def _read_dedup_state(self) -> Optional[DedupState]:
+        dedup_file = (_read_json(self._path(SHARDS_FILE)) or {}).get("dedup")
+        return DedupState.load(self._path(dedup_file)) if dedup_file else None
+
+    def _read_states(self) -> Optional[Dict[str, Any]]:
+        states = (_read_json(self._path(SHARDS_FILE)) or {}).get("file_states")
+        return states if isinstance(states, dict) else None
+
 global_index = BM25Index()
 
-def build_index_if_needed(transcripts_dir: str = "./transcripts"):
-    if needs_rebuild(transcripts_dir):
-        global_index.build(transcripts_dir)
-    else:
-        global_index.load()
+def build_index_if_needed(transcripts_dir: str = "./transcripts", index: Optional[BM25Index] = None) -> Optional[UpdatePlan]:
+    """
+    Makes sure an index is being served. If a usable cached index exists it is
+    loaded right away and the returned plan says what still needs updating
+    (the caller can apply it in the background); otherwise the index is built
+    synchronously and None is returned.
+    """
+    index = index or global_index
+    plan = plan_update(transcripts_dir, index.cache_dir)
+    if not plan.full:
+        try:
+            index.load()
+            return plan if plan.has_changes else None
+        except Exception as e:
+            print(f"[WARNING] Could not reuse cached index ({e}), rebuilding.")
+    index.build(transcripts_dir)
+    return None
 
 def get_index() -> BM25Index:
     return global_index
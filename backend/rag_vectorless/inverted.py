@@ -0,0 +1,250 @@
+from collections import Counter
+from typing import List, Dict, Tuple, Optional, Any
+import numpy as np
+from .vocab import Vocabulary, TermMatrix, TermMatrixBuilder
+from .positions import PositionIndex, gather_segments
+
+# Same defaults as rank_bm25.BM25Okapi so scores stay comparable
+K1 = 1.5
+B = 0.75
+EPSILON = 0.25
+
+class InvertedIndex:
+    """
+    Term -> postings index with BM25 statistics precomputed at build time.
+    Scoring is term-at-a-time: only the postings of the query terms are touched,
+    so query cost depends on how many chunks match, not on corpus size.
+
+    Postings are stored column-wise (CSC style) so the same arrays can be
+    written to disk and memory-mapped back without conversion:
+      vocab    - sorted vocabulary; `vocab.get(term)` gives its term id
+      indptr   - postings of term t live in [indptr[t], indptr[t + 1])
+      doc_ids  - doc ids of every posting, sorted within each term
+      tfs      - term frequency of every posting
+      positions - token positions of every posting (see positions.PositionIndex)
+    """
+
+    def __init__(self, k1: float = K1, b: float = B, epsilon: float = EPSILON):
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        # Vocabulary when built in memory, storage.MappedTerms when loaded from disk
+        self.vocab: Any = Vocabulary()
+        self.indptr = np.zeros(1, dtype=np.int64)
+        self.doc_ids = np.zeros(0, dtype=np.int32)
+        self.tfs = np.zeros(0, dtype=np.int32)
+        self.positions = PositionIndex(np.zeros(0, dtype=np.uint8), np.zeros(1, dtype=np.int64))
+        self.idf = np.zeros(0, dtype=np.float64)
+        self.doc_len = np.zeros(0, dtype=np.int32)
+        self.avgdl = 0.0
+        # Per-document length normalisation: k1 * (1 - b + b * dl / avgdl)
+        self.doc_norm = np.zeros(0, dtype=np.float64)
+
+    @property
+    def num_docs(self) -> int:
+        return len(self.doc_len)
+
+    @classmethod
+    def from_corpus(cls, corpus_tokens: List[List[str]], **params) -> "InvertedIndex":
+        vocab = Vocabulary()
+        rows = TermMatrixBuilder()
+        for tokens in corpus_tokens:
+            rows.append(vocab.encode(tokens))
+        return cls.from_matrix(vocab, rows.build(), **params)
+
+    @classmethod
+    def from_matrix(cls, vocab: Vocabulary, matrix: TermMatrix, **params) -> "InvertedIndex":
+        """
+        Transposes per-chunk term frequencies (as produced by the build workers)
+        into postings. Entries are in doc order, so a stable sort by term id
+        leaves every posting list sorted by doc id.
+        """
+        vocab, remap = vocab.sorted()
+        term_of = remap[matrix.term_ids]
+        order = np.argsort(term_of, kind="stable")
+        tfs = matrix.tfs[order]
+        entry_starts = np.cumsum(matrix.tfs, dtype=np.int64) - matrix.tfs
+        positions = gather_segments(matrix.positions, entry_starts[order], tfs)
+
+        indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_of, minlength=len(vocab)), out=indptr[1:])
+
+        return cls.from_arrays(
+            vocab=vocab,
+            indptr=indptr,
+            doc_ids=matrix.doc_of_entries()[order],
+            tfs=tfs,
+            doc_len=matrix.doc_len,
+            positions=PositionIndex.encode(positions, tfs, indptr),
+            **params
+        )
+
+    @classmethod
+    def from_arrays(cls, vocab: Any, indptr: np.ndarray, doc_ids: np.ndarray, tfs: np.ndarray,
+                    doc_len: np.ndarray, positions: PositionIndex, idf: Optional[np.ndarray] = None,
+                    **params) -> "InvertedIndex":
+        index = cls(**params)
+        index.vocab = vocab
+        index.indptr = indptr
+        index.doc_ids = doc_ids
+        index.tfs = tfs
+        index.positions = positions
+        index.doc_len = doc_len
+        index._compute_stats(idf)
+        return index
+
+    def _compute_stats(self, idf: Optional[np.ndarray] = None):
+        n = self.num_docs
+        self.avgdl = float(self.doc_len.sum()) / n if n else 0.0
+        if self.avgdl:
+            self.doc_norm = self.k1 * (1 - self.b + self.b * self.doc_len / self.avgdl)
+        else:
+            self.doc_norm = np.full(n, self.k1, dtype=np.float64)
+
+        self.idf = idf if idf is not None else okapi_idf(np.diff(self.indptr), n, self.epsilon)
+
+    def doc_norms(self, ids: np.ndarray, avgdl: Optional[float] = None) -> np.ndarray:
+        """Length normalisation of docs `ids`; against `avgdl` instead of this index's own when given."""
+        if avgdl is None:
+            return self.doc_norm[ids]
+        if not avgdl:
+            return np.full(len(ids), self.k1, dtype=np.float64)
+        return self.k1 * (1 - self.b + self.b * self.doc_len[ids] / avgdl)
+
+    def merge(self, keep: np.ndarray, other: "InvertedIndex") -> "InvertedIndex":
+        """
+        New index holding this index's docs where `keep` is set (renumbered in
+        order) followed by every doc of `other`. Postings of dropped docs are
+        removed, `other`'s postings are appended, and IDF / avgdl are recomputed
+        from the merged arrays - no chunk is re-tokenized.
+        """
+        remap = np.cumsum(keep, dtype=np.int64) - 1
+        n_kept = int(keep.sum())
+
+        old_terms = list(self.vocab)
+        new_terms = list(other.vocab)
+        terms = sorted(set(old_terms).union(new_terms))
+        term_ids = {t: i for i, t in enumerate(terms)}
+
+        old_term_of = np.repeat(np.array([term_ids[t] for t in old_terms], dtype=np.int64), np.diff(self.indptr))
+        new_term_of = np.repeat(np.array([term_ids[t] for t in new_terms], dtype=np.int64), np.diff(other.indptr))
+        alive = keep[self.doc_ids]
+
+        term_of = np.concatenate([old_term_of[alive], new_term_of])
+        doc_ids = np.concatenate([remap[self.doc_ids[alive]], other.doc_ids.astype(np.int64) + n_kept])
+        tfs = np.concatenate([self.tfs[alive], other.tfs])
+        # Posting numbers in the concatenation of both position blobs
+        sources = np.concatenate([np.flatnonzero(alive), len(self.tfs) + np.arange(len(other.tfs))])
+
+        # Old docs precede new ones and each side is doc-sorted per term,
+        # so a stable sort by term keeps every posting list in doc order
+        order = np.argsort(term_of, kind="stable")
+        term_of, doc_ids, tfs, sources = term_of[order], doc_ids[order], tfs[order], sources[order]
+
+        # Terms whose postings all belonged to dropped docs disappear
+        counts = np.bincount(term_of, minlength=len(terms))
+        live = counts > 0
+        if not live.all():
+            term_of = (np.cumsum(live) - 1)[term_of]
+            terms = [t for t, ok in zip(terms, live) if ok]
+            counts = counts[live]
+
+        indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+
+        positions = PositionIndex.from_postings(
+            np.concatenate([self.positions.blob, other.positions.blob]),
+            np.concatenate([self.tfs, other.tfs]),
+            sources, indptr
+        )
+
+        return InvertedIndex.from_arrays(
+            vocab=Vocabulary(terms),
+            indptr=indptr,
+            doc_ids=doc_ids.astype(np.int32),
+            tfs=tfs.astype(np.int32),
+            doc_len=np.concatenate([self.doc_len[keep], other.doc_len]).astype(np.int32),
+            positions=positions,
+            k1=self.k1, b=self.b, epsilon=self.epsilon
+        )
+
+    def postings(self, term: str) -> Optional[Tuple[int, np.ndarray, np.ndarray]]:
+        """(term id, doc ids, term freqs) for a term, or None if it is not indexed."""
+        term_id = self.vocab.get(term)
+        if term_id is None:
+            return None
+        lo, hi = self.indptr[term_id], self.indptr[term_id + 1]
+        return term_id, self.doc_ids[lo:hi], self.tfs[lo:hi]
+
+    def term_positions(self, term_id: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(doc ids, positions indptr, flat positions) of one term, decoded in one pass."""
+        lo, hi = self.indptr[term_id], self.indptr[term_id + 1]
+        tfs = self.tfs[lo:hi]
+        indptr = np.zeros(len(tfs) + 1, dtype=np.int64)
+        np.cumsum(tfs, out=indptr[1:])
+        return self.doc_ids[lo:hi], indptr, self.positions.decode_term(term_id, tfs)
+
+    def encode_query(self, query_tokens: List[str]) -> List[Tuple[int, int]]:
+        """(term id, query frequency) per distinct query term the index knows, in query order."""
+        terms = []
+        for term, qf in Counter(query_tokens).items():
+            term_id = self.vocab.get(term)
+            if term_id is not None:
+                terms.append((term_id, qf))
+        return terms
+
+    def score(self, query_tokens: List[str], candidates: Optional[np.ndarray] = None) -> Dict[int, float]:
+        return self.score_terms(self.encode_query(query_tokens), candidates)
+
+    def score_terms(self, query_terms: List[Tuple[int, int]], candidates: Optional[np.ndarray] = None,
+                    idf: Optional[Dict[int, float]] = None, avgdl: Optional[float] = None) -> Dict[int, float]:
+        """
+        Accumulates BM25 scores for every chunk containing at least one query term.
+        If `candidates` (sorted doc ids) is given, postings are intersected with it
+        first so chunks outside the filter are never scored. `idf` (by term id)
+        and `avgdl` replace this index's own statistics, e.g. with corpus-wide
+        ones when this index is one shard of many (see shards.CorpusStats).
+        """
+        acc: Dict[int, float] = {}
+        for term_id, qf in query_terms:
+            lo, hi = self.indptr[term_id], self.indptr[term_id + 1]
+            ids, tfs = self.doc_ids[lo:hi], self.tfs[lo:hi]
+            if candidates is not None:
+                ids, tfs = _restrict(ids, tfs, candidates)
+                if len(ids) == 0:
+                    continue
+            weight = (self.idf[term_id] if idf is None else idf[term_id]) * qf
+            contrib = weight * (tfs * (self.k1 + 1)) / (tfs + self.doc_norms(ids, avgdl))
+            for doc_id, value in zip(ids.tolist(), contrib.tolist()):
+                acc[doc_id] = acc.get(doc_id, 0.0) + value
+        return acc
+
+def okapi_idf(df: np.ndarray, n: int, epsilon: float = EPSILON) -> np.ndarray:
+    """
+    Okapi IDF per term from document frequencies; terms found in more than
+    half the corpus get a negative idf, which (like BM25Okapi) is floored to
+    epsilon * average idf.
+    """
+    idf = np.log(n - df + 0.5) - np.log(df + 0.5)
+    if len(idf):
+        floor = epsilon * idf.mean()
+        idf[idf < 0] = floor
+        # Tiny corpora (a shard of a few chunks) can have no positive idf at all;
+        # keep every term slightly positive there so matching chunks are still returned
+        if floor <= 0:
+            positive = idf[idf > 0]
+            idf[idf <= 0] = epsilon * (positive.min() if len(positive) else 1.0)
+    return idf
+
+def _restrict(ids: np.ndarray, tfs: np.ndarray, candidates: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Intersects a posting list with sorted candidate ids, probing from the shorter side."""
+    if len(candidates) < len(ids):
+        pos = np.searchsorted(ids, candidates)
+        inside = pos < len(ids)
+        pos, probes = pos[inside], candidates[inside]
+        pos = pos[ids[pos] == probes]
+        return ids[pos], tfs[pos]
+    pos = np.searchsorted(candidates, ids)
+    keep = pos < len(candidates)
+    keep[keep] = candidates[pos[keep]] == ids[keep]
+    return ids[keep], tfs[keep]
@@ -0,0 +1,94 @@
+import uuid
+import threading
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional, Literal
+from pydantic import BaseModel
+from .search import get_backend
+
+# Finished jobs kept around for status polling
+MAX_JOB_HISTORY = 50
+
+class RebuildJob(BaseModel):
+    job_id: str
+    full: bool
+    status: Literal["queued", "running", "succeeded", "failed"] = "queued"
+    stage: str = "queued"
+    progress: float = 0.0
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    generation: Optional[int] = None
+    report: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+class RebuildManager:
+    """
+    Runs index rebuilds on a single background worker so requests never block
+    on them. Jobs run one at a time; while one is waiting in the queue, further
+    requests with the same mode reuse it instead of stacking duplicate builds.
+    """
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rag-rebuild")
+        self._jobs: "OrderedDict[str, RebuildJob]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, transcripts_dir: str = "./transcripts", full: bool = False) -> RebuildJob:
+        with self._lock:
+            for job in self._jobs.values():
+                if job.status == "queued" and job.full == full:
+                    return job.model_copy(deep=True)
+
+            job = RebuildJob(job_id=uuid.uuid4().hex[:12], full=full, created_at=datetime.now(timezone.utc))
+            self._jobs[job.job_id] = job
+            while len(self._jobs) > MAX_JOB_HISTORY:
+                self._jobs.popitem(last=False)
+            snapshot = job.model_copy(deep=True)
+
+        self._executor.submit(self._run, job, transcripts_dir)
+        return snapshot
+
+    def get(self, job_id: str) -> Optional[RebuildJob]:
+        # Copies: the worker keeps updating the live job while callers serialize it
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job.model_copy(deep=True) if job else None
+
+    def recent(self):
+        with self._lock:
+            return [job.model_copy(deep=True) for job in reversed(self._jobs.values())]
+
+    def _run(self, job: RebuildJob, transcripts_dir: str):
+        index = get_backend()
+        with self._lock:
+            job.status = "running"
+            job.started_at = datetime.now(timezone.utc)
+
+        def progress(stage: str, fraction: float):
+            with self._lock:
+                job.stage = stage
+                job.progress = round(fraction, 3)
+
+        try:
+            if job.full:
+                report = index.build(transcripts_dir, progress=progress)
+            else:
+                report = index.update(transcripts_dir, progress=progress)
+            with self._lock:
+                job.report = report
+                job.generation = index.generation
+                job.status = "succeeded"
+        except Exception as e:
+            print(f"[ERROR] Index rebuild {job.job_id} failed: {e}")
+            traceback.print_exc()
+            with self._lock:
+                job.status = "failed"
+                job.error = str(e)
+        finally:
+            with self._lock:
+                job.finished_at = datetime.now(timezone.utc)
+
+rebuild_manager = RebuildManager()
@@ -1,6 +1,6 @@
 import os
 import json
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Set
 
 MANIFEST_FILE = "manifest.json"
 
@@ -38,22 +38,22 @@ def generate_manifest_template(transcripts_dir: str) -> Dict[str, Any]:
             }
     return template
 
-def load_transcripts(transcripts_dir: str) -> List[Dict[str, Any]]:
-    """Loads all transcripts and merges manifest metadata."""
+def list_transcripts(transcripts_dir: str, only: Optional[Set[str]] = None) -> List[Dict[str, Any]]:
+    """Transcript files (or just the names in `only`) with manifest metadata, without reading them."""
     if not os.path.exists(transcripts_dir):
         os.makedirs(transcripts_dir)
         
     manifest = load_manifest(transcripts_dir)
-    documents = []
+    sources = []
     
-    for filename in os.listdir(transcripts_dir):
+    # Sorted so "first copy" in dedup means the same file on every filesystem
+    for filename in sorted(os.listdir(transcripts_dir)):
         if not filename.endswith(".txt"):
             continue
+        if only is not None and filename not in only:
+            continue
             
         file_path = os.path.join(transcripts_dir, filename)
-        with open(file_path, "r", encoding="utf-8") as f:
-            text = f.read()
-            
         meta = manifest.get(filename, {})
         
         # Fallbacks for missing manifest data
@@ -63,11 +63,19 @@ def load_transcripts(transcripts_dir: str) -> List[Dict[str, Any]]:
             meta["quarter"] = "unknown"
             meta["date"] = "unknown"
             
-        documents.append({
-            "text": text,
+        sources.append({
             "file_name": filename,
             "file_path": file_path,
             "metadata": meta
         })
         
-    return documents
+    return sources
+
+def read_transcript(source: Dict[str, Any]) -> Dict[str, Any]:
+    with open(source["file_path"], "r", encoding="utf-8") as f:
+        text = f.read()
+    return {"text": text, **source}
+
+def load_transcripts(transcripts_dir: str, only: Optional[Set[str]] = None) -> List[Dict[str, Any]]:
+    """Loads all transcripts (or just the file names in `only`) and merges manifest metadata."""
+    return [read_transcript(source) for source in list_transcripts(transcripts_dir, only)]
@@ -0,0 +1,126 @@
+"""
+Phrase and proximity matching on top of the positional postings.
+
+Quoted parts of a query ("gross margin") are phrases: a chunk only matches
+if the phrase terms occur consecutively. Candidates come from intersecting the
+phrase terms' postings; positions are then checked for just those chunks.
+Positions count tokens after stopword removal, so "data and center" matches
+the phrase "data center".
+
+Proximity scoring rewards chunks where the query terms sit close together:
+the smallest window containing every matched query term is found, and the
+score is multiplied by 1 + boost * (terms matched / window length).
+"""
+import re
+from typing import List, Dict, Tuple, Optional
+import numpy as np
+from .inverted import InvertedIndex
+
+_QUOTED = re.compile(r'"([^"]+)"')
+
+# Proximity is only computed for this many of the best BM25 candidates per requested result
+PROXIMITY_RERANK_FACTOR = 10
+PROXIMITY_MIN_CANDIDATES = 50
+
+def parse_phrases(query_text: str) -> List[str]:
+    return [p.strip() for p in _QUOTED.findall(query_text) if p.strip()]
+
+class PositionReader:
+    """Decodes each term's positions at most once per query."""
+
+    def __init__(self, inverted: InvertedIndex):
+        self.inverted = inverted
+        self._terms: Dict[int, Tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+
+    def doc_ids(self, term_id: int) -> np.ndarray:
+        lo, hi = self.inverted.indptr[term_id], self.inverted.indptr[term_id + 1]
+        return self.inverted.doc_ids[lo:hi]
+
+    def positions(self, term_id: int, doc_id: int) -> np.ndarray:
+        if term_id not in self._terms:
+            self._terms[term_id] = self.inverted.term_positions(term_id)
+        doc_ids, indptr, flat = self._terms[term_id]
+        i = np.searchsorted(doc_ids, doc_id)
+        if i >= len(doc_ids) or doc_ids[i] != doc_id:
+            return flat[:0]
+        return flat[indptr[i]:indptr[i + 1]]
+
+def phrase_candidates(reader: PositionReader, phrases: List[List[str]],
+                      candidates: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
+    """
+    Sorted doc ids containing every phrase (each a list of query tokens),
+    within `candidates` if given. Without phrases `candidates` is returned as is.
+    """
+    phrases = [p for p in phrases if p]
+    if not phrases:
+        return candidates
+
+    inverted = reader.inverted
+    matched = candidates
+    for tokens in phrases:
+        term_ids = [inverted.vocab.get(t) for t in tokens]
+        if any(t is None for t in term_ids):
+            return np.zeros(0, dtype=np.int64)
+
+        # Postings intersection first: only chunks with every term are position-checked
+        docs = matched
+        for term_id in sorted(set(term_ids), key=lambda t: inverted.indptr[t + 1] - inverted.indptr[t]):
+            ids = reader.doc_ids(term_id)
+            docs = ids if docs is None else np.intersect1d(docs, ids, assume_unique=True)
+            if len(docs) == 0:
+                return np.zeros(0, dtype=np.int64)
+
+        if len(term_ids) > 1:
+            docs = np.array([d for d in docs.tolist() if _has_phrase(reader, term_ids, d)], dtype=np.int64)
+        matched = np.asarray(docs, dtype=np.int64)
+    return matched
+
+def _has_phrase(reader: PositionReader, term_ids: List[int], doc_id: int) -> bool:
+    # Start positions where term i appears at start + i, for every i
+    starts = reader.positions(term_ids[0], doc_id)
+    for offset, term_id in enumerate(term_ids[1:], start=1):
+        starts = np.intersect1d(starts, reader.positions(term_id, doc_id) - offset)
+        if len(starts) == 0:
+            return False
+    return True
+
+def min_window(position_lists: List[np.ndarray]) -> int:
+    """Length of the smallest token window holding one position from every list."""
+    merged = sorted((int(p), i) for i, positions in enumerate(position_lists) for p in positions)
+    need = len(position_lists)
+    counts = [0] * need
+    covered = 0
+    best = None
+    left = 0
+    for pos, i in merged:
+        counts[i] += 1
+        if counts[i] == 1:
+            covered += 1
+        while covered == need:
+            left_pos, j = merged[left]
+            width = pos - left_pos + 1
+            best = width if best is None else min(best, width)
+            counts[j] -= 1
+            if counts[j] == 0:
+                covered -= 1
+            left += 1
+    return best or 0
+
+def apply_proximity(reader: PositionReader, term_ids: List[int], doc_ids: np.ndarray, scores: np.ndarray,
+                    boost: float, top_k: int) -> np.ndarray:
+    """Multiplies the proximity factor into the scores of the best candidates."""
+    if boost <= 0 or len(term_ids) < 2 or len(scores) == 0:
+        return scores
+
+    # Proximity only reorders the head of the ranking, so the tail is left alone
+    limit = max(top_k * PROXIMITY_RERANK_FACTOR, PROXIMITY_MIN_CANDIDATES)
+    head = np.argsort(-scores, kind="stable")[:limit]
+
+    scores = scores.copy()
+    for j in head.tolist():
+        doc_id = int(doc_ids[j])
+        lists = [p for p in (reader.positions(t, doc_id) for t in term_ids) if len(p)]
+        if len(lists) < 2:
+            continue
+        scores[j] *= 1 + boost * len(lists) / min_window(lists)
+    return scores
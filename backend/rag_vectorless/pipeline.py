@@ -0,0 +1,176 @@
+"""
+Staged corpus build: chunk (read + section detection + windowing in one
+streaming pass) -> tokenize per file, fanned out to a process pool, then
+merged into one InvertedIndex per shard at the end. Between the two,
+boilerplate and near-duplicate chunks are removed across the whole batch of
+files, and against the already indexed ones when a DedupState is given
+(see dedup).
+
+Workers intern tokens into a file-local Vocabulary and ship back chunk
+records plus a packed TermMatrix; the parent maps the file-local term ids
+onto one shared vocabulary and does a single merge.
+"""
+import os
+import time
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Dict, Any, Tuple, Callable, Optional
+from .schemas import ChunkRecord
+from .chunker import chunk_file, CHUNK_SIZE, CHUNK_OVERLAP
+from .inverted import InvertedIndex
+from .vocab import Vocabulary, TermMatrix, TermMatrixBuilder
+from .dedup import DEDUP_ENABLED, DedupState, find_redundant
+
+STAGES = ("chunk", "tokenize")
+
+# Below this many files the process start-up costs more than it saves
+MIN_FILES_FOR_POOL = 4
+
+def default_workers() -> int:
+    configured = os.environ.get("RAG_BUILD_WORKERS")
+    if configured:
+        return max(1, int(configured))
+    return max(1, min(8, (os.cpu_count() or 1) - 1))
+
+def process_file(source: Dict[str, Any], chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP
+                 ) -> Tuple[List[ChunkRecord], List[str], TermMatrix, Dict[str, float]]:
+    """Runs every per-file stage; must stay a top-level function so it pickles for the pool."""
+    # indexer imports this module, so tokenize is resolved lazily
+    from .indexer import tokenize
+
+    # Reading, section detection and chunking are one streaming pass over the file
+    chunks = []
+    vocab = Vocabulary()
+    rows = TermMatrixBuilder()
+    chunk_time = tokenize_time = 0.0
+    mark = time.perf_counter()
+    for chunk in chunk_file(source, chunk_size, overlap):
+        chunked = time.perf_counter()
+        chunk_time += chunked - mark
+
+        chunks.append(chunk)
+        rows.append(vocab.encode(tokenize(chunk.text)))
+
+        mark = time.perf_counter()
+        tokenize_time += mark - chunked
+
+    timings = {"chunk": chunk_time, "tokenize": tokenize_time}
+    return chunks, vocab.terms, rows.build(), timings
+
+def run_pipeline(sources: List[Dict[str, Any]], workers: Optional[int] = None,
+                 progress: Callable[[str, float], None] = lambda stage, fraction: None,
+                 dedupe: bool = DEDUP_ENABLED, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP
+                 ) -> Tuple[List[ChunkRecord], InvertedIndex, Dict[str, Any]]:
+    """
+    Processes `sources` (see loader.list_transcripts) and returns the chunks in
+    source order, their InvertedIndex, and a report with per-stage timings.
+    Stage times are summed across workers (CPU seconds); `wall` is elapsed time.
+    """
+    groups, report = run_sharded_pipeline(sources, lambda source: "", workers, progress, dedupe, chunk_size, overlap)
+    chunks, inverted = groups.get("", ([], InvertedIndex.from_corpus([])))
+    return chunks, inverted, report
+
+def run_sharded_pipeline(sources: List[Dict[str, Any]], shard_of: Callable[[Dict[str, Any]], str],
+                         workers: Optional[int] = None,
+                         progress: Callable[[str, float], None] = lambda stage, fraction: None,
+                         dedupe: bool = DEDUP_ENABLED, chunk_size: int = CHUNK_SIZE,
+                         overlap: int = CHUNK_OVERLAP, dedup_state: Optional[DedupState] = None
+                         ) -> Tuple[Dict[str, Tuple[List[ChunkRecord], InvertedIndex]], Dict[str, Any]]:
+    """
+    Like run_pipeline, but files are grouped by `shard_of(source)` after the
+    shared fan-out, and each group gets its own InvertedIndex (and statistics).
+    """
+    results, report = process_sources(sources, workers, progress, dedupe, chunk_size, overlap, dedup_state)
+    started = time.perf_counter()
+
+    progress("indexing", 0.75)
+    by_shard: Dict[str, List[Any]] = {}
+    for source, result in zip(sources, results):
+        by_shard.setdefault(shard_of(source), []).append(result)
+
+    groups = {key: _merge(shard_results) for key, shard_results in by_shard.items()}
+    report["chunks"] = sum(len(chunks) for chunks, _ in groups.values())
+    report["shards"] = len(groups)
+    report["wall"]["merge"] = round(time.perf_counter() - started, 4)
+    return groups, report
+
+def process_sources(sources: List[Dict[str, Any]], workers: Optional[int] = None,
+                    progress: Callable[[str, float], None] = lambda stage, fraction: None,
+                    dedupe: bool = DEDUP_ENABLED, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP,
+                    dedup_state: Optional[DedupState] = None) -> Tuple[List[Any], Dict[str, Any]]:
+    """
+    The shared fan-out: process_file results for `sources` in source order,
+    with redundant chunks already removed, and the report so far.
+    `dedup_state` (the indexed files) is checked against and updated.
+    """
+    workers = workers or default_workers()
+    started = time.perf_counter()
+    results: List[Any] = [None] * len(sources)
+
+    if workers > 1 and len(sources) >= MIN_FILES_FOR_POOL:
+        # spawn rather than fork: the server process is multi-threaded
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=min(workers, len(sources)), mp_context=ctx) as pool:
+            futures = {pool.submit(process_file, source, chunk_size, overlap): i for i, source in enumerate(sources)}
+            for done, future in enumerate(as_completed(futures), start=1):
+                results[futures[future]] = future.result()
+                progress("chunking", 0.1 + 0.6 * done / len(sources))
+    else:
+        workers = 1
+        for i, source in enumerate(sources):
+            results[i] = process_file(source, chunk_size, overlap)
+            progress("chunking", 0.1 + 0.6 * (i + 1) / len(sources))
+    fanout_done = time.perf_counter()
+
+    dedup_report = None
+    if dedupe and results:
+        progress("deduplicating", 0.7)
+        files = [(source["file_name"], terms, matrix) for source, (_, terms, matrix, _) in zip(sources, results)]
+        keeps, dedup_report = find_redundant(files, dedup_state)
+        results = [_keep_chunks(result, keep) for result, keep in zip(results, keeps)]
+    deduped = time.perf_counter()
+
+    stages = dict.fromkeys(STAGES, 0.0)
+    for result in results:
+        for stage, seconds in result[3].items():
+            stages[stage] += seconds
+
+    report = {
+        "files": len(sources),
+        "chunks": sum(len(result[0]) for result in results),
+        "workers": workers,
+        "stages": {stage: round(seconds, 4) for stage, seconds in stages.items()},
+        "wall": {
+            "process_files": round(fanout_done - started, 4),
+            "dedup": round(deduped - fanout_done, 4),
+        },
+    }
+    if dedup_report is not None:
+        report["dedup"] = dedup_report
+    return results, report
+
+def _keep_chunks(result: Any, keep: np.ndarray) -> Any:
+    """A per-file result without the chunks `keep` rules out, and without terms only they used."""
+    chunks, terms, matrix, timings = result
+    if keep.all():
+        return result
+    matrix = matrix.select(keep)
+    used = np.unique(matrix.term_ids)
+    remap = np.zeros(len(terms), dtype=np.int32)
+    remap[used] = np.arange(len(used), dtype=np.int32)
+    return (
+        [c for c, k in zip(chunks, keep.tolist()) if k],
+        [terms[i] for i in used.tolist()],
+        matrix.remap(remap),
+        timings,
+    )
+
+def _merge(results: List[Any]) -> Tuple[List[ChunkRecord], InvertedIndex]:
+    """One InvertedIndex over per-file results, in source order so doc ids are deterministic."""
+    chunks, matrices = [], []
+    vocab = Vocabulary()
+    for file_chunks, file_terms, file_matrix, _ in results:
+        chunks.extend(file_chunks)
+        matrices.append(file_matrix.remap(vocab.encode(file_terms)))
+    return chunks, InvertedIndex.from_matrix(vocab, TermMatrix.concat(matrices))
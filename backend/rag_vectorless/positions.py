@@ -0,0 +1,102 @@
+"""
+Compact token positions for the postings.
+
+Every posting (term t in chunk d) owns the positions of t's occurrences in d,
+counted in tokens after stopword removal. On disk and in memory they are kept
+as one byte blob:
+  - positions within a posting are delta-encoded (first one absolute), so
+    gaps rather than offsets are stored
+  - each delta is a LEB128 varint (7 bits per byte, high bit = more bytes),
+    which fits almost every gap in a single byte
+  - offsets[t] .. offsets[t + 1] are the bytes of term t's postings, which
+    follow the postings order (tfs[p] values per posting p)
+
+Only term boundaries are stored, so the overhead is a few bytes per term
+rather than per posting. A term's block is decoded in one vectorised pass
+when a phrase or proximity query needs it.
+"""
+import numpy as np
+
+def varint_lengths(values: np.ndarray) -> np.ndarray:
+    """Bytes varint_encode spends on each value."""
+    values = np.asarray(values, dtype=np.uint64)
+    n_bytes = np.ones(len(values), dtype=np.int64)
+    for shift in (7, 14, 21, 28, 35):
+        n_bytes += values >= (np.uint64(1) << np.uint64(shift))
+    return n_bytes
+
+def varint_encode(values: np.ndarray) -> np.ndarray:
+    values = np.asarray(values, dtype=np.uint64)
+    n_bytes = varint_lengths(values)
+
+    # Byte k of a value carries bits [7k, 7k + 7)
+    k = np.arange(int(n_bytes.sum()), dtype=np.int64) - np.repeat(np.cumsum(n_bytes) - n_bytes, n_bytes)
+    out = (np.repeat(values, n_bytes) >> (7 * k).astype(np.uint64)) & np.uint64(0x7F)
+    more = k < np.repeat(n_bytes, n_bytes) - 1
+    out[more] |= np.uint64(0x80)
+    return out.astype(np.uint8)
+
+def varint_decode(blob: np.ndarray) -> np.ndarray:
+    blob = np.asarray(blob, dtype=np.uint8)
+    if len(blob) == 0:
+        return np.zeros(0, dtype=np.int64)
+    ends = np.flatnonzero(blob < 0x80)
+    starts = np.concatenate([[0], ends[:-1] + 1])
+    k = np.arange(len(blob), dtype=np.int64) - np.repeat(starts, ends - starts + 1)
+    parts = (blob & 0x7F).astype(np.int64) << (7 * k)
+    return np.add.reduceat(parts, starts)
+
+def gather_segments(values: np.ndarray, starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Concatenates values[starts[i]:starts[i] + lengths[i]] for every i, in order."""
+    lengths = np.asarray(lengths, dtype=np.int64)
+    out_starts = np.cumsum(lengths) - lengths
+    index = np.repeat(np.asarray(starts, dtype=np.int64) - out_starts, lengths) + np.arange(int(lengths.sum()), dtype=np.int64)
+    return values[index]
+
+def _offsets(lengths: np.ndarray) -> np.ndarray:
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return offsets
+
+class PositionIndex:
+    """Encoded positions of every posting, with byte offsets per term."""
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        self.blob = blob
+        self.offsets = offsets
+
+    @classmethod
+    def encode(cls, positions: np.ndarray, tfs: np.ndarray, indptr: np.ndarray) -> "PositionIndex":
+        """`positions` is flat and ascending within each posting; posting p has tfs[p] >= 1 of them."""
+        positions = np.asarray(positions, dtype=np.int64)
+        tfs = np.asarray(tfs, dtype=np.int64)
+        starts = np.cumsum(tfs) - tfs
+        deltas = positions.copy()
+        deltas[1:] -= positions[:-1]
+        deltas[starts] = positions[starts]
+
+        # Byte offset of every value, then of every posting, then of every term
+        value_offsets = _offsets(varint_lengths(deltas))
+        posting_offsets = value_offsets[_offsets(tfs)]
+        return cls(varint_encode(deltas), posting_offsets[indptr])
+
+    @classmethod
+    def from_postings(cls, blob: np.ndarray, tfs: np.ndarray, postings: np.ndarray, indptr: np.ndarray) -> "PositionIndex":
+        """
+        Re-packs the postings numbered `postings`, in that order, out of an
+        encoded `blob` whose postings have term frequencies `tfs`. Postings are
+        self-contained, so this only moves byte ranges.
+        """
+        value_ends = np.flatnonzero(np.asarray(blob) < 0x80) + 1
+        posting_offsets = np.concatenate([[0], value_ends[np.cumsum(tfs, dtype=np.int64) - 1]]).astype(np.int64)
+        lengths = np.diff(posting_offsets)[postings]
+        packed = gather_segments(blob, posting_offsets[:-1][postings], lengths)
+        return cls(packed, _offsets(lengths)[indptr])
+
+    def decode_term(self, term_id: int, tfs: np.ndarray) -> np.ndarray:
+        """Flat positions of every posting of a term; `tfs` are that term's frequencies."""
+        deltas = varint_decode(self.blob[self.offsets[term_id]:self.offsets[term_id + 1]])
+        starts = np.cumsum(tfs, dtype=np.int64) - tfs
+        running = np.cumsum(deltas)
+        # Undo the running sum across posting boundaries
+        return running - np.repeat(running[starts] - deltas[starts], tfs)
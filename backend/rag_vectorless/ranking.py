@@ -0,0 +1,107 @@
+"""
+Declarative ranking boosts.
+
+A boost has two halves, so no string matching happens per query:
+  features - predicates over a chunk ("text contains guidance or outlook"),
+             evaluated once at index time and stored as one bitset each
+  rules    - "if the query contains any trigger, multiply chunks having
+             feature F by M", compiled once and applied as array products
+
+The defaults reproduce the original hardcoded boosts. Set RAG_BOOST_CONFIG to
+a JSON file of the same shape to tune them: editing rules only needs a
+restart, editing features triggers a full re-index (the feature definitions
+are recorded in the index header).
+"""
+import os
+import json
+from typing import List, Dict, Any, Optional, Literal, Tuple
+import numpy as np
+from pydantic import BaseModel
+
+DEFAULT_BOOST_CONFIG = {
+    "features": {
+        "mentions_guidance": {"source": "text", "contains": ["guidance", "outlook"]},
+        "mentions_azure": {"source": "text", "contains": ["azure"]},
+        "qa_section": {"source": "section", "contains": ["q&a"]},
+    },
+    "rules": [
+        {"query_contains": ["guidance", "outlook"], "feature": "mentions_guidance", "multiplier": 1.10},
+        {"query_contains": ["azure"], "feature": "mentions_azure", "multiplier": 1.10},
+        {"query_contains": ["?"], "feature": "qa_section", "multiplier": 1.10},
+    ],
+}
+
+class FeatureSpec(BaseModel):
+    source: Literal["text", "section"] = "text"
+    contains: List[str]
+
+class BoostRule(BaseModel):
+    query_contains: List[str]
+    feature: str
+    multiplier: float
+
+class BoostConfig(BaseModel):
+    features: Dict[str, FeatureSpec]
+    rules: List[BoostRule]
+
+def load_boost_config(path: Optional[str] = None) -> BoostConfig:
+    path = path or os.environ.get("RAG_BOOST_CONFIG")
+    if path:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return BoostConfig(**json.load(f))
+        except Exception as e:
+            print(f"[ERROR] Could not load boost config {path}, using defaults: {e}")
+    return BoostConfig(**DEFAULT_BOOST_CONFIG)
+
+def has_bits(bits: np.ndarray, doc_ids: np.ndarray) -> np.ndarray:
+    """Looks `doc_ids` up in a np.packbits bitset."""
+    doc_ids = np.asarray(doc_ids, dtype=np.int64)
+    return ((bits[doc_ids >> 3] >> (7 - (doc_ids & 7))) & 1).astype(bool)
+
+class BoostRules:
+    """A BoostConfig compiled for matching: lowercased triggers and terms, validated references."""
+
+    def __init__(self, config: BoostConfig):
+        self.features = {
+            name: (spec.source, tuple(term.lower() for term in spec.contains))
+            for name, spec in config.features.items()
+        }
+        self.rules = []
+        for rule in config.rules:
+            if rule.feature not in self.features:
+                raise ValueError(f"Boost rule refers to unknown feature '{rule.feature}'")
+            self.rules.append((tuple(t.lower() for t in rule.query_contains), rule.feature, rule.multiplier))
+
+    def feature_spec(self) -> Dict[str, Any]:
+        """JSON form of the feature definitions, stored with the index they were computed for."""
+        return {name: {"source": source, "contains": list(terms)} for name, (source, terms) in self.features.items()}
+
+    def compute_features(self, texts: List[str], sections: List[Optional[str]]) -> Dict[str, np.ndarray]:
+        """Boolean column per feature, one entry per chunk."""
+        lowered = {
+            "text": [t.lower() for t in texts],
+            "section": [(s or "").lower() for s in sections],
+        }
+        return {
+            name: np.fromiter((any(term in value for term in terms) for value in lowered[source]),
+                              dtype=bool, count=len(texts))
+            for name, (source, terms) in self.features.items()
+        }
+
+    def triggered(self, query_text: str) -> Tuple[int, ...]:
+        """Positions of the rules `query_text` triggers."""
+        query_lower = query_text.lower()
+        return tuple(i for i, (triggers, _, _) in enumerate(self.rules) if any(t in query_lower for t in triggers))
+
+    def apply(self, query_text: str, doc_ids: np.ndarray, scores: np.ndarray,
+              feature_bits: Dict[str, np.ndarray]) -> np.ndarray:
+        """Multiplies every rule the query triggers into `scores`."""
+        for i in self.triggered(query_text):
+            _, feature, multiplier = self.rules[i]
+            bits = feature_bits.get(feature)
+            if bits is not None:
+                scores = scores * np.where(has_bits(bits, doc_ids), multiplier, 1.0)
+        return scores
+
+boost_rules = BoostRules(load_boost_config())
@@ -0,0 +1,147 @@
+"""
+Scaling curve of the BM25 index on synthetic corpora (see synthetic).
+
+    python -m rag_vectorless.scaling --chunks 10000,100000,1000000 --out scaling.json
+
+For every target size a corpus of about that many chunks is generated and
+indexed from scratch. Building and serving each run in a fresh process, so
+peak RSS belongs to that step alone:
+  build  - wall time, peak RSS of the building process and of the largest
+           pipeline worker, size of the index_cache directory
+  serve  - load time, peak RSS after loading and answering queries, and
+           p50 / p99 query latency with the query cache off
+Peak RSS comes from getrusage and is None where that is not available.
+"""
+import os
+import sys
+import json
+import math
+import time
+import shutil
+import argparse
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Optional
+import numpy as np
+from .indexer import BM25Index
+from .search import BM25Backend
+from .chunker import CHUNK_SIZE, CHUNK_OVERLAP
+from .synthetic import WORDS_PER_FILE, fit_vocabulary, generate_corpus, sample_queries
+from .bench import time_queries, _dir_size
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DEFAULT_SIZES = "1000,10000,100000"
+NUM_QUERIES = 50
+
+def peak_rss_mb(who: str = "self") -> Optional[float]:
+    """Peak resident set size of this process ("self") or its largest finished child ("children")."""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF if who == "self" else resource.RUSAGE_CHILDREN)
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return round(usage.ru_maxrss * scale / 2 ** 20, 1)
+
+def measure_build(transcripts_dir: str, cache_dir: str) -> Dict[str, Any]:
+    started = time.perf_counter()
+    report = BM25Index(cache_dir).build(transcripts_dir)
+    return {
+        "build_seconds": round(time.perf_counter() - started, 3),
+        "chunks": report["chunks"],
+        "shards": report["shards"],
+        "build_peak_rss_mb": peak_rss_mb("self"),
+        "worker_peak_rss_mb": peak_rss_mb("children"),
+        "index_bytes": _dir_size(cache_dir),
+    }
+
+def measure_serving(cache_dir: str, queries: List[Dict[str, Any]], repeat: int) -> Dict[str, Any]:
+    index = BM25Index(cache_dir)
+    started = time.perf_counter()
+    index.load()
+    load_seconds = time.perf_counter() - started
+    latency = time_queries(BM25Backend(index), queries, k=5, repeat=repeat)
+    return {
+        "load_seconds": round(load_seconds, 4),
+        "serve_peak_rss_mb": peak_rss_mb("self"),
+        "latency": latency,
+    }
+
+def _in_fresh_process(fn, *args) -> Dict[str, Any]:
+    # spawn: a clean interpreter, so getrusage peaks cover this step only
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(fn, *args).result()
+
+def files_for(chunks: int, words_per_file: int = WORDS_PER_FILE) -> int:
+    """Files of `words_per_file` words needed for about `chunks` chunks of the default size."""
+    return max(1, math.ceil(chunks * (CHUNK_SIZE - CHUNK_OVERLAP) / words_per_file))
+
+def run_scaling(sizes: List[int], companies: int = 20, words_per_file: int = WORDS_PER_FILE,
+                source_dir: str = "./transcripts", repeat: int = 3, seed: int = 0,
+                work_dir: Optional[str] = None) -> List[Dict[str, Any]]:
+    """One measurement per target chunk count, smallest first."""
+    vocabulary = fit_vocabulary(source_dir)
+    rng = np.random.default_rng(seed)
+    # A quarter of the queries filter on one company, like the chat router does
+    queries = [
+        {"query": q, "filters": {"company": f"SYN{i % companies:04d}"} if i % 4 == 0 else None}
+        for i, q in enumerate(sample_queries(rng, *vocabulary, NUM_QUERIES))
+    ]
+
+    root = work_dir or tempfile.mkdtemp(prefix="rag_scaling_")
+    points = []
+    try:
+        for target in sorted(sizes):
+            corpus = os.path.join(root, f"corpus_{target}")
+            cache_dir = os.path.join(root, f"index_cache_{target}")
+            files = files_for(target, words_per_file)
+            started = time.perf_counter()
+            generate_corpus(corpus, files, companies, words_per_file, seed=seed, vocabulary=vocabulary)
+            generate_seconds = time.perf_counter() - started
+
+            point = {"target_chunks": target, "files": files, "generate_seconds": round(generate_seconds, 3)}
+            point.update(_in_fresh_process(measure_build, corpus, cache_dir))
+            point.update(_in_fresh_process(measure_serving, cache_dir, queries, repeat))
+            points.append(point)
+            if work_dir is None:
+                shutil.rmtree(corpus, ignore_errors=True)
+                shutil.rmtree(cache_dir, ignore_errors=True)
+    finally:
+        if work_dir is None:
+            shutil.rmtree(root, ignore_errors=True)
+    return points
+
+def main(argv: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    parser = argparse.ArgumentParser(description="BM25 index scaling curve on synthetic corpora")
+    parser.add_argument("--chunks", default=DEFAULT_SIZES, help="target chunk counts, comma separated")
+    parser.add_argument("--companies", type=int, default=20)
+    parser.add_argument("--words-per-file", type=int, default=WORDS_PER_FILE)
+    parser.add_argument("--source", default="./transcripts", help="real transcripts to fit the vocabulary on")
+    parser.add_argument("--repeat", type=int, default=3, help="timed rounds over the sample queries")
+    parser.add_argument("--keep", help="generate into this directory and keep corpora and indexes")
+    parser.add_argument("--out", help="write the measurements here as JSON")
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.chunks.split(",")]
+    points = run_scaling(sizes, args.companies, args.words_per_file, args.source, args.repeat, work_dir=args.keep)
+
+    print(f"\n{'chunks':>9} {'files':>6} {'build s':>8} {'build MB':>9} {'worker MB':>10} {'index MB':>9} "
+          f"{'load ms':>8} {'serve MB':>9} {'p50 ms':>7} {'p99 ms':>7}")
+    for p in points:
+        print(f"{p['chunks']:>9} {p['files']:>6} {p['build_seconds']:>8.2f} {p['build_peak_rss_mb'] or 0:>9.1f} "
+              f"{p['worker_peak_rss_mb'] or 0:>10.1f} {p['index_bytes'] / 2 ** 20:>9.1f} "
+              f"{p['load_seconds'] * 1000:>8.1f} {p['serve_peak_rss_mb'] or 0:>9.1f} "
+              f"{p['latency']['p50_ms']:>7.2f} {p['latency']['p99_ms']:>7.2f}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(points, f, indent=2)
+        print(f"Report written to {args.out}")
+    return points
+
+if __name__ == "__main__":
+    main()
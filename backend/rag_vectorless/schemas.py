@@ -22,6 +22,8 @@ class SearchQuery(BaseModel):
     query: str
     top_k: int = 5
     filters: Optional[Dict[str, Any]] = None
+    # > 0 rewards chunks where the query terms appear close together
+    proximity_boost: float = 0.0
 
 class SearchResult(BaseModel):
     score: float
@@ -31,3 +33,33 @@ class SearchResult(BaseModel):
 class SearchResponse(BaseModel):
     query: str
     results: List[SearchResult]
+
+class SlimSearchResult(BaseModel):
+    """A hit without its full text; fetch that with GET /rag/chunk/{chunk_id}."""
+    chunk_id: str
+    score: float
+    snippet: str
+    metadata: ChunkMetadata
+
+class SlimSearchResponse(BaseModel):
+    query: str
+    results: List[SlimSearchResult]
+
+class BatchSearchRequest(BaseModel):
+    queries: List[SearchQuery]
+
+class BatchSearchResponse(BaseModel):
+    responses: List[SearchResponse]
+
+class ContextStats(BaseModel):
+    """What context packing did to the hits of one prompt (see context.pack_context)."""
+    hits: int
+    passages: int
+    hits_merged: int
+    duplicates_removed: int
+    passages_truncated: int
+    passages_dropped: int
+    token_budget: int
+    raw_tokens: int
+    packed_tokens: int
+    tokens_saved: int
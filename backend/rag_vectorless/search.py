@@ -1,64 +1,164 @@
-from typing import List, Dict, Any, Tuple
-from .schemas import SearchQuery, SearchResult
-from .indexer import get_index, tokenize
+from typing import List, Dict, Any, Optional
+import numpy as np
+from .schemas import SearchQuery, SearchResult, ChunkRecord
+from .indexer import UpdatePlan, ProgressCallback, _no_progress, BM25Index, get_index, tokenize, analyze_query, build_index_if_needed
+from .backends import BACKEND, SearchBackend
+from .fts import FTS5Backend
+from .ranking import boost_rules
+from .cache import query_cache, search_key
+from .phrase import PositionReader, parse_phrases, phrase_candidates, apply_proximity
+from .shards import CorpusStats, IndexShard, scatter
+
+class BM25Backend(SearchBackend):
+    """The in-process sharded BM25 engine; delegates to a BM25Index (the global one by default)."""
+
+    name = "bm25"
+
+    def __init__(self, index: Optional[BM25Index] = None):
+        self._index = index
+
+    @property
+    def index(self) -> BM25Index:
+        return self._index or get_index()
+
+    @property
+    def num_docs(self) -> int:
+        return self.index.num_docs
+
+    @property
+    def generation(self) -> int:
+        return self.index.generation
+
+    def prepare(self, transcripts_dir: str) -> Optional[UpdatePlan]:
+        return build_index_if_needed(transcripts_dir, self.index)
+
+    def build(self, transcripts_dir: str, progress: ProgressCallback = _no_progress) -> Dict[str, Any]:
+        return self.index.build(transcripts_dir, progress=progress)
+
+    def update(self, transcripts_dir: str, plan: Optional[UpdatePlan] = None,
+               progress: ProgressCallback = _no_progress) -> Dict[str, Any]:
+        return self.index.update(transcripts_dir, plan, progress=progress)
+
+    def search(self, query: SearchQuery) -> List[SearchResult]:
+        return search_bm25(query, self.index)
+
+    def get_chunk(self, chunk_id: str) -> Optional[ChunkRecord]:
+        snapshot = self.index.snapshot
+        for shard in (snapshot.shards.values() if snapshot else ()):
+            doc_id = shard.store.find(chunk_id)
+            if doc_id is not None:
+                return shard.store.record(doc_id)
+        return None
+
+_BACKENDS = {"bm25": BM25Backend, "fts5": FTS5Backend}
+_backend: Optional[SearchBackend] = None
+
+def get_backend() -> SearchBackend:
+    """The backend RAG_BACKEND selects, created on first use."""
+    global _backend
+    if _backend is None:
+        if BACKEND not in _BACKENDS:
+            print(f"[WARNING] Unknown RAG_BACKEND '{BACKEND}', using bm25.")
+        _backend = _BACKENDS.get(BACKEND, BM25Backend)()
+    return _backend
 
 def search_index(query_req: SearchQuery) -> List[SearchResult]:
-    index = get_index()
-    if not index.bm25 or not index.chunks:
+    return get_backend().search(query_req)
+
+def get_chunk(chunk_id: str) -> Optional[ChunkRecord]:
+    """Full text and metadata of one chunk, e.g. behind a slim search result."""
+    return get_backend().get_chunk(chunk_id)
+
+def search_bm25(query_req: SearchQuery, bm25_index: Optional[BM25Index] = None) -> List[SearchResult]:
+    # Pin one generation for the whole query; a concurrent rebuild swaps in a new one
+    index = (bm25_index or get_index()).snapshot
+    if index is None or not index.num_docs:
         return []
-        
+
     query_text = query_req.query
     filters = query_req.filters or {}
     top_k = query_req.top_k
-    
-    tokenized_query = tokenize(query_text)
-    
-    # Get initial BM25 scores
-    scores = index.bm25.get_scores(tokenized_query)
-    
-    results = []
-    
-    # Check boost terms
-    has_guidance = "guidance" in query_text.lower() or "outlook" in query_text.lower()
-    has_azure = "azure" in query_text.lower()
-    has_question = "?" in query_text
-    
-    for i, (score, chunk) in enumerate(zip(scores, index.chunks)):
-        if score <= 0:
-            continue
-            
-        # Apply filters
-        pass_filter = True
-        if filters:
-            for k, v in filters.items():
-                chunk_val = getattr(chunk.metadata, k, None)
-                if chunk_val != v:
-                    pass_filter = False
-                    break
-                    
-        if not pass_filter:
-            continue
-            
-        # Apply boosts
-        boosted_score = score
-        chunk_text_lower = chunk.text.lower()
-        
-        if has_guidance and ("guidance" in chunk_text_lower or "outlook" in chunk_text_lower):
-            boosted_score *= 1.10
-            
-        if has_azure and "azure" in chunk_text_lower:
-            boosted_score *= 1.10
-            
-        if has_question and chunk.metadata.section and "q&a" in chunk.metadata.section.lower():
-            boosted_score *= 1.10
-            
-        results.append(SearchResult(
-            score=boosted_score,
-            text=chunk.text,
-            metadata=chunk.metadata
-        ))
-        
-    # Sort by score descending
-    results.sort(key=lambda x: x.score, reverse=True)
-    
-    return results[:top_k]
+
+    tokens = analyze_query(query_text)
+    phrases = [tokenize(p) for p in parse_phrases(query_text)]
+    cache_key = search_key(query_req, tokens, phrases)
+    cached = query_cache.get(index.generation, cache_key)
+    if cached is not None:
+        return cached
+
+    # Scatter to the shards the filters can match, gather one global top-k;
+    # every shard scores with the snapshot-wide statistics so the scores compare
+    shards = index.router.route(filters)
+    per_shard = scatter(
+        lambda shard: _search(shard, query_text, tokens, phrases, filters, top_k, query_req.proximity_boost,
+                              index.stats),
+        shards
+    )
+    results = merge_results(per_shard, top_k)
+    query_cache.put(index.generation, cache_key, results)
+    return results
+
+def merge_results(per_shard: List[List[SearchResult]], top_k: int) -> List[SearchResult]:
+    """Global top-k over per-shard rankings; ties keep shard order."""
+    merged = [result for results in per_shard for result in results]
+    merged.sort(key=lambda r: -r.score)
+    return merged[:top_k]
+
+def _search(shard: IndexShard, query_text: str, tokens: List[str], phrases: List[List[str]],
+            filters: Dict[str, Any], top_k: int, proximity_boost: float,
+            stats: Optional[CorpusStats] = None) -> List[SearchResult]:
+    # Tokens are mapped to term ids once; scoring works on ids only
+    query_terms = shard.inverted.encode_query(tokens)
+    reader = PositionReader(shard.inverted)
+
+    # Resolve filters against the metadata indexes before scoring
+    candidates = shard.metadata_index.candidates(filters)
+    if candidates is not None and len(candidates) == 0:
+        return []
+
+    # Quoted phrases narrow the candidates further, via postings intersection
+    candidates = phrase_candidates(reader, phrases, candidates)
+    if candidates is not None and len(candidates) == 0:
+        return []
+
+    # Term-at-a-time BM25: only candidate chunks sharing a term with the query get a score
+    if stats is None:
+        scores = shard.inverted.score_terms(query_terms, candidates)
+    else:
+        scores = shard.inverted.score_terms(query_terms, candidates, stats.query_idf(shard.inverted, tokens), stats.avgdl)
+
+    doc_ids = np.fromiter(scores.keys(), dtype=np.int64, count=len(scores))
+    values = np.fromiter(scores.values(), dtype=np.float64, count=len(scores))
+    positive = values > 0
+    doc_ids, values = doc_ids[positive], values[positive]
+
+    values = apply_boosts(shard, query_text, doc_ids, values)
+    values = apply_proximity(reader, [t for t, _ in query_terms], doc_ids, values, proximity_boost, top_k)
+    return top_results(shard, doc_ids, values, top_k)
+
+def apply_boosts(shard: IndexShard, query_text: str, doc_ids: np.ndarray, scores: np.ndarray) -> np.ndarray:
+    """Multiplies the configured boosts into `scores` (one per entry of `doc_ids`)."""
+    # Chunk features were evaluated at index time; this is bitset lookups only
+    return boost_rules.apply(query_text, doc_ids, scores, shard.store.features)
+
+def top_results(shard: IndexShard, doc_ids: np.ndarray, scores: np.ndarray, top_k: int) -> List[SearchResult]:
+    """Best `top_k` chunks, highest score first; ties keep corpus order."""
+    if top_k <= 0:
+        return []
+    if len(scores) > top_k:
+        # argpartition finds the top k in linear time; only those get sorted
+        part = np.argpartition(-scores, top_k - 1)[:top_k]
+        # Ties at the cut-off must still go to the lowest doc ids
+        cutoff = scores[part].min()
+        part = np.flatnonzero(scores >= cutoff)
+        doc_ids, scores = doc_ids[part], scores[part]
+    order = np.lexsort((doc_ids, -scores))[:top_k]
+
+    return [
+        SearchResult(
+            score=float(scores[j]),
+            text=shard.store.text(int(doc_ids[j])),
+            metadata=shard.store.metadata(int(doc_ids[j]))
+        )
+        for j in order
+    ]
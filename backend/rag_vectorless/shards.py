@@ -0,0 +1,122 @@
+"""
+Index sharding by company (optionally company + fiscal year).
+
+Every shard is a complete index of its own - postings, BM25 statistics,
+metadata and text in one mapped file - so a query scoped to one ticker only
+touches that ticker's filings. Queries are routed to the shards their filters
+can match, searched in parallel and merged into one global top-k. So that
+scores from different shards can be merged, every shard scores with the
+snapshot's corpus-wide statistics (CorpusStats: document count, average
+length, document frequencies) rather than its own; rankings match those of a
+single unsharded index.
+
+Set RAG_SHARD_BY=company_fy to split each company further by fiscal year.
+"""
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from collections import Counter
+from typing import List, Dict, Any, Optional, Callable, TypeVar
+import numpy as np
+from .inverted import InvertedIndex, EPSILON, okapi_idf
+from .filters import MetadataIndex
+from .storage import ChunkStore
+
+SHARD_BY = os.environ.get("RAG_SHARD_BY", "company")
+# Filter fields that decide which shards a query can match
+ROUTING_FIELDS = ("company", "fy")
+
+SEARCH_THREADS = int(os.environ.get("RAG_SEARCH_THREADS", min(8, os.cpu_count() or 1)))
+_search_pool = ThreadPoolExecutor(max_workers=max(1, SEARCH_THREADS), thread_name_prefix="rag-search")
+
+T = TypeVar("T")
+
+def shard_key(metadata: Dict[str, Any], shard_by: str = SHARD_BY) -> str:
+    company = str(metadata.get("company") or "unknown")
+    if shard_by == "company_fy":
+        return f"{company}_{metadata.get('fy') or 'unknown'}"
+    return company
+
+def shard_file_name(key: str, token: str) -> str:
+    # Keys come from manifest metadata, so keep file names to a safe alphabet
+    return f"shard-{re.sub(r'[^A-Za-z0-9_.-]', '_', key)}-{token}.bin"
+
+class IndexShard:
+    """One shard of a published snapshot. Never mutated after it is created."""
+
+    def __init__(self, key: str, file_name: str, inverted: InvertedIndex, metadata_index: MetadataIndex, store: ChunkStore):
+        self.key = key
+        self.file_name = file_name
+        self.inverted = inverted
+        self.metadata_index = metadata_index
+        self.store = store
+
+    @property
+    def num_docs(self) -> int:
+        return len(self.store)
+
+class CorpusStats:
+    """
+    BM25 statistics over every shard of one snapshot, computed once when the
+    snapshot is opened: N, avgdl and the idf of every term in any shard.
+    """
+
+    def __init__(self, shards: List[IndexShard]):
+        indexes = [shard.inverted for shard in shards]
+        self.num_docs = sum(inverted.num_docs for inverted in indexes)
+        total_len = sum(int(inverted.doc_len.sum()) for inverted in indexes)
+        self.avgdl = total_len / self.num_docs if self.num_docs else 0.0
+
+        df: Dict[str, int] = {}
+        for inverted in indexes:
+            for term, count in zip(inverted.vocab, np.diff(inverted.indptr).tolist()):
+                df[term] = df.get(term, 0) + count
+        epsilon = indexes[0].epsilon if indexes else EPSILON
+        idf = okapi_idf(np.fromiter(df.values(), dtype=np.int64, count=len(df)), self.num_docs, epsilon)
+        self.idf = dict(zip(df, idf.tolist()))
+
+    def query_idf(self, inverted: InvertedIndex, query_tokens: List[str]) -> Dict[int, float]:
+        """Corpus-wide idf of the query terms `inverted` knows, keyed by its term ids."""
+        weights = {}
+        for term in Counter(query_tokens):
+            term_id = inverted.vocab.get(term)
+            if term_id is not None:
+                weights[term_id] = self.idf[term]
+        return weights
+
+class ShardRouter:
+    """Picks the shards a query's filters can match."""
+
+    def __init__(self, shards: Dict[str, IndexShard]):
+        self.shards = [shards[key] for key in sorted(shards)]
+        self._by_company: Dict[str, List[IndexShard]] = {}
+        for shard in self.shards:
+            for company in shard.store.dictionaries["company"]:
+                self._by_company.setdefault(company, []).append(shard)
+
+    def route(self, filters: Optional[Dict[str, Any]]) -> List[IndexShard]:
+        filters = filters or {}
+        routing = {f: filters[f] for f in ROUTING_FIELDS if f in filters}
+        if not routing:
+            return list(self.shards)
+
+        # Fast path for the common company == X / company in [...] filters
+        company = routing.get("company")
+        if isinstance(company, dict) and set(company) == {"in"}:
+            company = company["in"]
+        if isinstance(company, str):
+            company = [company]
+        if isinstance(company, (list, tuple, set)):
+            picked = {id(s): s for c in company for s in self._by_company.get(c, [])}
+            pool = [s for s in self.shards if id(s) in picked]
+        else:
+            pool = self.shards
+
+        # Anything else (fy, ranges) is checked against each shard's own metadata index
+        return [s for s in pool if len(s.metadata_index.candidates(routing))]
+
+def scatter(fn: Callable[[IndexShard], T], shards: List[IndexShard]) -> List[T]:
+    """Runs `fn` on every shard, in parallel when there is more than one."""
+    if len(shards) <= 1:
+        return [fn(s) for s in shards]
+    return list(_search_pool.map(fn, shards))
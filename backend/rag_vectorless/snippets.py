@@ -0,0 +1,53 @@
+"""
+Slim search results: chunk id, score, metadata and a short highlighted
+snippet instead of the full 400-word chunk text. Full text is fetched on
+demand by chunk id (GET /rag/chunk/{chunk_id}).
+"""
+from typing import List, Set
+from .schemas import SearchResult, SlimSearchResult
+from .indexer import tokenize, analyze_query
+
+SNIPPET_WORDS = 32
+
+def _is_match(word: str, terms: Set[str]) -> bool:
+    return any(t in terms for t in tokenize(word))
+
+def make_snippet(text: str, query_text: str, width: int = SNIPPET_WORDS) -> str:
+    """
+    The `width`-word window of `text` holding the most query terms, with
+    matched words wrapped in ** and "..." where the chunk was cut.
+    """
+    words = text.split()
+    terms = set(analyze_query(query_text))
+    hits = [_is_match(w, terms) for w in words]
+
+    # Sliding window count of matched words; the first best window wins
+    count = best = sum(hits[:width])
+    best_start = 0
+    for start in range(1, max(1, len(words) - width + 1)):
+        count += hits[start + width - 1] - hits[start - 1]
+        if count > best:
+            best_start, best = start, count
+    if best:
+        # Start just before the first match; the window can only gain matches by moving right
+        first = hits.index(True, best_start)
+        best_start = max(best_start, min(first - width // 8, len(words) - width))
+
+    window = [
+        f"**{w}**" if hit else w
+        for w, hit in zip(words[best_start:best_start + width], hits[best_start:best_start + width])
+    ]
+    prefix = "... " if best_start > 0 else ""
+    suffix = " ..." if best_start + width < len(words) else ""
+    return prefix + " ".join(window) + suffix
+
+def slim_results(results: List[SearchResult], query_text: str, width: int = SNIPPET_WORDS) -> List[SlimSearchResult]:
+    return [
+        SlimSearchResult(
+            chunk_id=r.metadata.chunk_id,
+            score=r.score,
+            snippet=make_snippet(r.text, query_text, width),
+            metadata=r.metadata
+        )
+        for r in results
+    ]
@@ -0,0 +1,344 @@
+"""
+Versioned, memory-mapped on-disk format for the BM25 index.
+
+One file holds every column the search path needs:
+
+    [magic "RAGIDX\\0\\0"][u32 format version][u32 header length][JSON header]
+    [section][section]...                  (each section 64-byte aligned)
+
+The JSON header records where each section lives (offset, dtype, shape) plus
+small scalars (BM25 params, metadata dictionaries). Sections are plain
+little-endian arrays, so opening the file is just mmap + np.frombuffer: startup
+cost does not grow with the corpus, and every worker process maps the same
+pages out of the OS page cache instead of holding a private copy.
+
+Sections:
+    terms.blob / terms.offsets       sorted UTF-8 term dictionary
+    postings.indptr / .doc_ids / .tfs CSC postings (see InvertedIndex)
+    positions.blob / .offsets        delta + varint encoded token positions per posting
+    idf, doc_len                     precomputed BM25 statistics
+    meta.<field>.codes               dictionary-encoded ChunkMetadata column
+    meta.<field>.ids / .indptr       doc ids grouped by value (filter index)
+    chunk_ids, start_word, end_word  remaining ChunkMetadata columns
+    chunk_ids.order                  doc ids in chunk id order (lookup by chunk id)
+    features.<name>                  np.packbits bitset per boost feature (see ranking)
+    text.blob / text.offsets         chunk text, decoded only for returned hits
+"""
+import os
+import json
+import mmap
+import struct
+from bisect import bisect_left
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+from .schemas import ChunkRecord, ChunkMetadata
+from .inverted import InvertedIndex
+from .positions import PositionIndex
+from .filters import FILTER_FIELDS, FieldIndex, MetadataIndex
+from .ranking import BoostRules, boost_rules
+
+FORMAT_VERSION = 4
+MAGIC = b"RAGIDX\x00\x00"
+_PREFIX = struct.Struct("<8sII")
+ALIGN = 64
+
+# ---------------------------------------------------------------------------
+# Raw section file
+# ---------------------------------------------------------------------------
+
+def write_sections(path: str, sections: Dict[str, np.ndarray], meta: Dict[str, Any]):
+    """Writes named arrays plus a JSON header; the file appears atomically at `path`."""
+    layout = {}
+    offset = 0
+    for name, arr in sections.items():
+        arr = np.ascontiguousarray(arr)
+        sections[name] = arr
+        layout[name] = {"offset": offset, "dtype": arr.dtype.str, "shape": list(arr.shape)}
+        offset += _aligned(arr.nbytes)
+
+    header = json.dumps({"meta": meta, "sections": layout}).encode("utf-8")
+    data_start = _aligned(_PREFIX.size + len(header))
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_PREFIX.pack(MAGIC, FORMAT_VERSION, len(header)))
+        f.write(header)
+        f.write(b"\0" * (data_start - _PREFIX.size - len(header)))
+        for name, arr in sections.items():
+            f.write(arr.tobytes())
+            f.write(b"\0" * (_aligned(arr.nbytes) - arr.nbytes))
+    os.replace(tmp_path, path)
+
+def read_format_version(path: str) -> Optional[int]:
+    """Format version of an index file, or None if it is missing or not an index."""
+    try:
+        with open(path, "rb") as f:
+            magic, version, _ = _PREFIX.unpack(f.read(_PREFIX.size))
+    except (OSError, struct.error):
+        return None
+    return version if magic == MAGIC else None
+
+class MappedFile:
+    """Read-only mmap of a section file; arrays are zero-copy views into the mapping."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, header_len = _PREFIX.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} index file")
+        header = json.loads(self._mm[_PREFIX.size:_PREFIX.size + header_len])
+        data_start = _aligned(_PREFIX.size + header_len)
+
+        self.meta: Dict[str, Any] = header["meta"]
+        self.arrays: Dict[str, np.ndarray] = {}
+        for name, info in header["sections"].items():
+            dtype = np.dtype(info["dtype"])
+            count = int(np.prod(info["shape"]))
+            arr = np.frombuffer(self._mm, dtype=dtype, count=count, offset=data_start + info["offset"])
+            self.arrays[name] = arr.reshape(info["shape"])
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.arrays[name]
+
+def _aligned(n: int) -> int:
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+# ---------------------------------------------------------------------------
+# Index-level views
+# ---------------------------------------------------------------------------
+
+class MappedTerms:
+    """Sorted term dictionary looked up by binary search over the mapped blob."""
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        self._blob = blob
+        self._offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i: int) -> bytes:
+        return self._blob[self._offsets[i]:self._offsets[i + 1]].tobytes()
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i].decode("utf-8")
+
+    def get(self, term: str) -> Optional[int]:
+        # UTF-8 byte order matches str code point order, so bytes compare is enough
+        key = term.encode("utf-8")
+        i = bisect_left(self, key)
+        if i < len(self) and self[i] == key:
+            return i
+        return None
+
+class ChunkStore:
+    """Column-backed access to chunk metadata and text; nothing is decoded up front."""
+
+    def __init__(self, mapped: MappedFile):
+        self._mapped = mapped
+        self.dictionaries: Dict[str, List[Any]] = mapped.meta["dictionaries"]
+        self.codes = {field: mapped[f"meta.{field}.codes"] for field in FILTER_FIELDS}
+        self.chunk_ids = mapped["chunk_ids"]
+        self._chunk_order = mapped["chunk_ids.order"]
+        self.start_word = mapped["start_word"]
+        self.end_word = mapped["end_word"]
+        self._text_blob = mapped["text.blob"]
+        self._text_offsets = mapped["text.offsets"]
+        self.features = {name: mapped[f"features.{name}"] for name in mapped.meta["features"]}
+
+    def __len__(self) -> int:
+        return len(self.chunk_ids)
+
+    def value(self, field: str, doc_id: int) -> Any:
+        return self.dictionaries[field][self.codes[field][doc_id]]
+
+    def text(self, doc_id: int) -> str:
+        lo, hi = self._text_offsets[doc_id], self._text_offsets[doc_id + 1]
+        return self._text_blob[lo:hi].tobytes().decode("utf-8")
+
+    def metadata(self, doc_id: int) -> ChunkMetadata:
+        return ChunkMetadata(
+            chunk_id=self.chunk_ids[doc_id].decode("ascii"),
+            start_word_idx=int(self.start_word[doc_id]),
+            end_word_idx=int(self.end_word[doc_id]),
+            **{field: self.value(field, doc_id) for field in FILTER_FIELDS}
+        )
+
+    def record(self, doc_id: int) -> ChunkRecord:
+        return ChunkRecord(text=self.text(doc_id), metadata=self.metadata(doc_id))
+
+    def find(self, chunk_id: str) -> Optional[int]:
+        """Doc id of `chunk_id`, by binary search over the sorted id order."""
+        key = chunk_id.encode("ascii", "replace")
+        lo, hi = 0, len(self._chunk_order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.chunk_ids[self._chunk_order[mid]] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self._chunk_order) and self.chunk_ids[self._chunk_order[lo]] == key:
+            return int(self._chunk_order[lo])
+        return None
+
+class DocColumns:
+    """
+    Per-chunk columns in doc-id order: the in-memory form of the metadata and
+    text sections. Incremental updates slice these out of the mapped file and
+    append fresh chunks without decoding the rest of the corpus.
+    """
+
+    def __init__(self, dictionaries: Dict[str, List[Any]], codes: Dict[str, np.ndarray], chunk_ids: np.ndarray,
+                 start_word: np.ndarray, end_word: np.ndarray, text_blob: np.ndarray, text_offsets: np.ndarray,
+                 features: Dict[str, np.ndarray]):
+        self.dictionaries = dictionaries
+        self.codes = codes
+        self.chunk_ids = chunk_ids
+        self.start_word = start_word
+        self.end_word = end_word
+        self.text_blob = text_blob
+        self.text_offsets = text_offsets
+        # Boost feature name -> bool per chunk
+        self.features = features
+
+    def __len__(self) -> int:
+        return len(self.chunk_ids)
+
+    @classmethod
+    def from_chunks(cls, chunks: List[ChunkRecord], rules: BoostRules = None) -> "DocColumns":
+        dictionaries, codes = {}, {}
+        for field in FILTER_FIELDS:
+            dictionaries[field], codes[field] = _dictionary_encode([getattr(c.metadata, field) for c in chunks])
+        texts = [c.text.encode("utf-8") for c in chunks]
+        return cls(
+            dictionaries=dictionaries,
+            codes=codes,
+            chunk_ids=np.array([c.metadata.chunk_id.encode("ascii") for c in chunks], dtype="S"),
+            start_word=np.array([c.metadata.start_word_idx for c in chunks], dtype=np.int32),
+            end_word=np.array([c.metadata.end_word_idx for c in chunks], dtype=np.int32),
+            text_blob=np.frombuffer(b"".join(texts), dtype=np.uint8),
+            text_offsets=_offsets([len(t) for t in texts]),
+            features=(rules or boost_rules).compute_features([c.text for c in chunks], [c.metadata.section for c in chunks]),
+        )
+
+    @classmethod
+    def from_store(cls, store: "ChunkStore", keep: np.ndarray) -> "DocColumns":
+        """Columns of the docs in `store` where the boolean mask `keep` is set."""
+        lengths = np.diff(store._text_offsets)
+        return cls(
+            dictionaries=dict(store.dictionaries),
+            codes={field: store.codes[field][keep] for field in FILTER_FIELDS},
+            chunk_ids=store.chunk_ids[keep],
+            start_word=store.start_word[keep],
+            end_word=store.end_word[keep],
+            text_blob=store._text_blob[np.repeat(keep, lengths)],
+            text_offsets=_offsets(lengths[keep]),
+            features={name: np.unpackbits(bits, count=len(store)).astype(bool)[keep] for name, bits in store.features.items()},
+        )
+
+    def concat(self, other: "DocColumns") -> "DocColumns":
+        dictionaries, codes = {}, {}
+        for field in FILTER_FIELDS:
+            values = list(self.dictionaries[field])
+            lookup = {v: i for i, v in enumerate(values)}
+            remap = np.array([lookup.setdefault(v, len(lookup)) for v in other.dictionaries[field]], dtype=np.int32)
+            values.extend(list(lookup)[len(values):])
+            merged = np.concatenate([self.codes[field], remap[other.codes[field]] if len(remap) else other.codes[field]])
+            dictionaries[field], codes[field] = _compact(values, merged.astype(np.int32))
+
+        width = max(self.chunk_ids.dtype.itemsize, other.chunk_ids.dtype.itemsize)
+        return DocColumns(
+            dictionaries=dictionaries,
+            codes=codes,
+            chunk_ids=np.concatenate([self.chunk_ids.astype(f"S{width}"), other.chunk_ids.astype(f"S{width}")]),
+            start_word=np.concatenate([self.start_word, other.start_word]),
+            end_word=np.concatenate([self.end_word, other.end_word]),
+            text_blob=np.concatenate([self.text_blob, other.text_blob]),
+            text_offsets=np.concatenate([self.text_offsets[:-1], other.text_offsets + self.text_offsets[-1]]),
+            features={name: np.concatenate([mask, other.features[name]]) for name, mask in self.features.items()},
+        )
+
+def write_index(path: str, docs: DocColumns, inverted: InvertedIndex, rules: BoostRules = None):
+    sections: Dict[str, np.ndarray] = {}
+
+    terms = [t.encode("utf-8") for t in inverted.vocab]
+    sections["terms.blob"] = np.frombuffer(b"".join(terms), dtype=np.uint8)
+    sections["terms.offsets"] = _offsets([len(t) for t in terms])
+    sections["postings.indptr"] = inverted.indptr.astype(np.int64)
+    sections["postings.doc_ids"] = inverted.doc_ids.astype(np.int32)
+    sections["postings.tfs"] = inverted.tfs.astype(np.int32)
+    sections["positions.blob"] = inverted.positions.blob.astype(np.uint8)
+    sections["positions.offsets"] = inverted.positions.offsets.astype(np.int64)
+    sections["idf"] = inverted.idf.astype(np.float64)
+    sections["doc_len"] = inverted.doc_len.astype(np.int32)
+
+    for field in FILTER_FIELDS:
+        codes = docs.codes[field]
+        sections[f"meta.{field}.codes"] = codes
+        sections[f"meta.{field}.ids"] = np.argsort(codes, kind="stable").astype(np.int32)
+        sections[f"meta.{field}.indptr"] = _offsets(np.bincount(codes, minlength=len(docs.dictionaries[field])))
+
+    sections["chunk_ids"] = docs.chunk_ids
+    sections["chunk_ids.order"] = np.argsort(docs.chunk_ids, kind="stable").astype(np.int32)
+    sections["start_word"] = docs.start_word.astype(np.int32)
+    sections["end_word"] = docs.end_word.astype(np.int32)
+    sections["text.blob"] = docs.text_blob
+    sections["text.offsets"] = docs.text_offsets.astype(np.int64)
+    for name, mask in docs.features.items():
+        sections[f"features.{name}"] = np.packbits(mask)
+
+    meta = {
+        "num_docs": len(docs),
+        "bm25": {"k1": inverted.k1, "b": inverted.b, "epsilon": inverted.epsilon},
+        "dictionaries": docs.dictionaries,
+        "features": (rules or boost_rules).feature_spec(),
+    }
+    write_sections(path, sections, meta)
+
+def open_index(path: str) -> Tuple[InvertedIndex, MetadataIndex, ChunkStore]:
+    mapped = MappedFile(path)
+
+    inverted = InvertedIndex.from_arrays(
+        vocab=MappedTerms(mapped["terms.blob"], mapped["terms.offsets"]),
+        indptr=mapped["postings.indptr"],
+        doc_ids=mapped["postings.doc_ids"],
+        tfs=mapped["postings.tfs"],
+        doc_len=mapped["doc_len"],
+        positions=PositionIndex(mapped["positions.blob"], mapped["positions.offsets"]),
+        idf=mapped["idf"],
+        **mapped.meta["bm25"]
+    )
+
+    metadata_index = MetadataIndex()
+    metadata_index.num_docs = mapped.meta["num_docs"]
+    for field in FILTER_FIELDS:
+        values = mapped.meta["dictionaries"][field]
+        ids, indptr = mapped[f"meta.{field}.ids"], mapped[f"meta.{field}.indptr"]
+        metadata_index.fields[field] = FieldIndex({
+            value: ids[indptr[code]:indptr[code + 1]] for code, value in enumerate(values)
+        })
+
+    return inverted, metadata_index, ChunkStore(mapped)
+
+def _dictionary_encode(values: List[Any]) -> Tuple[List[Any], np.ndarray]:
+    lookup: Dict[Any, int] = {}
+    codes = np.fromiter((lookup.setdefault(v, len(lookup)) for v in values), dtype=np.int32, count=len(values))
+    return list(lookup), codes
+
+def _compact(values: List[Any], codes: np.ndarray) -> Tuple[List[Any], np.ndarray]:
+    """Drops dictionary values no doc refers to any more."""
+    used = np.unique(codes)
+    if len(used) == len(values):
+        return values, codes
+    remap = np.zeros(len(values), dtype=np.int32)
+    remap[used] = np.arange(len(used), dtype=np.int32)
+    return [values[i] for i in used], remap[codes]
+
+def _offsets(lengths) -> np.ndarray:
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return offsets
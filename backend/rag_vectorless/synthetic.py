@@ -0,0 +1,131 @@
+"""
+Synthetic transcript corpora for scaling tests.
+
+    python -m rag_vectorless.synthetic --out ./synthetic --files 500 --companies 50
+
+Words are drawn from the unigram distribution of the real transcripts, so
+term frequencies, stopword share and word lengths look like the bundled
+files. A small share of words is replaced by made-up terms drawn from a
+Zipf distribution, so the vocabulary keeps growing with the corpus the way
+product names, people and numbers do in real filings. Every file gets a
+header, section marker lines (see chunker.SECTION_MARKERS) and short lines
+of text, and a manifest.json maps files to synthetic tickers, so sharding
+and section detection see the same shapes as in production.
+"""
+import os
+import re
+import json
+import argparse
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+from .loader import MANIFEST_FILE, list_transcripts
+from .chunker import match_section_marker
+
+# Share of words replaced by made-up terms, and the Zipf exponent of their ids
+NOVEL_RATE = 0.02
+NOVEL_ZIPF = 1.3
+WORDS_PER_FILE = 10000
+LINE_WORDS = (8, 60)
+
+_WORD = re.compile(r'\S+')
+
+def fit_vocabulary(transcripts_dir: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Distinct words of the real transcripts and their relative frequencies (section headers excluded)."""
+    counts: Dict[str, int] = {}
+    for source in list_transcripts(transcripts_dir):
+        with open(source["file_path"], "r", encoding="utf-8-sig") as f:
+            for line in f:
+                if match_section_marker(line):
+                    continue
+                for word in _WORD.findall(line):
+                    counts[word] = counts.get(word, 0) + 1
+    if not counts:
+        raise ValueError(f"No transcript text found in {transcripts_dir}")
+    words = np.array(list(counts.keys()), dtype=object)
+    freqs = np.array(list(counts.values()), dtype=np.float64)
+    return words, freqs / freqs.sum()
+
+def _novel_word(term_id: int) -> str:
+    digits = "abcdefghijklmnopqrstuvwxyz"
+    name = ""
+    while True:
+        term_id, rem = divmod(term_id, 26)
+        name += digits[rem]
+        if not term_id:
+            return "zq" + name
+
+def make_transcript(rng: np.random.Generator, words: np.ndarray, probs: np.ndarray,
+                    company: str, title: str, num_words: int = WORDS_PER_FILE) -> str:
+    """One transcript: header, prepared remarks, Q&A, with section markers as lines of their own."""
+    body = words[rng.choice(len(words), size=num_words, p=probs)]
+    novel = np.flatnonzero(rng.random(num_words) < NOVEL_RATE)
+    body[novel] = [_novel_word(int(t)) for t in rng.zipf(NOVEL_ZIPF, size=len(novel))]
+
+    lines = [title, f"{company} Earnings Call", "Prepared Remarks"]
+    qa_at = int(num_words * rng.uniform(0.4, 0.6))
+    start = 0
+    while start < num_words:
+        end = min(num_words, start + int(rng.integers(*LINE_WORDS)))
+        if start < qa_at <= end:
+            lines.append("Question-and-Answer Session")
+        elif rng.random() < 0.02:
+            lines.append("Operator")
+        lines.append(" ".join(body[start:end]))
+        start = end
+    return "\n".join(lines) + "\n"
+
+def generate_corpus(out_dir: str, files: int, companies: int = 10, words_per_file: int = WORDS_PER_FILE,
+                    source_dir: str = "./transcripts", seed: int = 0,
+                    vocabulary: Optional[Tuple[np.ndarray, np.ndarray]] = None) -> Dict[str, Any]:
+    """
+    Writes `files` transcripts spread over `companies` synthetic tickers into
+    `out_dir`, plus their manifest.json. Same seed, same corpus.
+    """
+    words, probs = vocabulary or fit_vocabulary(source_dir)
+    rng = np.random.default_rng(seed)
+    os.makedirs(out_dir, exist_ok=True)
+
+    manifest = {}
+    for i in range(files):
+        company = f"SYN{i % companies:04d}"
+        fy, quarter = 2020 + (i // companies) // 4, (i // companies) % 4 + 1
+        file_name = f"{company.lower()}_{i:06d}.txt"
+        title = f"{company} Q{quarter} {fy} Earnings Call"
+        text = make_transcript(rng, words, probs, company, title, words_per_file)
+        with open(os.path.join(out_dir, file_name), "w", encoding="utf-8") as f:
+            f.write(text)
+        manifest[file_name] = {
+            "company": company,
+            "fy": str(fy),
+            "quarter": f"Q{quarter}",
+            "date": f"{fy}-{quarter * 3:02d}-15",
+            "title": title,
+        }
+
+    with open(os.path.join(out_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    return {"files": files, "companies": min(files, companies), "words": files * words_per_file}
+
+def sample_queries(rng: np.random.Generator, words: np.ndarray, probs: np.ndarray, count: int,
+                   terms: Tuple[int, int] = (2, 5)) -> List[str]:
+    """Queries of a few words drawn from the same distribution as the corpus text."""
+    return [
+        " ".join(words[rng.choice(len(words), size=int(rng.integers(terms[0], terms[1] + 1)), p=probs)])
+        for _ in range(count)
+    ]
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic transcript corpus")
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--files", type=int, default=100)
+    parser.add_argument("--companies", type=int, default=10)
+    parser.add_argument("--words-per-file", type=int, default=WORDS_PER_FILE)
+    parser.add_argument("--source", default="./transcripts", help="real transcripts to fit the vocabulary on")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    stats = generate_corpus(args.out, args.files, args.companies, args.words_per_file, args.source, args.seed)
+    print(f"Wrote {stats['files']} transcripts ({stats['words']} words, {stats['companies']} companies) to {args.out}")
+
+if __name__ == "__main__":
+    main()
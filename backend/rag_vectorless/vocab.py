@@ -0,0 +1,128 @@
+"""
+Term interning and packed per-chunk term frequencies.
+
+A Vocabulary maps every distinct term to a dense integer id, and a TermMatrix
+keeps the (term id, tf) pairs of every chunk in flat arrays (CSR style):
+  indptr    - entries of chunk d live in [indptr[d], indptr[d + 1])
+  term_ids  - term id of every entry
+  tfs       - term frequency of every entry
+  positions - token positions of every entry, flat; entry e owns the next
+              tfs[e] of them, ascending
+Build workers emit these instead of a dict per chunk; the inverted index is
+the same matrix transposed (see InvertedIndex.from_matrix).
+"""
+from array import array
+from typing import List, Dict, Iterable, Optional, Tuple
+import numpy as np
+
+class Vocabulary:
+    """Term <-> id map; ids are assigned in order of first appearance."""
+
+    def __init__(self, terms: Iterable[str] = ()):
+        self.terms: List[str] = list(terms)
+        self._ids: Dict[str, int] = {t: i for i, t in enumerate(self.terms)}
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def __iter__(self):
+        return iter(self.terms)
+
+    def __getitem__(self, term_id: int) -> str:
+        return self.terms[term_id]
+
+    def get(self, term: str) -> Optional[int]:
+        return self._ids.get(term)
+
+    def add(self, term: str) -> int:
+        term_id = self._ids.get(term)
+        if term_id is None:
+            term_id = len(self.terms)
+            self._ids[term] = term_id
+            self.terms.append(term)
+        return term_id
+
+    def encode(self, tokens: Iterable[str]) -> np.ndarray:
+        """Interns `tokens` and returns their ids, in token order."""
+        return np.fromiter((self.add(t) for t in tokens), dtype=np.int32)
+
+    def sorted(self) -> Tuple["Vocabulary", np.ndarray]:
+        """Copy with terms in sorted order, plus the old id -> new id map."""
+        order = sorted(range(len(self.terms)), key=self.terms.__getitem__)
+        remap = np.empty(len(order), dtype=np.int32)
+        remap[order] = np.arange(len(order), dtype=np.int32)
+        return Vocabulary(self.terms[i] for i in order), remap
+
+class TermMatrix:
+    """Chunk x term frequencies in CSR form."""
+
+    def __init__(self, indptr: np.ndarray, term_ids: np.ndarray, tfs: np.ndarray, positions: np.ndarray):
+        self.indptr = indptr
+        self.term_ids = term_ids
+        self.tfs = tfs
+        self.positions = positions
+
+    @property
+    def num_docs(self) -> int:
+        return len(self.indptr) - 1
+
+    @property
+    def doc_len(self) -> np.ndarray:
+        # Every token is counted once, so a chunk's length is the sum of its tfs
+        totals = np.zeros(len(self.tfs) + 1, dtype=np.int64)
+        np.cumsum(self.tfs, out=totals[1:])
+        return (totals[self.indptr[1:]] - totals[self.indptr[:-1]]).astype(np.int32)
+
+    def doc_of_entries(self) -> np.ndarray:
+        return np.repeat(np.arange(self.num_docs, dtype=np.int32), np.diff(self.indptr))
+
+    def remap(self, mapping: np.ndarray) -> "TermMatrix":
+        """Same matrix with term ids translated through `mapping` (old id -> new id)."""
+        return TermMatrix(self.indptr, mapping[self.term_ids].astype(np.int32), self.tfs, self.positions)
+
+    def select(self, keep: np.ndarray) -> "TermMatrix":
+        """Rows (chunks) where the boolean mask `keep` is set."""
+        entries = np.repeat(keep, np.diff(self.indptr))
+        indptr = np.zeros(int(keep.sum()) + 1, dtype=np.int64)
+        np.cumsum(np.diff(self.indptr)[keep], out=indptr[1:])
+        return TermMatrix(indptr, self.term_ids[entries], self.tfs[entries], self.positions[np.repeat(entries, self.tfs)])
+
+    @staticmethod
+    def concat(matrices: List["TermMatrix"]) -> "TermMatrix":
+        """Stacks matrices that already share one vocabulary."""
+        indptr = [np.zeros(1, dtype=np.int64)]
+        offset = 0
+        for m in matrices:
+            indptr.append(m.indptr[1:] + offset)
+            offset += int(m.indptr[-1])
+        return TermMatrix(
+            np.concatenate(indptr),
+            np.concatenate([m.term_ids for m in matrices] or [np.zeros(0, dtype=np.int32)]),
+            np.concatenate([m.tfs for m in matrices] or [np.zeros(0, dtype=np.int32)]),
+            np.concatenate([m.positions for m in matrices] or [np.zeros(0, dtype=np.int32)]),
+        )
+
+class TermMatrixBuilder:
+    """Appends one chunk at a time into packed arrays."""
+
+    def __init__(self):
+        self._indptr = array("q", [0])
+        self._term_ids = array("i")
+        self._tfs = array("i")
+        self._positions = array("i")
+
+    def append(self, token_ids: np.ndarray):
+        term_ids, inverse, tfs = np.unique(token_ids, return_inverse=True, return_counts=True)
+        self._term_ids.extend(term_ids.astype(np.int32).tolist())
+        self._tfs.extend(tfs.tolist())
+        # Stable sort by term groups each term's positions, already ascending
+        self._positions.extend(np.argsort(inverse.reshape(-1), kind="stable").tolist())
+        self._indptr.append(len(self._term_ids))
+
+    def build(self) -> TermMatrix:
+        return TermMatrix(
+            np.array(self._indptr, dtype=np.int64),
+            np.array(self._term_ids, dtype=np.int32),
+            np.array(self._tfs, dtype=np.int32),
+            np.array(self._positions, dtype=np.int32),
+        )
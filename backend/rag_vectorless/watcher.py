@@ -0,0 +1,68 @@
+import os
+import time
+import threading
+from typing import Dict, Tuple, Optional
+from .loader import MANIFEST_FILE
+from .jobs import rebuild_manager
+
+# Seconds between directory scans, and how long a change must stay quiet
+# before a rebuild is queued (so a batch of copied files triggers one job)
+POLL_INTERVAL = 5.0
+SETTLE_TIME = 3.0
+
+def _snapshot(transcripts_dir: str) -> Dict[str, Tuple[float, int]]:
+    """Cheap (mtime, size) view of the transcripts directory."""
+    if not os.path.exists(transcripts_dir):
+        return {}
+    snapshot = {}
+    for f in os.listdir(transcripts_dir):
+        if f.endswith(".txt") or f == MANIFEST_FILE:
+            try:
+                stat = os.stat(os.path.join(transcripts_dir, f))
+            except OSError:
+                continue
+            snapshot[f] = (stat.st_mtime, stat.st_size)
+    return snapshot
+
+class TranscriptWatcher:
+    """
+    Polls the transcripts directory and queues an incremental rebuild once a
+    change has settled. Polling keeps this dependency-free and works the same
+    on every platform; the rebuild itself compares content hashes, so a
+    touched-but-unchanged file costs one hash pass and no reindexing.
+    """
+
+    def __init__(self, transcripts_dir: str = "./transcripts", interval: float = POLL_INTERVAL,
+                 settle_time: float = SETTLE_TIME):
+        self.transcripts_dir = transcripts_dir
+        self.interval = interval
+        self.settle_time = settle_time
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="rag-transcript-watcher", daemon=True)
+        self._thread.start()
+        print(f"Watching {self.transcripts_dir} for transcript changes.")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.interval)
+
+    def _loop(self):
+        last = _snapshot(self.transcripts_dir)
+        pending_since = None
+        while not self._stop.wait(self.interval):
+            current = _snapshot(self.transcripts_dir)
+            if current != last:
+                last = current
+                pending_since = time.monotonic()
+                continue
+            if pending_since is not None and time.monotonic() - pending_since >= self.settle_time:
+                pending_since = None
+                job = rebuild_manager.submit(self.transcripts_dir)
+                print(f"Transcripts changed, queued index update {job.job_id}.")
@@ -0,0 +1,178 @@
+"""
+Response cache for LLM completions.
+
+Two tiers: an in-process LRU in front of an SQLite table, so repeated
+prompts skip Groq within one worker and survive restarts / are shared
+between workers. Keys hash the model, the sampling parameters and the
+canonicalized messages (line endings, trailing spaces and runs of blank
+lines do not matter), so the same question about the same portfolio maps
+to one entry. Every entry gets the TTL of the endpoint that produced it:
+explanations and rebalancing ideas only depend on the prompt and keep for
+an hour, chat replies for ten minutes.
+
+    LLM_CACHE_SIZE        in-process entries (0 turns the memory tier off)
+    LLM_CACHE_DB          SQLite file, opened on first use ("" keeps the cache in memory only)
+    LLM_CACHE_TTL_<NAME>  TTL in seconds for one endpoint, e.g. LLM_CACHE_TTL_CHAT
+"""
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
+
+DEFAULT_MAX_ENTRIES = 512
+# Next to the app, not in whatever directory the process was started from
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "llm_cache.db")
+DEFAULT_TTLS = {"explain": 3600.0, "rebalance": 3600.0, "chat": 600.0}
+FALLBACK_TTL = 600.0
+# Expired rows are purged from SQLite once every this many writes
+PURGE_EVERY = 256
+
+_TRAILING_SPACE = re.compile(r'[ \t]+\n')
+_BLANK_LINES = re.compile(r'\n{3,}')
+
+def canonical_text(text: str) -> str:
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    text = _TRAILING_SPACE.sub("\n", text)
+    return _BLANK_LINES.sub("\n\n", text).strip()
+
+def cache_key(model: str, messages: List[Dict[str, str]], params: Dict[str, Any]) -> str:
+    payload = {
+        "model": model,
+        "params": params,
+        "messages": [[m["role"], canonical_text(m["content"])] for m in messages],
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+class LLMCache:
+    """Thread-safe two-tier cache of completion texts with per-endpoint TTLs."""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, db_path: Optional[str] = DEFAULT_DB_PATH,
+                 ttls: Optional[Dict[str, float]] = None):
+        self.max_entries = max_entries
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.db_path = db_path or None
+        self._conn: Optional[sqlite3.Connection] = None
+        self._writes = 0
+        self._counts: Dict[str, Dict[str, int]] = {}
+
+    def _db(self) -> Optional[sqlite3.Connection]:
+        """SQLite tier, opened on first use so importing the app creates no files. Call under the lock."""
+        if self._conn is None and self.db_path:
+            try:
+                conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=5)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS llm_cache ("
+                    "key TEXT PRIMARY KEY, endpoint TEXT, response TEXT, created REAL, expires REAL)"
+                )
+                conn.commit()
+                self._conn = conn
+            except sqlite3.Error as e:
+                print(f"[WARNING] LLM cache database unavailable, caching in memory only: {e}")
+                self.db_path = None
+        return self._conn
+
+    def ttl(self, endpoint: str) -> float:
+        return self.ttls.get(endpoint, FALLBACK_TTL)
+
+    def get(self, endpoint: str, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            counts = self._counts.setdefault(endpoint, {"memory_hits": 0, "disk_hits": 0, "misses": 0})
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    counts["memory_hits"] += 1
+                    return entry[1]
+                del self._entries[key]
+
+            row = None
+            conn = self._db()
+            if conn is not None:
+                try:
+                    row = conn.execute(
+                        "SELECT response, expires FROM llm_cache WHERE key = ? AND expires > ?", (key, now)
+                    ).fetchone()
+                except sqlite3.Error as e:
+                    print(f"[WARNING] LLM cache read failed: {e}")
+            if row is None:
+                counts["misses"] += 1
+                return None
+            counts["disk_hits"] += 1
+            self._remember(key, row[1], row[0])
+            return row[0]
+
+    def put(self, endpoint: str, key: str, response: str):
+        now = time.time()
+        expires = now + self.ttl(endpoint)
+        with self._lock:
+            self._remember(key, expires, response)
+            conn = self._db()
+            if conn is None:
+                return
+            try:
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, endpoint, response, created, expires) VALUES (?, ?, ?, ?, ?)",
+                    (key, endpoint, response, now, expires)
+                )
+                self._writes += 1
+                if self._writes % PURGE_EVERY == 0:
+                    conn.execute("DELETE FROM llm_cache WHERE expires <= ?", (now,))
+                conn.commit()
+            except sqlite3.Error as e:
+                print(f"[WARNING] LLM cache write failed: {e}")
+
+    def _remember(self, key: str, expires: float, response: str):
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (expires, response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            conn = self._db()
+            if conn is not None:
+                conn.execute("DELETE FROM llm_cache")
+                conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            endpoints = {}
+            for endpoint, counts in self._counts.items():
+                lookups = counts["memory_hits"] + counts["disk_hits"] + counts["misses"]
+                hits = counts["memory_hits"] + counts["disk_hits"]
+                endpoints[endpoint] = dict(counts, ttl=self.ttl(endpoint),
+                                           hit_rate=round(hits / lookups, 4) if lookups else 0.0)
+            lookups = sum(c["memory_hits"] + c["disk_hits"] + c["misses"] for c in self._counts.values())
+            hits = sum(c["memory_hits"] + c["disk_hits"] for c in self._counts.values())
+            return {
+                "memory_size": len(self._entries),
+                "max_entries": self.max_entries,
+                "disk": self.db_path,
+                "hits": hits,
+                "misses": lookups - hits,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "endpoints": endpoints,
+            }
+
+def _env_ttls() -> Dict[str, float]:
+    prefix = "LLM_CACHE_TTL_"
+    return {name[len(prefix):].lower(): float(value) for name, value in os.environ.items() if name.startswith(prefix)}
+
+def create_llm_cache() -> LLMCache:
+    return LLMCache(
+        max_entries=int(os.environ.get("LLM_CACHE_SIZE", DEFAULT_MAX_ENTRIES)),
+        db_path=os.environ.get("LLM_CACHE_DB", DEFAULT_DB_PATH),
+        ttls=_env_ttls(),
+    )
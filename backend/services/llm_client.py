@@ -0,0 +1,263 @@
+import os
+import time
+import asyncio
+import inspect
+from typing import List, Dict, Any, Optional, AsyncIterator, Callable, Tuple
+from groq import AsyncGroq
+from .llm_cache import LLMCache, cache_key, create_llm_cache
+from .llm_scheduler import (
+    LLMScheduler, LLMQuotaError, LLM_RPM, LLM_TPM, LLM_MAX_RETRIES, prompt_tokens, backoff_seconds
+)
+from .single_flight import SingleFlight
+
+# One model for every endpoint for now
+LLM_MODEL = "llama-3.3-70b-versatile"
+
+# Whole-call deadline (queueing and 429 retries included) and the cap on calls in flight per worker
+LLM_TIMEOUT_SECONDS = float(os.environ.get("LLM_TIMEOUT_SECONDS", 60))
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", 32))
+
+class LLMTimeoutError(Exception):
+    """The completion did not arrive within the call's timeout."""
+
+def is_rate_limited(error: Exception) -> bool:
+    return getattr(error, "status_code", None) == 429
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Retry-After of a 429 response, if Groq sent one in seconds."""
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+def usage_tokens(response: Any) -> Optional[int]:
+    """total_tokens Groq reports for a completion or a stream chunk (streams carry it in x_groq on the last chunk)."""
+    for usage in (getattr(response, "usage", None), getattr(getattr(response, "x_groq", None), "usage", None)):
+        total = getattr(usage, "total_tokens", None)
+        if isinstance(total, int):
+            return total
+    return None
+
+async def close_stream(chunks: Any):
+    """Closes an upstream completion stream so Groq stops generating (and billing) tokens."""
+    close = getattr(chunks, "aclose", None) or getattr(chunks, "close", None)
+    if close is None:
+        return
+    try:
+        result = close()
+        if inspect.isawaitable(result):
+            await result
+    except Exception as e:
+        print(f"[WARNING] Failed to close LLM stream: {e}")
+
+class LLMClient:
+    """
+    Async wrapper around the Groq chat completions API.
+    Calls await the HTTP round trip instead of blocking the event loop, so one
+    worker keeps many completions in flight. Every call is admitted by the
+    scheduler (concurrency, RPM / TPM budgets, priority; see
+    services/llm_scheduler.py), gets a deadline, and is retried with backoff
+    when Groq answers 429. Calls that name an endpoint go through the
+    response cache first (see services/llm_cache.py), and identical
+    completions requested while one is already in flight share its result.
+    """
+
+    def __init__(self, client: Any, max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 timeout: float = LLM_TIMEOUT_SECONDS, cache: Optional[LLMCache] = None,
+                 scheduler: Optional[LLMScheduler] = None, max_retries: int = LLM_MAX_RETRIES):
+        self.client = client
+        self.cache = cache
+        self.flights = SingleFlight()
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        # Without explicit budgets only the concurrency limit and priorities apply
+        self.scheduler = scheduler or LLMScheduler(max_concurrency)
+        self.max_retries = max_retries
+        self.in_flight = 0
+        self.waiting = 0
+        self.completed = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.retries = 0
+
+    async def complete(self, messages: List[Dict[str, str]], model: str = LLM_MODEL,
+                       temperature: float = 0.3, max_tokens: int = 1000,
+                       response_format: Optional[Dict[str, str]] = None,
+                       timeout: Optional[float] = None, endpoint: Optional[str] = None,
+                       cacheable: Optional[Callable[[str], bool]] = None,
+                       priority: str = "chat") -> str:
+        """
+        Content of one chat completion; raises LLMTimeoutError past the deadline
+        and LLMQuotaError if the prompt alone does not fit the token budget.
+        With an endpoint name the answer is served from / stored in the cache;
+        `cacheable` can veto storing an answer the caller cannot use.
+        """
+        timeout = timeout or self.timeout
+        params: Dict[str, Any] = {"model": model, "messages": messages, "temperature": temperature, "max_tokens": max_tokens}
+        if response_format:
+            params["response_format"] = response_format
+
+        key = self._key(params)
+        if endpoint and self.cache:
+            cached = await asyncio.to_thread(self.cache.get, endpoint, key)
+            if cached is not None:
+                return cached
+        return await self.flights.do(key, lambda: self._complete(params, timeout, priority, key, endpoint, cacheable))
+
+    async def _complete(self, params: Dict[str, Any], timeout: float, priority: str, key: str,
+                        endpoint: Optional[str], cacheable: Optional[Callable[[str], bool]]) -> str:
+        deadline = time.monotonic() + timeout
+        response, reserved = await self._send(params, priority, deadline, timeout)
+        try:
+            content = response.choices[0].message.content
+            self.completed += 1
+            used = usage_tokens(response)
+            if used is not None:
+                self.scheduler.settle(reserved, used)
+        finally:
+            self._release()
+
+        if endpoint and self.cache and content and (cacheable is None or cacheable(content)):
+            await asyncio.to_thread(self.cache.put, endpoint, key, content)
+        return content
+
+    async def stream(self, messages: List[Dict[str, str]], model: str = LLM_MODEL,
+                     temperature: float = 0.3, max_tokens: int = 1000,
+                     timeout: Optional[float] = None, endpoint: Optional[str] = None,
+                     cacheable: Optional[Callable[[str], bool]] = None,
+                     priority: str = "chat") -> AsyncIterator[str]:
+        """
+        Content deltas of one chat completion as the model produces them.
+        Holds a slot until the stream ends or the consumer closes the
+        generator (e.g. the client disconnected); the deadline covers the
+        whole stream, not just the first token. A cached answer (same key as
+        complete() would use) comes back as a single delta; a finished
+        stream is stored like a completion.
+        """
+        timeout = timeout or self.timeout
+        params: Dict[str, Any] = {"model": model, "messages": messages, "temperature": temperature, "max_tokens": max_tokens}
+
+        key = self._key(params) if endpoint and self.cache else None
+        if key:
+            cached = await asyncio.to_thread(self.cache.get, endpoint, key)
+            if cached is not None:
+                yield cached
+                return
+
+        parts = []
+        used = None
+        deadline = time.monotonic() + timeout
+        chunks, reserved = await self._send(dict(params, stream=True), priority, deadline, timeout)
+        try:
+            iterator = chunks.__aiter__()
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(iterator.__anext__(), self._remaining(deadline))
+                except StopAsyncIteration:
+                    break
+                used = usage_tokens(chunk) or used
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    parts.append(delta)
+                    yield delta
+            self.completed += 1
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise LLMTimeoutError(f"LLM stream timed out after {timeout:.0f}s")
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            # Also runs when the consumer stops early or the client disconnected.
+            # Without reported usage (stopped early) the prompt and the deltas so far stand in for it
+            if used is None:
+                used = prompt_tokens(params["messages"]) + (len("".join(parts)) + 3) // 4
+            self.scheduler.settle(reserved, used)
+            self._release()
+            await close_stream(chunks)
+
+        content = "".join(parts)
+        if key and content and (cacheable is None or cacheable(content)):
+            await asyncio.to_thread(self.cache.put, endpoint, key, content)
+
+    async def _send(self, params: Dict[str, Any], priority: str, deadline: float, timeout: float) -> Tuple[Any, int]:
+        """
+        Waits for admission and sends the request, retrying 429s until the
+        deadline. Returns the response and the tokens reserved for it. On
+        success the slot stays held and the caller must settle the
+        reservation and _release() it; on failure it has already been released.
+        """
+        prompt = prompt_tokens(params["messages"])
+        # A prompt + max_tokens over the TPM budget runs with a shorter completion instead of failing
+        params["max_tokens"] = self.scheduler.fit_max_tokens(prompt, params["max_tokens"])
+        tokens = prompt + params["max_tokens"]
+        attempt = 0
+        while True:
+            self.waiting += 1
+            try:
+                reserved = await self.scheduler.acquire(priority, tokens, self._remaining(deadline))
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                raise LLMTimeoutError(f"No LLM slot free within {timeout:.0f}s")
+            finally:
+                self.waiting -= 1
+
+            self.in_flight += 1
+            try:
+                response = await asyncio.wait_for(self.client.chat.completions.create(**params), self._remaining(deadline))
+                return response, reserved
+            except asyncio.TimeoutError:
+                self._release()
+                self.timeouts += 1
+                raise LLMTimeoutError(f"LLM call timed out after {timeout:.0f}s")
+            except Exception as e:
+                self._release()
+                delay = backoff_seconds(attempt, retry_after_seconds(e))
+                if not is_rate_limited(e) or attempt >= self.max_retries or delay >= self._remaining(deadline):
+                    self.errors += 1
+                    raise
+                # Everyone backs off, not just this call; it then queues again at its priority
+                print(f"[WARNING] Groq rate limit hit, retrying in {delay:.1f}s (attempt {attempt + 1})")
+                self.scheduler.rate_limited_for(delay)
+                self.retries += 1
+                attempt += 1
+
+    def _release(self):
+        self.in_flight -= 1
+        self.scheduler.release()
+
+    @staticmethod
+    def _key(params: Dict[str, Any]) -> str:
+        options = {name: value for name, value in params.items() if name not in ("model", "messages")}
+        return cache_key(params["model"], params["messages"], options)
+
+    @staticmethod
+    def _remaining(deadline: float) -> float:
+        return max(0.0, deadline - time.monotonic())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "completed": self.completed,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "retries": self.retries,
+            "coalesced": self.flights.coalesced,
+            "scheduler": self.scheduler.stats(),
+            "cache": self.cache.stats() if self.cache else None,
+        }
+
+_llm_client: Optional[LLMClient] = None
+
+def get_llm_client() -> LLMClient:
+    """Shared client, created on first use (after main.py has loaded .env)."""
+    global _llm_client
+    if _llm_client is None:
+        # The SDK's own retries are off: 429s are retried by LLMClient, paced by the scheduler
+        groq = AsyncGroq(api_key=os.environ.get("GROQ_API_KEY"), max_retries=0)
+        scheduler = LLMScheduler(LLM_MAX_CONCURRENCY, rpm=LLM_RPM, tpm=LLM_TPM)
+        _llm_client = LLMClient(groq, cache=create_llm_cache(), scheduler=scheduler)
+    return _llm_client
@@ -0,0 +1,243 @@
+"""
+Central admission control for LLM calls.
+
+Every completion asks the scheduler for a slot before it goes to Groq. A
+slot is granted when
+  - fewer than max_concurrency calls are in flight,
+  - the requests-per-minute bucket holds one request and the tokens-per-
+    minute bucket holds the call's estimated size (prompt + max_tokens),
+  - no rate-limit pause is active (set when Groq answers 429),
+  - and no waiter of a higher priority is ahead of it.
+Waiters queue per priority (chat before explain before background), FIFO
+within one. The reservation is only an upper bound: once Groq reports the
+call's actual usage the unused part goes back into the TPM bucket
+(settle). A call whose prompt + max_tokens exceeds the whole TPM budget
+gets its max_tokens clamped to fit (fit_max_tokens); only a prompt too
+large to leave room for a minimal completion is rejected.
+
+    LLM_RPM / LLM_TPM   budgets per minute (0 = unlimited)
+    LLM_MAX_RETRIES     429 retries per call, with jittered exponential backoff
+"""
+import os
+import time
+import heapq
+import random
+import asyncio
+import itertools
+from typing import List, Dict, Any, Optional
+
+# Groq free tier limits for llama-3.3-70b-versatile
+LLM_RPM = int(os.environ.get("LLM_RPM", 30))
+LLM_TPM = int(os.environ.get("LLM_TPM", 12000))
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", 3))
+
+# Lower runs first
+PRIORITIES = {"chat": 0, "explain": 1, "background": 2}
+
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 30.0
+
+# Smallest completion allowance a clamped call is still worth sending with
+MIN_COMPLETION_TOKENS = 256
+
+class LLMQuotaError(Exception):
+    """The request can never fit the configured token budget."""
+
+def prompt_tokens(messages: List[Dict[str, str]]) -> int:
+    """~4 characters per prompt token."""
+    return sum((len(m["content"]) + 3) // 4 for m in messages)
+
+def estimate_tokens(messages: List[Dict[str, str]], max_tokens: int) -> int:
+    """Tokens a call may use: the prompt plus the completion allowance."""
+    return prompt_tokens(messages) + max_tokens
+
+def backoff_seconds(attempt: int, retry_after: Optional[float] = None) -> float:
+    """Full-jitter exponential backoff; Retry-After from Groq is the floor when it is given."""
+    delay = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+    return max(delay, retry_after or 0.0)
+
+class TokenBucket:
+    """Refills `per_minute` units evenly over a minute, holding at most a minute's worth."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_for(self, amount: float, now: float) -> float:
+        """Seconds until `amount` is available (0 if it is now)."""
+        self._refill(now)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float):
+        self.level -= amount
+
+    def give(self, amount: float):
+        self.level = min(self.capacity, self.level + amount)
+
+    def drain(self):
+        self.level = min(self.level, 0.0)
+
+class _Waiter:
+    __slots__ = ("priority", "tokens", "future", "queued_at")
+
+    def __init__(self, priority: str, tokens: int, future: asyncio.Future):
+        self.priority = priority
+        self.tokens = tokens
+        self.future = future
+        self.queued_at = time.monotonic()
+
+class LLMScheduler:
+    """Priority queues in front of the concurrency limit and the RPM / TPM token buckets."""
+
+    def __init__(self, max_concurrency: int, rpm: int = 0, tpm: int = 0):
+        self.max_concurrency = max_concurrency
+        self.rpm = TokenBucket(rpm) if rpm > 0 else None
+        self.tpm = TokenBucket(tpm) if tpm > 0 else None
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self._queue: List[Any] = []
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # Loop of the latest acquire(); release() may run where no loop is running (generator finalization)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stats = {name: {"queued": 0, "admitted": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0}
+                       for name in PRIORITIES}
+        self.rejected = 0
+        self.rate_limited = 0
+
+    def fit_max_tokens(self, prompt: int, max_tokens: int) -> int:
+        """
+        max_tokens clamped so prompt + max_tokens fits the TPM budget; raises
+        LLMQuotaError if not even MIN_COMPLETION_TOKENS fit next to the prompt.
+        """
+        if not self.tpm or prompt + max_tokens <= self.tpm.capacity:
+            return max_tokens
+        room = int(self.tpm.capacity) - prompt
+        if room < min(max_tokens, MIN_COMPLETION_TOKENS):
+            self.rejected += 1
+            raise LLMQuotaError(f"Prompt of ~{prompt} tokens does not fit the {self.tpm.capacity:.0f} tokens/minute budget")
+        return room
+
+    async def acquire(self, priority: str, tokens: int, timeout: float) -> int:
+        """
+        Waits for a slot and returns the tokens reserved for it (at most the
+        whole TPM budget); raises asyncio.TimeoutError if none is granted in time.
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown LLM priority '{priority}'")
+        if self.tpm:
+            tokens = min(tokens, int(self.tpm.capacity))
+
+        self._loop = asyncio.get_running_loop()
+        waiter = _Waiter(priority, tokens, self._loop.create_future())
+        heapq.heappush(self._queue, (PRIORITIES[priority], next(self._seq), waiter))
+        self._stats[priority]["queued"] += 1
+        self._dispatch()
+        try:
+            await asyncio.wait_for(waiter.future, timeout)
+        except BaseException:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Admitted just as the caller gave up: hand the slot back
+                self.release()
+            else:
+                # Gave up in the queue; _dispatch drops the cancelled entry
+                self._stats[priority]["queued"] -= 1
+                self._dispatch()
+            raise
+        return tokens
+
+    def release(self):
+        self.in_flight -= 1
+        self._schedule_dispatch()
+
+    def settle(self, reserved: int, used: int):
+        """Corrects a call's TPM reservation with the tokens Groq reports it actually used."""
+        if not self.tpm or reserved == used:
+            return
+        if used < reserved:
+            self.tpm.give(reserved - used)
+        else:
+            self.tpm.take(used - reserved)
+        self._schedule_dispatch()
+
+    def rate_limited_for(self, seconds: float):
+        """Groq answered 429: hold every queue for `seconds` and empty the buckets."""
+        self.rate_limited += 1
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        for bucket in (self.rpm, self.tpm):
+            if bucket:
+                bucket.drain()
+        self._dispatch()
+
+    def _schedule_dispatch(self):
+        """Runs _dispatch on the scheduler's loop, also when called from outside it."""
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is not None and running is self._loop:
+            self._dispatch()
+        elif self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._dispatch)
+
+    def _dispatch(self):
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        while self._queue and self.in_flight < self.max_concurrency:
+            waiter = self._queue[0][2]
+            if waiter.future.done():
+                heapq.heappop(self._queue)
+                continue
+            now = time.monotonic()
+            wait = max(
+                self.paused_until - now,
+                self.rpm.wait_for(1, now) if self.rpm else 0.0,
+                self.tpm.wait_for(waiter.tokens, now) if self.tpm else 0.0,
+            )
+            if wait > 0:
+                # Head of the queue waits for budget; everything behind it waits too
+                self._timer = self._loop.call_later(wait, self._dispatch)
+                return
+            heapq.heappop(self._queue)
+            if self.rpm:
+                self.rpm.take(1)
+            if self.tpm:
+                self.tpm.take(waiter.tokens)
+            self.in_flight += 1
+            waited = now - waiter.queued_at
+            stats = self._stats[waiter.priority]
+            stats["queued"] -= 1
+            stats["admitted"] += 1
+            stats["wait_seconds"] += waited
+            stats["max_wait_seconds"] = max(stats["max_wait_seconds"], waited)
+            waiter.future.set_result(None)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        for bucket in (self.rpm, self.tpm):
+            if bucket:
+                bucket.wait_for(0, now)
+        queues = {}
+        for name, stats in self._stats.items():
+            admitted = stats["admitted"]
+            queues[name] = {
+                "depth": stats["queued"],
+                "admitted": admitted,
+                "avg_wait_ms": round(stats["wait_seconds"] / admitted * 1000, 1) if admitted else 0.0,
+                "max_wait_ms": round(stats["max_wait_seconds"] * 1000, 1),
+            }
+        return {
+            "queues": queues,
+            "rpm_available": round(self.rpm.level, 1) if self.rpm else None,
+            "tpm_available": round(self.tpm.level) if self.tpm else None,
+            "paused_seconds": round(max(0.0, self.paused_until - now), 2),
+            "rate_limited": self.rate_limited,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,39 @@
+import asyncio
+from typing import Dict, Any, Hashable, Callable, Awaitable, TypeVar
+
+T = TypeVar("T")
+
+class SingleFlight:
+    """
+    Request coalescing: while a call for a key is in flight, further callers
+    with the same key await that call's result instead of starting their own.
+    The key is forgotten as soon as the call finishes, so nothing is cached
+    beyond the flight itself.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Hashable, asyncio.Future] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        flight = self._flights.get(key)
+        if flight is None or flight.get_loop() is not asyncio.get_running_loop():
+            self.leaders += 1
+            flight = asyncio.ensure_future(fn())
+            self._flights[key] = flight
+            flight.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.coalesced += 1
+        # shield: one caller giving up (e.g. client disconnect) must not cancel the call for the others
+        return await asyncio.shield(flight)
+
+    def _finish(self, key: Hashable, flight: asyncio.Future):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        # Retrieved here so a failure nobody is waiting on any more is not logged as unhandled
+        if not flight.cancelled():
+            flight.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"in_flight": len(self._flights), "leaders": self.leaders, "coalesced": self.coalesced}
@@ -1,5 +1,7 @@
+import asyncio
 import yfinance as yf
 from typing import Optional, List
+from .single_flight import SingleFlight
 
 # Basic mapping to speed up common requests in the demo instead of always polling yfinance.
 COMMON_FALLBACK_MAP = {
@@ -28,6 +30,14 @@ def get_stock_price(ticker: str) -> Optional[float]:
         print(f"[ERROR] Failed to fetch price for {ticker}: {e}")
     return None
 
+# Concurrent lookups of one ticker (e.g. many users asking about NVDA at once) share one yfinance call
+price_flights = SingleFlight()
+
+async def get_stock_price_async(ticker: str) -> Optional[float]:
+    """get_stock_price in a worker thread, so async endpoints do not block on yfinance."""
+    ticker = ticker.upper()
+    return await price_flights.do(ticker, lambda: asyncio.to_thread(get_stock_price, ticker))
+
 def fallback_search_ticker(company_name: str) -> Optional[str]:
     """
     Attempt to find a ticker for an unknown company.
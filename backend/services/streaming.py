@@ -0,0 +1,148 @@
+import json
+from typing import List, Dict, Any, Optional, Tuple
+
+# Keep proxies (nginx) from buffering the stream
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+def sse_event(event: str, data: Any) -> str:
+    """One server-sent event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+_WHITESPACE = " \t\r\n"
+
+class _ValueScanner:
+    """Finds where one JSON value ends, resuming across chunks instead of rescanning."""
+
+    def __init__(self, start: int):
+        self.start = start
+        self.pos = start
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+
+    def scan(self, buffer: str) -> Optional[int]:
+        """End index (exclusive) of the value once it is complete, else None."""
+        while self.pos < len(buffer):
+            ch = buffer[self.pos]
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+                    if self.depth == 0:
+                        return self.pos + 1
+            elif ch == '"':
+                self.in_string = True
+            elif ch in "{[":
+                self.depth += 1
+            elif ch in "}]":
+                if self.depth == 0:
+                    # Closes the container this value sits in: a bare scalar ended just before
+                    return self.pos
+                self.depth -= 1
+                if self.depth == 0:
+                    return self.pos + 1
+            elif self.depth == 0 and (ch == "," or ch in _WHITESPACE):
+                return self.pos
+            self.pos += 1
+        return None
+
+class IncrementalJSONParser:
+    """
+    Parses a JSON object as it streams in and reports every top-level field
+    as soon as its value is complete. Elements of top-level arrays are
+    reported one by one, so a client can render the first list entry while
+    the model is still writing the second.
+
+    feed() returns events:
+      ("field", key, value)       - a complete non-array field
+      ("item", key, index, value) - one complete element of an array field
+      ("end", key, list)          - an array field is closed
+    Anything before the opening brace (e.g. a code fence) is skipped.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0
+        self.state = "start"
+        self.key: Optional[str] = None
+        self.items: List[Any] = []
+        self.scanner: Optional[_ValueScanner] = None
+        self.result: Dict[str, Any] = {}
+
+    @property
+    def done(self) -> bool:
+        return self.state == "done"
+
+    def feed(self, text: str) -> List[Tuple[Any, ...]]:
+        self.buffer += text
+        events: List[Tuple[Any, ...]] = []
+        while self.pos < len(self.buffer) and self.state != "done":
+            if self.scanner is not None:
+                end = self.scanner.scan(self.buffer)
+                if end is None:
+                    break
+                value = json.loads(self.buffer[self.scanner.start:end])
+                self.scanner = None
+                self.pos = end
+                if self.state == "key":
+                    self.key = value
+                    self.state = "colon"
+                elif self.state == "value":
+                    self.result[self.key] = value
+                    events.append(("field", self.key, value))
+                    self.state = "after_value"
+                else:  # array element
+                    events.append(("item", self.key, len(self.items), value))
+                    self.items.append(value)
+                    self.state = "after_item"
+                continue
+
+            ch = self.buffer[self.pos]
+            if ch in _WHITESPACE:
+                self.pos += 1
+            elif self.state == "start":
+                if ch == "{":
+                    self.state = "key_or_close"
+                self.pos += 1
+            elif self.state in ("key_or_close", "after_value"):
+                if ch == "}":
+                    self.state = "done"
+                elif ch == '"':
+                    self.state = "key"
+                    self.scanner = _ValueScanner(self.pos)
+                    continue
+                elif ch != ",":
+                    raise ValueError(f"Unexpected {ch!r} at {self.pos} in streamed JSON")
+                self.pos += 1
+            elif self.state == "colon":
+                if ch != ":":
+                    raise ValueError(f"Expected ':' at {self.pos} in streamed JSON")
+                self.state = "value"
+                self.pos += 1
+            elif self.state == "value":
+                if ch == "[":
+                    self.items = []
+                    self.state = "item_or_close"
+                    self.pos += 1
+                else:
+                    self.scanner = _ValueScanner(self.pos)
+            elif self.state in ("item_or_close", "after_item"):
+                if ch == "]":
+                    self.result[self.key] = self.items
+                    events.append(("end", self.key, self.items))
+                    self.state = "after_value"
+                    self.pos += 1
+                elif ch == "," and self.state == "after_item":
+                    self.state = "item_or_close"
+                    self.pos += 1
+                else:
+                    self.state = "item"
+                    self.scanner = _ValueScanner(self.pos)
+        # Drop what has been consumed so the buffer stays small
+        if self.scanner is None:
+            self.buffer = self.buffer[self.pos:]
+            self.pos = 0
+        return events
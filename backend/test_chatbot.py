@@ -1,4 +1,21 @@
+import os
+import json
+import time
+import asyncio
+import importlib
+import threading
+import pytest
+from types import SimpleNamespace
+
+# Any shared client created during the tests keeps its LLM cache in memory
+os.environ["LLM_CACHE_DB"] = ""
 from services.stock_resolver import resolve_stock
+from services.llm_client import LLMClient, LLMTimeoutError
+from services.llm_cache import LLMCache
+from services.single_flight import SingleFlight
+from services import llm_scheduler
+from services.llm_scheduler import LLMScheduler, LLMQuotaError
+from services.streaming import IncrementalJSONParser
 
 def test_resolve_stock_exact_ticker():
     assert set(resolve_stock("AAPL earnings")) == {"AAPL"}
@@ -27,6 +44,285 @@ def test_resolve_stock_no_false_positives():
 def test_resolve_stock_none_found():
     assert resolve_stock("Why did tech stocks rise?") == []
 
+class FakeCompletions:
+    """Stands in for AsyncGroq().chat.completions: sleeps, then echoes the prompt."""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.in_flight = 0
+        self.peak = 0
+        self.calls = 0
+        self.streams_closed = 0
+        self.total_tokens = None  # usage reported with each completion, if set
+
+    async def create(self, **params):
+        self.calls += 1
+        if params.get("stream"):
+            return self._stream(params["messages"][-1]["content"])
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        message = SimpleNamespace(content=params["messages"][-1]["content"])
+        usage = SimpleNamespace(total_tokens=self.total_tokens)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+    async def _stream(self, content):
+        # Word by word, like token deltas
+        try:
+            for i, word in enumerate(content.split(" ")):
+                await asyncio.sleep(self.delay)
+                delta = SimpleNamespace(content=word if i == 0 else " " + word)
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+        finally:
+            self.streams_closed += 1
+
+def fake_llm(delay, **kwargs):
+    completions = FakeCompletions(delay)
+    return LLMClient(SimpleNamespace(chat=SimpleNamespace(completions=completions)), **kwargs), completions
+
+def test_llm_client_keeps_many_calls_in_flight_up_to_the_limit():
+    llm, completions = fake_llm(0.1, max_concurrency=20)
+
+    async def run():
+        return await asyncio.gather(*(llm.complete([{"role": "user", "content": f"q{i}"}]) for i in range(40)))
+
+    started = time.perf_counter()
+    replies = asyncio.run(run())
+    elapsed = time.perf_counter() - started
+    assert replies == [f"q{i}" for i in range(40)]
+    # Two waves of 20, not 40 sequential calls
+    assert completions.peak == 20 and elapsed < 1.0
+    assert llm.stats()["completed"] == 40 and llm.stats()["in_flight"] == 0
+
+def test_llm_client_times_out():
+    llm, _ = fake_llm(1.0, timeout=0.05)
+    with pytest.raises(LLMTimeoutError):
+        asyncio.run(llm.complete([{"role": "user", "content": "slow"}]))
+    assert llm.stats()["timeouts"] == 1 and llm.stats()["in_flight"] == 0
+
+def test_llm_client_streams_deltas():
+    llm, _ = fake_llm(0.01)
+
+    async def run():
+        return [delta async for delta in llm.stream([{"role": "user", "content": "margins expanded this quarter"}])]
+
+    assert asyncio.run(run()) == ["margins", " expanded", " this", " quarter"]
+    assert llm.stats()["completed"] == 1 and llm.stats()["in_flight"] == 0
+
+def test_llm_client_closes_the_upstream_stream_when_the_consumer_stops():
+    llm, completions = fake_llm(0.01)
+
+    async def run():
+        stream = llm.stream([{"role": "user", "content": "a long answer the user stopped reading"}])
+        async for delta in stream:
+            break
+        await stream.aclose()
+        # Checked before asyncio.run() finalizes leftover generators on its own
+        return delta, completions.streams_closed
+
+    assert asyncio.run(run()) == ("a", 1)
+    assert llm.stats()["in_flight"] == 0
+
+def test_incremental_json_parser_emits_fields_as_they_complete():
+    text = """```json
+{"greeting": "Hi \\"Ann\\" {not a brace}", "key_takeaways": ["a, b", "c]"],
+ "per_stock_analysis": [{"ticker": "MSFT", "citations": ["x"]}, {"ticker": "AAPL", "citations": []}],
+ "confidence_score": 0.85, "action_plan": [], "extra": null}"""
+    parser = IncrementalJSONParser()
+    events = []
+    for i in range(0, len(text), 3):
+        events.extend(parser.feed(text[i:i + 3]))
+
+    assert events[0] == ("field", "greeting", 'Hi "Ann" {not a brace}')
+    assert [e for e in events if e[0] == "item" and e[1] == "per_stock_analysis"] == [
+        ("item", "per_stock_analysis", 0, {"ticker": "MSFT", "citations": ["x"]}),
+        ("item", "per_stock_analysis", 1, {"ticker": "AAPL", "citations": []}),
+    ]
+    assert ("field", "confidence_score", 0.85) in events
+    assert ("end", "action_plan", []) in events
+    assert parser.done and parser.result == json.loads(text[text.index("{"):])
+
+def test_llm_cache_serves_repeats_from_memory_then_disk(tmp_path):
+    db_path = str(tmp_path / "llm_cache.db")
+    llm, completions = fake_llm(0, cache=LLMCache(db_path=db_path))
+    # The SQLite file only appears once the cache is used
+    assert not os.path.exists(db_path)
+
+    async def ask(client, text, **kwargs):
+        return await client.complete([{"role": "user", "content": text}], endpoint="chat", **kwargs)
+
+    assert asyncio.run(ask(llm, "NVDA margins?\n")) == "NVDA margins?\n"
+    # Trailing whitespace and line endings do not change the key; parameters do
+    assert asyncio.run(ask(llm, "NVDA margins?  \r\n")) == "NVDA margins?\n"
+    asyncio.run(ask(llm, "NVDA margins?", temperature=0.9))
+    assert completions.calls == 2
+    assert llm.stats()["cache"]["endpoints"]["chat"]["memory_hits"] == 1
+
+    # A fresh process finds the answer in SQLite
+    restarted, completions = fake_llm(0, cache=LLMCache(db_path=db_path))
+    asyncio.run(ask(restarted, "NVDA margins?"))
+    assert completions.calls == 0
+    assert restarted.stats()["cache"]["endpoints"]["chat"]["disk_hits"] == 1
+
+def test_llm_cache_respects_ttl_and_veto():
+    llm, completions = fake_llm(0, cache=LLMCache(db_path=None, ttls={"chat": 0}))
+    for _ in range(2):
+        asyncio.run(llm.complete([{"role": "user", "content": "q"}], endpoint="chat"))
+        asyncio.run(llm.complete([{"role": "user", "content": "not json"}], endpoint="explain",
+                                 cacheable=lambda content: content.startswith("{")))
+    assert completions.calls == 4 and llm.stats()["cache"]["hits"] == 0
+
+def test_single_flight_coalesces_concurrent_callers():
+    flights = SingleFlight()
+    calls = []
+
+    async def lookup(ticker):
+        calls.append(ticker)
+        await asyncio.sleep(0.05)
+        if ticker == "BAD":
+            raise ValueError(ticker)
+        return f"{ticker} price"
+
+    async def run():
+        prices = await asyncio.gather(*(flights.do(t, lambda t=t: lookup(t)) for t in ["NVDA"] * 10 + ["AAPL"]))
+        failures = await asyncio.gather(*(flights.do("BAD", lambda: lookup("BAD")) for _ in range(3)),
+                                        return_exceptions=True)
+        # Finished flights are forgotten: the next call goes upstream again
+        await flights.do("NVDA", lambda: lookup("NVDA"))
+        return prices, failures
+
+    prices, failures = asyncio.run(run())
+    assert prices == ["NVDA price"] * 10 + ["AAPL price"]
+    assert all(isinstance(f, ValueError) for f in failures)
+    assert calls == ["NVDA", "AAPL", "BAD", "NVDA"]
+    assert flights.stats() == {"in_flight": 0, "leaders": 4, "coalesced": 11}
+
+def test_llm_client_coalesces_identical_calls():
+    llm, completions = fake_llm(0.05)
+
+    async def run():
+        return await asyncio.gather(*(llm.complete([{"role": "user", "content": "NVDA after earnings?"}]) for _ in range(10)))
+
+    assert asyncio.run(run()) == ["NVDA after earnings?"] * 10
+    assert completions.calls == 1 and llm.stats()["coalesced"] == 9
+
+def test_scheduler_admits_by_priority_then_fifo():
+    scheduler = LLMScheduler(max_concurrency=1)
+    order = []
+
+    async def call(priority, name):
+        await scheduler.acquire(priority, 10, timeout=5)
+        order.append(name)
+        await asyncio.sleep(0.01)
+        scheduler.release()
+
+    async def run():
+        await scheduler.acquire("background", 10, timeout=5)  # holds the only slot while the queues fill
+        tasks = [asyncio.create_task(call(p, n)) for p, n in
+                 [("background", "b1"), ("explain", "e1"), ("chat", "c1"), ("explain", "e2"), ("chat", "c2")]]
+        await asyncio.sleep(0.01)
+        assert scheduler.stats()["queues"]["explain"]["depth"] == 2
+        scheduler.release()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    assert order == ["c1", "c2", "e1", "e2", "b1"]
+    assert scheduler.stats()["queues"]["chat"]["admitted"] == 2
+
+def test_scheduler_paces_by_tokens_per_minute():
+    scheduler = LLMScheduler(max_concurrency=10, tpm=600)  # refills 10 tokens per second
+
+    async def run():
+        await scheduler.acquire("chat", 600, timeout=1)
+        started = time.perf_counter()
+        await scheduler.acquire("chat", 3, timeout=1)
+        return time.perf_counter() - started
+
+    assert 0.2 < asyncio.run(run()) < 0.6
+
+def test_scheduler_fits_oversized_requests_into_the_budget():
+    scheduler = LLMScheduler(max_concurrency=10, tpm=600)
+    assert scheduler.fit_max_tokens(100, 400) == 400
+    assert scheduler.fit_max_tokens(300, 1000) == 300
+    with pytest.raises(LLMQuotaError):
+        scheduler.fit_max_tokens(500, 1000)
+    # A reservation never exceeds the bucket, so it cannot queue forever
+    assert asyncio.run(scheduler.acquire("explain", 601, timeout=1)) == 600
+
+def test_llm_client_refunds_unused_tokens():
+    completions = FakeCompletions(0)
+    completions.total_tokens = 20
+    llm = LLMClient(SimpleNamespace(chat=SimpleNamespace(completions=completions)),
+                    scheduler=LLMScheduler(max_concurrency=10, tpm=6000))
+    messages = [{"role": "user", "content": "q"}]
+
+    asyncio.run(llm.complete(messages, max_tokens=1000))
+    assert 5970 <= llm.stats()["scheduler"]["tpm_available"] <= 6000
+
+    async def consume():
+        return [delta async for delta in llm.stream([{"role": "user", "content": "one two three"}], max_tokens=1000)]
+
+    asyncio.run(consume())
+    assert 5970 <= llm.stats()["scheduler"]["tpm_available"] <= 6000
+
+def test_scheduler_release_from_another_thread():
+    scheduler = LLMScheduler(max_concurrency=1)
+
+    async def run():
+        await scheduler.acquire("chat", 1, timeout=1)
+        waiting = asyncio.create_task(scheduler.acquire("chat", 1, timeout=1))
+        await asyncio.sleep(0.01)
+        # No running loop in the executor thread, as in async generator finalization
+        await asyncio.get_running_loop().run_in_executor(None, scheduler.release)
+        await waiting
+
+    asyncio.run(run())
+    assert scheduler.in_flight == 1
+
+class RateLimited(Exception):
+    status_code = 429
+
+def test_llm_client_retries_rate_limits(monkeypatch):
+    monkeypatch.setattr(llm_scheduler, "BACKOFF_BASE_SECONDS", 0.01)
+    llm, completions = fake_llm(0)
+    create = completions.create
+    failures = [RateLimited("slow down")]
+
+    async def flaky_create(**params):
+        if failures:
+            raise failures.pop()
+        return await create(**params)
+
+    completions.create = flaky_create
+    assert asyncio.run(llm.complete([{"role": "user", "content": "q"}])) == "q"
+    assert llm.stats()["retries"] == 1 and llm.stats()["errors"] == 0
+    assert llm.stats()["scheduler"]["rate_limited"] == 1 and llm.stats()["in_flight"] == 0
+
+def test_chat_user_context_is_loaded_off_the_event_loop(monkeypatch):
+    chat_router = importlib.import_module("chatbot.router")
+    monkeypatch.setattr(chat_router, "resolve_stock", lambda text: [])
+    monkeypatch.setattr(chat_router, "fallback_search_ticker", lambda text: None)
+    threads = []
+
+    class FakeQuery:
+        def filter(self, *args):
+            return self
+
+        def all(self):
+            threads.append(threading.get_ident())
+            return [SimpleNamespace(ticker="MSFT", shares=3, purchase_price=300, purchase_date="2024-01-02")]
+
+    db = SimpleNamespace(query=lambda model: FakeQuery())
+    user = SimpleNamespace(id=1, user_profile=None)
+    request = chat_router.ChatMessageRequest(message="How is my portfolio doing?")
+    prompt, tickers, sources, stats = asyncio.run(chat_router.build_chat_prompt(request, user, db))
+
+    assert "- MSFT: 3 shares" in prompt and tickers == [] and stats is None
+    assert threads and threads[0] != threading.get_ident()
+
 if __name__ == "__main__":
     test_resolve_stock_exact_ticker()
     test_resolve_stock_lowercase_ticker()
@@ -0,0 +1,641 @@
+import os
+import time
+import pytest
+import numpy as np
+from rag_vectorless import indexer, dedup
+from rag_vectorless.indexer import BM25Index, plan_update, tokenize
+from rag_vectorless.inverted import InvertedIndex
+from rag_vectorless.vocab import Vocabulary, TermMatrix, TermMatrixBuilder
+from rag_vectorless.filters import MetadataIndex
+from rag_vectorless.loader import list_transcripts, load_transcripts
+from rag_vectorless.pipeline import MIN_FILES_FOR_POOL, run_pipeline
+from rag_vectorless.chunker import chunk_text
+from rag_vectorless.schemas import SearchQuery, SearchResult, ChunkRecord
+from rag_vectorless.search import BM25Backend, search_index, get_chunk
+from rag_vectorless.batch import search_batch
+from rag_vectorless.jobs import RebuildManager
+from rag_vectorless.ranking import BoostConfig, BoostRules, has_bits
+from rag_vectorless.cache import QueryCache, query_cache
+from rag_vectorless.positions import PositionIndex, varint_decode, varint_encode
+from rag_vectorless.fts import FTS5Backend
+from rag_vectorless.backends import SearchBackend
+from rag_vectorless.context import pack_context
+from rag_vectorless.snippets import make_snippet, slim_results
+from rag_vectorless.bench import Passage, query_metrics, load_golden, run_config, parse_sweep
+from rag_vectorless.synthetic import fit_vocabulary, generate_corpus
+from rag_vectorless.scaling import measure_build, measure_serving, files_for
+from rag_vectorless.analysis import Analyzer, FINANCE_SYNONYMS, stem
+
+TRANSCRIPTS = {
+    "nvidia_q1.txt": "Prepared Remarks\nData center revenue grew strongly. Our outlook for data center demand remains robust.\n"
+                     "Question-and-Answer Session\nWhat is the gross margin guidance for next quarter?\nGross margin guidance is 75 percent.",
+    "apple_q1.txt": "Prepared Remarks\niPhone revenue was a record. Services revenue grew double digits.\n"
+                    "Q&A\nHow is the gross margin trending for iPhone?",
+    "microsoft_q1.txt": "Prepared Remarks\nAzure and other cloud services revenue grew 33 percent.\n"
+                        "Operator\nThank you for joining the call.",
+}
+
+@pytest.fixture
+def rag_index(tmp_path, monkeypatch):
+    transcripts = tmp_path / "transcripts"
+    transcripts.mkdir()
+    for name, text in TRANSCRIPTS.items():
+        (transcripts / name).write_text(text, encoding="utf-8")
+
+    index = BM25Index(cache_dir=str(tmp_path / "index_cache"))
+    index.build(str(transcripts))
+    monkeypatch.setattr(indexer, "global_index", index)
+    return index
+
+def test_inverted_index_matches_bm25okapi():
+    rank_bm25 = pytest.importorskip("rank_bm25")
+    corpus = [tokenize(text) for text in TRANSCRIPTS.values()] + [tokenize("gross margin margin outlook")]
+    inverted = InvertedIndex.from_corpus(corpus)
+    okapi = rank_bm25.BM25Okapi(corpus)
+
+    for query in ["gross margin", "data center outlook", "azure revenue revenue", "unknownterm"]:
+        tokens = tokenize(query)
+        expected = okapi.get_scores(tokens)
+        scores = inverted.score(tokens)
+        for doc_id, value in enumerate(expected):
+            assert scores.get(doc_id, 0.0) == pytest.approx(value)
+
+def test_score_only_touches_matching_chunks():
+    corpus = [tokenize(text) for text in TRANSCRIPTS.values()]
+    inverted = InvertedIndex.from_corpus(corpus)
+    assert set(inverted.score(tokenize("azure"))) == {2}
+    assert inverted.score(["unknownterm"]) == {}
+
+def test_term_matrix_transposes_to_postings():
+    vocab = Vocabulary()
+    rows = TermMatrixBuilder()
+    for tokens in (["margin", "azure", "margin"], [], ["azure"]):
+        rows.append(vocab.encode(tokens))
+    matrix = rows.build()
+    assert vocab.terms == ["margin", "azure"]
+    assert matrix.indptr.tolist() == [0, 2, 2, 3]
+    assert matrix.doc_len.tolist() == [3, 0, 1]
+
+    inverted = InvertedIndex.from_matrix(vocab, TermMatrix.concat([matrix, matrix]))
+    assert list(inverted.vocab) == ["azure", "margin"]
+    assert inverted.postings("azure")[1].tolist() == [0, 2, 3, 5]
+    assert inverted.encode_query(["margin", "unknownterm", "margin"]) == [(1, 2)]
+
+def test_search_returns_bounded_sorted_results(rag_index):
+    results = search_index(SearchQuery(query="gross margin revenue", top_k=2))
+    assert len(results) == 2
+    assert results[0].score >= results[1].score
+
+def test_search_applies_filters(rag_index):
+    results = search_index(SearchQuery(query="gross margin", top_k=5, filters={"company": "AAPL"}))
+    assert results
+    assert all(r.metadata.company == "AAPL" for r in results)
+
+def test_batch_search_matches_single_queries(rag_index):
+    queries = [
+        SearchQuery(query="gross margin guidance?", top_k=3),
+        SearchQuery(query="azure cloud revenue", top_k=2, filters={"company": ["MSFT", "AAPL"]}),
+        SearchQuery(query="unknownterm", top_k=5),
+        SearchQuery(query="revenue", top_k=1, filters={"company": "NVDA"}),
+    ]
+    for query, batch_results in zip(queries, search_batch(queries)):
+        single = search_index(query)
+        assert [r.metadata.chunk_id for r in batch_results] == [r.metadata.chunk_id for r in single]
+        assert [r.score for r in batch_results] == pytest.approx([r.score for r in single])
+
+def test_boost_features_are_stored_as_bitsets(rag_index):
+    store = rag_index.shard("MSFT").store
+    azure = [i for i in range(len(store)) if has_bits(store.features["mentions_azure"], [i])[0]]
+    assert azure == [i for i in range(len(store)) if "azure" in store.text(i).lower()]
+
+    rules = BoostRules(BoostConfig(
+        features={"mentions_azure": {"contains": ["Azure"]}},
+        rules=[{"query_contains": ["cloud"], "feature": "mentions_azure", "multiplier": 2.0}],
+    ))
+    doc_ids = np.arange(len(store))
+    boosted = rules.apply("Cloud growth", doc_ids, np.ones(len(store)), store.features)
+    assert np.flatnonzero(boosted == 2.0).tolist() == azure
+    assert (rules.apply("iphone", doc_ids, np.ones(len(store)), store.features) == 1.0).all()
+
+    with pytest.raises(ValueError):
+        BoostRules(BoostConfig(features={}, rules=[{"query_contains": ["x"], "feature": "missing", "multiplier": 2.0}]))
+
+def test_positions_round_trip_through_varint_blob():
+    values = np.array([0, 1, 127, 128, 300, 16384, 2 ** 31])
+    assert varint_decode(varint_encode(values)).tolist() == values.tolist()
+
+    inverted = InvertedIndex.from_corpus([["gross", "margin", "gross"], ["margin", "gross", "margin", "margin"]])
+    doc_ids, indptr, flat = inverted.term_positions(inverted.vocab.get("margin"))
+    assert doc_ids.tolist() == [0, 1]
+    assert [flat[indptr[i]:indptr[i + 1]].tolist() for i in range(2)] == [[1], [0, 2, 3]]
+    assert len(inverted.positions.blob) == 7
+
+def test_phrase_queries_require_adjacent_terms(rag_index):
+    loose = search_index(SearchQuery(query="margin guidance", top_k=10))
+    phrase = search_index(SearchQuery(query='"margin guidance"', top_k=10))
+    assert phrase and len(phrase) < len(loose)
+    assert all("margin guidance" in r.text.lower() for r in phrase)
+    assert search_index(SearchQuery(query='"guidance margin"', top_k=10)) == []
+    assert search_index(SearchQuery(query='revenue "data center"', top_k=10, filters={"company": "AAPL"})) == []
+
+    boosted = search_index(SearchQuery(query="iphone margin", top_k=1, proximity_boost=1.0))
+    plain = search_index(SearchQuery(query="iphone margin", top_k=1))
+    assert boosted[0].metadata.chunk_id == plain[0].metadata.chunk_id
+    assert boosted[0].score > plain[0].score
+
+def test_query_cache_hits_and_invalidates_on_new_generation(rag_index, tmp_path):
+    before = query_cache.stats()
+    first = search_index(SearchQuery(query="Gross margin", top_k=2))
+    assert search_index(SearchQuery(query="gross   MARGIN", top_k=2)) == first
+    # Same tokens, but "?" triggers the q&a boost, so it is a different entry
+    search_index(SearchQuery(query="gross margin?", top_k=2))
+    stats = query_cache.stats()
+    assert stats["hits"] - before["hits"] == 1
+    assert stats["misses"] - before["misses"] == 2
+
+    rag_index.load()
+    search_index(SearchQuery(query="gross margin", top_k=2))
+    assert query_cache.stats()["misses"] - stats["misses"] == 1
+    assert query_cache.stats()["generation"] == rag_index.generation
+
+def test_query_cache_evicts_by_size_and_ttl():
+    cache = QueryCache(max_entries=2, ttl=60)
+    for i in range(3):
+        cache.put(1, ("q", i), [])
+    assert cache.get(1, ("q", 0)) is None
+    assert cache.get(1, ("q", 2)) == []
+    assert cache.stats()["evictions"] == 1
+
+    expired = QueryCache(ttl=-1)
+    expired.put(1, ("q",), [])
+    assert expired.get(1, ("q",)) is None
+
+def test_metadata_index_equality_in_and_range():
+    index = MetadataIndex.from_columns({
+        "company": ["NVDA", "AAPL", "NVDA", "MSFT"],
+        "fy": ["2023", "FY2024", "2025", "unknown"],
+    }, 4)
+    assert index.candidates(None) is None
+    assert index.candidates({"company": "NVDA"}).tolist() == [0, 2]
+    assert index.candidates({"company": ["AAPL", "MSFT"]}).tolist() == [1, 3]
+    assert index.candidates({"company": {"in": ["AAPL"]}}).tolist() == [1]
+    assert index.candidates({"fy": {">=": 2024}}).tolist() == [1, 2]
+    assert index.candidates({"fy": {">": "2023", "<": 2025}}).tolist() == [1]
+    assert index.candidates({"company": "NVDA", "fy": {">=": 2024}}).tolist() == [2]
+    assert index.candidates({"sector": "tech"}).tolist() == []
+    with pytest.raises(ValueError):
+        index.candidates({"fy": {"~": 2024}})
+
+def test_search_filters_multiple_companies(rag_index):
+    results = search_index(SearchQuery(query="revenue", top_k=5, filters={"company": {"in": ["AAPL", "MSFT"]}}))
+    assert {r.metadata.company for r in results} == {"AAPL", "MSFT"}
+
+def test_index_file_round_trips_chunks(rag_index, tmp_path):
+    expected = [c for doc in load_transcripts(str(tmp_path / "transcripts")) for c in chunk_text(doc)]
+    assert rag_index.num_docs == len(expected)
+    records = [shard.store.record(i) for shard in rag_index.shards.values() for i in range(shard.num_docs)]
+    assert sorted(records, key=lambda c: c.metadata.chunk_id) == sorted(expected, key=lambda c: c.metadata.chunk_id)
+    assert rag_index.shard("MSFT").inverted.vocab.get("azur") is not None
+    assert rag_index.shard("NVDA").inverted.vocab.get("azur") is None
+
+def test_shards_carry_own_stats_and_route_by_company(rag_index):
+    assert sorted(rag_index.shards) == ["AAPL", "MSFT", "NVDA"]
+    assert all(shard.inverted.num_docs == shard.num_docs for shard in rag_index.shards.values())
+
+    router = rag_index.snapshot.router
+    assert [s.key for s in router.route({"company": "NVDA"})] == ["NVDA"]
+    assert [s.key for s in router.route({"company": {"in": ["MSFT", "AAPL"]}})] == ["AAPL", "MSFT"]
+    assert [s.key for s in router.route({"company": "TSLA"})] == []
+    assert len(router.route({"section": "q&a"})) == 3
+
+    results = search_index(SearchQuery(query="gross margin revenue", top_k=3))
+    assert len({r.metadata.company for r in results}) > 1
+    assert [r.score for r in results] == sorted((r.score for r in results), reverse=True)
+
+def test_shards_score_with_corpus_wide_statistics(rag_index, tmp_path):
+    _, single, _ = run_pipeline(list_transcripts(str(tmp_path / "transcripts")), workers=1)
+    stats = rag_index.snapshot.stats
+    assert stats.num_docs == single.num_docs and stats.avgdl == pytest.approx(single.avgdl)
+
+    for query in ["gross margin revenue", "data center", "services revenue grew"]:
+        tokens = tokenize(query)
+        expected = single.score(tokens)
+        sharded = []
+        for shard in rag_index.shards.values():
+            scores = shard.inverted.score_terms(shard.inverted.encode_query(tokens), None,
+                                                stats.query_idf(shard.inverted, tokens), stats.avgdl)
+            sharded.extend(scores.values())
+        assert sorted(sharded) == pytest.approx(sorted(expected.values()))
+
+def test_incremental_update_matches_full_build(rag_index, tmp_path):
+    transcripts = tmp_path / "transcripts"
+    (transcripts / "nvidia_q2.txt").write_text("Prepared Remarks\nData center revenue doubled. Gross margin expanded.", encoding="utf-8")
+    (transcripts / "apple_q1.txt").write_text("Prepared Remarks\nServices revenue hit a record. Azure is not ours.", encoding="utf-8")
+    (transcripts / "microsoft_q1.txt").unlink()
+
+    plan = plan_update(str(transcripts), rag_index.cache_dir)
+    assert (plan.added, plan.changed, plan.removed) == ({"nvidia_q2.txt"}, {"apple_q1.txt"}, {"microsoft_q1.txt"})
+
+    report = rag_index.update(str(transcripts), plan)
+    assert report["mode"] == "incremental"
+
+    assert report["shards_rewritten"] == ["AAPL", "MSFT", "NVDA"]
+    assert sorted(rag_index.shards) == ["AAPL", "NVDA"]
+
+    fresh = BM25Index(cache_dir=str(tmp_path / "fresh_cache"))
+    fresh.build(str(transcripts))
+    assert fresh.num_docs == rag_index.num_docs
+    for key, shard in fresh.shards.items():
+        assert list(shard.inverted.vocab) == list(rag_index.shard(key).inverted.vocab)
+        assert shard.inverted.avgdl == pytest.approx(rag_index.shard(key).inverted.avgdl)
+
+    def ranked(index, query):
+        return sorted(
+            (shard.store.metadata(i).chunk_id, round(s, 9))
+            for shard in index.shards.values()
+            for i, s in shard.inverted.score(tokenize(query)).items()
+        )
+
+    for query in ["data center revenue", "azure", "gross margin guidance"]:
+        assert ranked(rag_index, query) == ranked(fresh, query)
+
+    def positions(index, term):
+        found = {}
+        for shard in index.shards.values():
+            term_id = shard.inverted.vocab.get(term)
+            if term_id is None:
+                continue
+            doc_ids, indptr, flat = shard.inverted.term_positions(term_id)
+            for i, d in enumerate(doc_ids):
+                found[shard.store.metadata(int(d)).chunk_id] = flat[indptr[i]:indptr[i + 1]].tolist()
+        return found
+
+    for term in ["revenue", "prepared", "margin"]:
+        assert positions(rag_index, term) == positions(fresh, term)
+
+def test_crash_after_publishing_shards_does_not_reindex_files(rag_index, tmp_path, monkeypatch):
+    monkeypatch.setattr(indexer, "DEDUP_ENABLED", False)
+    monkeypatch.setattr(dedup, "DEDUP_ENABLED", False)
+    transcripts = tmp_path / "transcripts"
+    rag_index.build(str(transcripts))
+    (transcripts / "nvidia_q2.txt").write_text("Prepared Remarks\nBlackwell ramp is ahead of plan.", encoding="utf-8")
+
+    # The process dies right after the new shard list goes live
+    replace = os.replace
+    def replace_then_crash(src, dst):
+        replace(src, dst)
+        if os.path.basename(dst) == "shards.json":
+            raise KeyboardInterrupt
+    monkeypatch.setattr(os, "replace", replace_then_crash)
+    with pytest.raises(KeyboardInterrupt):
+        rag_index.update(str(transcripts))
+    monkeypatch.setattr(os, "replace", replace)
+
+    assert not plan_update(str(transcripts), rag_index.cache_dir).has_changes
+    reopened = BM25Index(cache_dir=rag_index.cache_dir)
+    assert reopened.update(str(transcripts))["mode"] == "unchanged"
+    assert reopened.num_docs == len(TRANSCRIPTS) + 1
+
+def test_touching_files_does_not_trigger_reindex(rag_index, tmp_path):
+    transcripts = tmp_path / "transcripts"
+    path = transcripts / "apple_q1.txt"
+    os.utime(path, (path.stat().st_atime + 100, path.stat().st_mtime + 100))
+    assert not plan_update(str(transcripts), rag_index.cache_dir).has_changes
+
+def test_background_rebuild_swaps_generation(rag_index, tmp_path):
+    transcripts = tmp_path / "transcripts"
+    old = rag_index.snapshot
+    (transcripts / "nvidia_q2.txt").write_text("Prepared Remarks\nBlackwell ramp is ahead of plan.", encoding="utf-8")
+
+    manager = RebuildManager()
+    job = manager.submit(str(transcripts))
+    deadline = time.time() + 10
+    while manager.get(job.job_id).status in ("queued", "running") and time.time() < deadline:
+        time.sleep(0.01)
+
+    job = manager.get(job.job_id)
+    assert job.status == "succeeded", job.error
+    assert job.progress == 1.0
+    assert job.report["added"] == ["nvidia_q2.txt"]
+    assert job.report["shards_rewritten"] == ["NVDA"]
+    assert rag_index.generation == job.generation > old.generation
+
+    # A search pinned to the old generation still reads consistent data
+    assert old.num_docs == rag_index.num_docs - 1
+    assert old.shards["NVDA"].store.text(0) == rag_index.shard("NVDA").store.text(0)
+    assert old.shards["AAPL"].file_name == rag_index.shard("AAPL").file_name
+    assert search_index(SearchQuery(query="blackwell ramp", top_k=1))[0].metadata.file_name == "nvidia_q2.txt"
+
+def test_parallel_pipeline_matches_inline(tmp_path):
+    for i in range(MIN_FILES_FOR_POOL):
+        (tmp_path / f"nvidia_{i}.txt").write_text(f"Prepared Remarks\nQuarter {i} data center revenue.\nQ&A\nMargins?", encoding="utf-8")
+    sources = list_transcripts(str(tmp_path))
+
+    inline_chunks, inline_index, inline_report = run_pipeline(sources, workers=1)
+    pool_chunks, pool_index, pool_report = run_pipeline(sources, workers=2)
+
+    assert pool_report["workers"] == 2 and inline_report["workers"] == 1
+    assert set(pool_report["stages"]) == {"chunk", "tokenize"}
+    assert pool_chunks == inline_chunks
+    assert list(pool_index.vocab) == list(inline_index.vocab)
+    assert pool_index.doc_ids.tolist() == inline_index.doc_ids.tolist()
+
+def test_streaming_chunks_track_sections():
+    words = " ".join(f"w{i}" for i in range(500))
+    doc = {"text": f"Prepared Remarks\n{words}\nQuestion-and-Answer Session\n{words}", "file_name": "t.txt",
+           "file_path": "t.txt", "metadata": {"company": "NVDA"}}
+    chunks = chunk_text(doc, chunk_size=400, overlap=80)
+
+    assert [(c.metadata.start_word_idx, c.metadata.end_word_idx) for c in chunks] == [
+        (0, 400), (320, 720), (640, 1004)]
+    # Sections are resolved at each chunk's midpoint
+    assert [c.metadata.section for c in chunks] == ["Prepared Remarks", "q&a", "q&a"]
+    assert chunks[1].text.split()[0] == "w318"
+
+def test_fts5_backend_searches_from_disk(tmp_path):
+    transcripts = tmp_path / "transcripts"
+    transcripts.mkdir()
+    for name, text in TRANSCRIPTS.items():
+        (transcripts / name).write_text(text, encoding="utf-8")
+
+    backend = FTS5Backend(db_path=str(tmp_path / "fts5.db"))
+    assert backend.prepare(str(transcripts)) is None
+    assert backend.num_docs == 3
+
+    results = backend.search(SearchQuery(query="gross margin guidance", top_k=5))
+    assert results[0].metadata.company == "NVDA"
+    assert [r.score for r in results] == sorted((r.score for r in results), reverse=True)
+    assert {r.metadata.company for r in backend.search(SearchQuery(query="revenue", filters={"company": ["AAPL", "MSFT"]}))} == {"AAPL", "MSFT"}
+    assert backend.search(SearchQuery(query="revenue", filters={"fy": {">=": 2020}})) == []
+    assert backend.search(SearchQuery(query='"guidance margin"')) == []
+    with pytest.raises(ValueError):
+        backend.search(SearchQuery(query="revenue", filters={"fy": {"~": 1}}))
+    with pytest.raises(ValueError):
+        backend.search(SearchQuery(query="revenue", proximity_boost=0.5))
+    hits = query_cache.hits
+    assert backend.search(SearchQuery(query="gross margin guidance", top_k=5)) == results
+    assert query_cache.hits == hits + 1
+
+    (transcripts / "apple_q1.txt").unlink()
+    (transcripts / "nvidia_q2.txt").write_text("Prepared Remarks\nBlackwell ramp is ahead of plan.", encoding="utf-8")
+    generation = backend.generation
+    report = backend.update(str(transcripts))
+    assert report["mode"] == "incremental"
+    assert report["chunks_removed"] == 1 and report["chunks_added"] == 1
+    assert backend.generation > generation
+    assert backend.search(SearchQuery(query="iphone")) == []
+    assert backend.search(SearchQuery(query="blackwell", top_k=1))[0].metadata.file_name == "nvidia_q2.txt"
+    assert not backend.plan(str(transcripts)).has_changes
+
+def test_context_packing_merges_overlaps_and_respects_budget():
+    words = " ".join(f"w{i}" for i in range(1000))
+    doc = {"text": words, "file_name": "t.txt", "file_path": "t.txt", "metadata": {"company": "NVDA"}}
+    chunks = chunk_text(doc)
+    hits = [SearchResult(score=3.0 - i, text=c.text, metadata=c.metadata) for i, c in enumerate(chunks)]
+    # The same opening remarks filed under a second name
+    copy = chunk_text({**doc, "file_name": "t_copy.txt"})[0]
+    hits.append(SearchResult(score=0.5, text=copy.text, metadata=copy.metadata))
+
+    context, stats = pack_context(hits, token_budget=100000)
+    assert context == f"[NVDA] {words}"
+    assert stats.passages == 1 and stats.hits_merged == 2 and stats.duplicates_removed == 1
+    assert stats.tokens_saved == stats.raw_tokens - stats.packed_tokens > 0
+
+    context, stats = pack_context(hits, token_budget=200)
+    assert stats.packed_tokens <= 200 and stats.passages_truncated == 1
+    assert context.startswith("[NVDA] w0 w1")
+
+def test_slim_results_and_chunk_lookup(rag_index, tmp_path):
+    results = search_index(SearchQuery(query="gross margin guidance", top_k=3))
+    slim = slim_results(results, "gross margin guidance", width=6)
+    assert [s.chunk_id for s in slim] == [r.metadata.chunk_id for r in results]
+    assert "**margin**" in slim[0].snippet and len(slim[0].snippet) < len(results[0].text)
+
+    for result in results:
+        assert get_chunk(result.metadata.chunk_id) == ChunkRecord(text=result.text, metadata=result.metadata)
+    assert get_chunk("missing") is None
+
+    backend = FTS5Backend(db_path=str(tmp_path / "fts5.db"))
+    backend.prepare(str(tmp_path / "transcripts"))
+    chunk_id = results[0].metadata.chunk_id
+    assert backend.get_chunk(chunk_id) == get_chunk(chunk_id)
+
+def test_snippet_picks_densest_window():
+    text = " ".join(["filler"] * 50 + ["Gross", "margin", "was", "strong."] + ["filler"] * 50)
+    assert make_snippet(text, "gross margin", width=4) == "... **Gross** **margin** was strong. ..."
+
+DISCLAIMER = ("This transcript is provided for information purposes only and is not investment advice. "
+              "The publisher makes no representation as to the accuracy or completeness of the statements "
+              "made by participants, and all content is subject to the terms of use of the service. ") * 3
+
+def test_build_drops_boilerplate_and_duplicate_chunks(tmp_path):
+    disclaimer = DISCLAIMER
+    transcripts = tmp_path / "transcripts"
+    transcripts.mkdir()
+    for name, text in TRANSCRIPTS.items():
+        (transcripts / name).write_text(f"{text}\n", encoding="utf-8")
+        (transcripts / f"legal_{name}").write_text(disclaimer, encoding="utf-8")
+    (transcripts / "nvidia_q1_copy.txt").write_text(TRANSCRIPTS["nvidia_q1.txt"], encoding="utf-8")
+
+    sources = list_transcripts(str(transcripts))
+    chunks, inverted, report = run_pipeline(sources, workers=1)
+    assert report["dedup"]["chunks_in"] == 7
+    # One copy of the boilerplate stays searchable
+    assert report["dedup"]["boilerplate_removed"] == 2
+    assert report["dedup"]["duplicates_removed"] == 1
+    assert len(chunks) == inverted.num_docs == 4
+    assert len(inverted.postings("publisher")[1]) == 1
+
+    _, _, kept = run_pipeline(sources, workers=1, dedupe=False)
+    assert "dedup" not in kept and kept["chunks"] == 7
+
+def test_dedup_keeps_the_same_copy_whatever_the_listing_order(tmp_path, monkeypatch):
+    transcripts = tmp_path / "transcripts"
+    transcripts.mkdir()
+    for name, text in TRANSCRIPTS.items():
+        (transcripts / name).write_text(f"{text}\n", encoding="utf-8")
+        (transcripts / f"legal_{name}").write_text(DISCLAIMER, encoding="utf-8")
+    (transcripts / "nvidia_q1_copy.txt").write_text(TRANSCRIPTS["nvidia_q1.txt"], encoding="utf-8")
+
+    def kept_ids():
+        chunks, _, _ = run_pipeline(list_transcripts(str(transcripts)), workers=1)
+        return [chunk.metadata.chunk_id for chunk in chunks]
+
+    expected = kept_ids()
+    listdir = os.listdir
+    for order in (reversed, lambda names: names[1::2] + names[::2]):
+        monkeypatch.setattr(os, "listdir", lambda path, order=order: list(order(listdir(path))))
+        assert kept_ids() == expected
+
+def test_incremental_update_dedups_against_the_indexed_corpus(tmp_path):
+    transcripts = tmp_path / "transcripts"
+    transcripts.mkdir()
+    for name, text in TRANSCRIPTS.items():
+        (transcripts / name).write_text(text, encoding="utf-8")
+        (transcripts / f"legal_{name}").write_text(DISCLAIMER, encoding="utf-8")
+    index = BM25Index(cache_dir=str(tmp_path / "index_cache"))
+    index.build(str(transcripts))
+    assert index.num_docs == 4
+
+    # A nightly drop of two files: one more disclaimer, one re-sent transcript
+    (transcripts / "legal_nvidia_q2.txt").write_text(DISCLAIMER, encoding="utf-8")
+    (transcripts / "nvidia_q1_copy.txt").write_text(TRANSCRIPTS["nvidia_q1.txt"], encoding="utf-8")
+    report = index.update(str(transcripts))
+    assert report["mode"] == "incremental"
+    assert (report["dedup"]["boilerplate_removed"], report["dedup"]["duplicates_removed"]) == (1, 1)
+    assert report["chunks_added"] == 0 and index.num_docs == 4
+
+    fresh = BM25Index(cache_dir=str(tmp_path / "fresh_cache"))
+    fresh.build(str(transcripts))
+    assert fresh.num_docs == index.num_docs
+
+    # Deleting the file that holds the kept copy brings another copy back via a full rebuild
+    indexed = BM25Backend(index)
+    anchor = indexed.search(SearchQuery(query="publisher representation", top_k=5))
+    assert len(anchor) == 1
+    (transcripts / anchor[0].metadata.file_name).unlink()
+    assert index.update(str(transcripts))["mode"] == "full"
+    assert len(indexed.search(SearchQuery(query="publisher representation", top_k=5))) == 1
+
+def test_dedup_state_does_not_grow_the_index(tmp_path, monkeypatch):
+    transcripts = os.path.join(os.path.dirname(os.path.abspath(__file__)), "transcripts")
+
+    def index_size(cache_dir):
+        BM25Index(cache_dir=str(cache_dir), workers=1).build(transcripts)
+        return sum(f.stat().st_size for f in cache_dir.iterdir())
+
+    deduped = index_size(tmp_path / "deduped")
+    monkeypatch.setattr(indexer, "DEDUP_ENABLED", False)
+    monkeypatch.setattr(dedup, "DEDUP_ENABLED", False)
+    assert deduped <= index_size(tmp_path / "plain")
+
+def test_backends_index_the_same_deduplicated_chunks(tmp_path):
+    disclaimer = DISCLAIMER
+    transcripts = tmp_path / "transcripts"
+    transcripts.mkdir()
+    for name, text in TRANSCRIPTS.items():
+        (transcripts / name).write_text(f"{text}\n", encoding="utf-8")
+        (transcripts / f"legal_{name}").write_text(disclaimer, encoding="utf-8")
+    (transcripts / "nvidia_q1_copy.txt").write_text(TRANSCRIPTS["nvidia_q1.txt"], encoding="utf-8")
+
+    bm25 = BM25Index(cache_dir=str(tmp_path / "index_cache"))
+    bm25.build(str(transcripts))
+    fts = FTS5Backend(db_path=str(tmp_path / "fts5.db"))
+    report = fts.build(str(transcripts))
+    assert report["dedup"]["chunks_in"] == 7
+    assert fts.num_docs == bm25.num_docs
+
+    for query in ["publisher representation", "data center revenue"]:
+        request = SearchQuery(query=query, top_k=10)
+        assert (sorted(r.metadata.chunk_id for r in fts.search(request))
+                == sorted(r.metadata.chunk_id for r in BM25Backend(bm25).search(request)))
+
+    (transcripts / "legal_nvidia_q2.txt").write_text(disclaimer, encoding="utf-8")
+    assert fts.update(str(transcripts))["dedup"]["boilerplate_removed"] == 1
+    assert bm25.update(str(transcripts))["dedup"]["boilerplate_removed"] == 1
+    assert fts.num_docs == bm25.num_docs
+
+def test_search_backend_requires_every_method():
+    class Partial(SearchBackend):
+        name = "partial"
+
+        def search(self, query):
+            return []
+
+    with pytest.raises(TypeError):
+        Partial()
+
+def test_benchmark_metrics_and_chunking_sweep(tmp_path):
+    def hit(file_name, start, end):
+        return SearchResult(score=1.0, text="", metadata={
+            "chunk_id": f"{start}", "file_name": file_name, "file_path": file_name, "company": "NVDA",
+            "fy": "2025", "quarter": "Q1", "date": "unknown", "start_word_idx": start, "end_word_idx": end
+        })
+    passages = [Passage("a.txt", 10, 12, 2), Passage("a.txt", 50, 52, 1)]
+    metrics = query_metrics([hit("b.txt", 0, 20), hit("a.txt", 0, 20), hit("a.txt", 5, 25)], passages, k=3)
+    assert metrics["recall"] == 0.5 and metrics["mrr"] == 0.5
+    assert metrics["ndcg"] == pytest.approx((3 / np.log2(3)) / (3 + 1 / np.log2(3)))
+
+    transcripts = tmp_path / "transcripts"
+    transcripts.mkdir()
+    for name, text in TRANSCRIPTS.items():
+        (transcripts / name).write_text(text, encoding="utf-8")
+    golden_file = tmp_path / "golden.json"
+    golden_file.write_text(
+        '{"queries": [{"query": "gross margin guidance", "filters": {"company": "NVDA"},'
+        ' "relevant": [{"file": "nvidia_q1.txt", "contains": "Gross margin guidance is 75 percent", "grade": 2}]}]}',
+        encoding="utf-8"
+    )
+    golden = load_golden(str(golden_file), str(transcripts))
+    assert (golden[0]["passages"][0].start, golden[0]["passages"][0].end) == (26, 32)
+
+    assert parse_sweep("8:2, 400:80") == [(8, 2), (400, 80)]
+    for backend in ("bm25", "fts5"):
+        run = run_config(str(transcripts), golden, 8, 2, backend, k=3, repeat=1, loads=1)
+        assert run["recall"] == 1.0 and run["mrr"] > 0
+        assert run["chunks"] > len(TRANSCRIPTS) and run["index_bytes"] > 0
+        assert run["latency"]["samples"] == 1
+
+def test_synthetic_corpus_scales_index(tmp_path):
+    source = tmp_path / "transcripts"
+    source.mkdir()
+    for name, text in TRANSCRIPTS.items():
+        (source / name).write_text(text, encoding="utf-8")
+    vocabulary = fit_vocabulary(str(source))
+    assert "Prepared" not in vocabulary[0] and vocabulary[1].sum() == pytest.approx(1.0)
+
+    points = []
+    for files in (2, 6):
+        corpus = tmp_path / f"corpus_{files}"
+        generate_corpus(str(corpus), files, companies=2, words_per_file=900, vocabulary=vocabulary)
+        docs = load_transcripts(str(corpus))
+        assert len(docs) == files and {d["metadata"]["company"] for d in docs} == {"SYN0000", "SYN0001"}
+        sections = {c.metadata.section for d in docs for c in chunk_text(d)}
+        assert "q&a" in sections and "Prepared Remarks" in sections
+
+        cache_dir = str(tmp_path / f"cache_{files}")
+        point = measure_build(str(corpus), cache_dir)
+        point.update(measure_serving(cache_dir, [{"query": "revenue grew", "filters": None}], repeat=1))
+        points.append(point)
+
+    # Same seed, same files: the smaller corpus is a prefix of the larger one
+    assert (tmp_path / "corpus_2" / "syn0000_000000.txt").read_text() == (tmp_path / "corpus_6" / "syn0000_000000.txt").read_text()
+    assert points[0]["chunks"] < points[1]["chunks"] and points[0]["index_bytes"] < points[1]["index_bytes"]
+    assert points[1]["shards"] == 2 and points[1]["latency"]["samples"] == 1
+    assert files_for(1000, words_per_file=3200) == 100
+
+def test_finance_analyzer_stems_normalizes_and_expands(tmp_path, monkeypatch):
+    finance = Analyzer("finance", synonyms=FINANCE_SYNONYMS)
+    assert finance.terms("Margins") == finance.terms("margin") == ["margin"]
+    assert stem("increased") == stem("increases") == stem("increase")
+    assert stem("agreed") == stem("agree")
+    # Words that only look like plurals or past tenses keep their meaning
+    assert stem("news") == "news" != stem("new")
+    assert stem("speed") == stem("speeds") == "speed"
+    assert stem("bias") == stem("biases") == "bias"
+    assert stem("need") == stem("needed") == "need"
+    assert finance.terms("revenue of $4.50 billion, up 1,234 units or 39%") == \
+        ["revenu", "of", "4.5", "billion", "up", "1234", "unit", "39", "percent"]
+    # One term per word, so phrase positions are unchanged
+    assert len(finance.terms("gross margins expanded")) == 3
+
+    assert finance.query("What was EPS?") == ("what", "eps", "earn", "per", "shar")
+    assert set(finance.query("earnings per share growth")) >= {"eps", "growth"}
+    finance.query("What was EPS?")
+    assert finance.query.cache_info().hits == 1
+
+    simple = Analyzer("simple", stemming=False, numbers=False)
+    assert simple.terms("Margins of 4.5%") == ["margins", "of", "4", "5"]
+    assert simple.query("EPS") == ("eps",)
+
+    transcripts = tmp_path / "transcripts"
+    transcripts.mkdir()
+    (transcripts / "nvidia_q1.txt").write_text("Prepared Remarks\nDiluted earnings per share were $0.81.", encoding="utf-8")
+    (transcripts / "apple_q1.txt").write_text("Prepared Remarks\nGross margins expanded.", encoding="utf-8")
+    index = BM25Index(cache_dir=str(tmp_path / "index_cache"))
+    index.build(str(transcripts))
+    monkeypatch.setattr(indexer, "global_index", index)
+    assert search_index(SearchQuery(query="EPS", top_k=1))[0].metadata.file_name == "nvidia_q1.txt"
+    assert search_index(SearchQuery(query="gross margin", top_k=1))[0].metadata.file_name == "apple_q1.txt"
+    assert search_index(SearchQuery(query="$0.81", top_k=1))[0].metadata.file_name == "nvidia_q1.txt"
+    assert not plan_update(str(transcripts), index.cache_dir).full